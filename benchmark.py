@@ -0,0 +1,296 @@
+"""
+処理速度のベンチマーク（読み込み → 前処理 → 検出 → 認識 → 音声合成）
+- img1.png と、文字の大きさ・量を変えて作った合成画像を使います（ネット接続は不要）
+- 段階ごとの処理時間（p50 / p90 / p99）と1秒あたりの処理数を JSON で出力します
+- 以前の結果（JSON）と比べて、遅くなった段階を確認できます
+- --backends を付けると、推論バックエンドごとの速さと、いつもの EasyOCR との結果の一致度を比べます
+
+使い方:
+    python benchmark.py --output bench.json
+    python benchmark.py --skip-ocr --skip-tts --repeat 20
+    python benchmark.py --output new.json --compare bench.json
+    python benchmark.py --backends torch,torch_fp32,onnx
+"""
+
+import argparse
+import difflib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import inference_backend
+import ocr_from_path
+import preprocessing
+import reader_cache
+import text_presence
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img1.png")
+
+# 合成画像の種類: 名前 → (幅, 高さ, 文字の大きさ, 行の数)
+SYNTHETIC_CASES: Dict[str, Tuple[int, int, float, int]] = {
+    "small_sparse": (400, 300, 1.0, 3),
+    "small_dense": (400, 300, 0.5, 12),
+    "large_sparse": (1600, 1200, 2.0, 5),
+    "large_dense": (1600, 1200, 0.8, 40),
+}
+
+WORDS = ["OCR", "speech", "image", "text", "sample", "receipt", "label", "2024", "total", "price"]
+
+# 結果を比べるとき、この割合より遅くなった段階に印をつけます
+REGRESSION_RATIO = 1.2
+
+
+def make_synthetic_image(width: int, height: int, font_scale: float, lines: int, seed: int = 0) -> np.ndarray:
+    """白地に黒い英数字を並べた画像を作ります（seed が同じなら毎回同じ画像になります）。"""
+    rng = np.random.RandomState(seed)
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    line_height = max(1, height // (lines + 1))
+    for i in range(lines):
+        text = " ".join(rng.choice(WORDS, size=rng.randint(2, 6)))
+        cv2.putText(image, text, (10, line_height * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (0, 0, 0), max(1, int(font_scale * 2)), cv2.LINE_AA)
+    return image
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """処理時間（ミリ秒）のリストから、パーセンタイルと1秒あたりの処理数を計算します。"""
+    values = np.asarray(samples_ms, dtype=np.float64)
+    mean = float(values.mean())
+    return {
+        "count": int(values.size),
+        "mean_ms": round(mean, 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "min_ms": round(float(values.min()), 3),
+        "throughput_per_s": round(1000.0 / mean, 3) if mean > 0 else None,
+    }
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """func を warmup 回動かしてから repeat 回計測します。"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def prepare_images(workdir: str) -> Dict[str, str]:
+    """計測に使う画像をファイルに書き出し、名前 → パスの辞書を返します。"""
+    paths = {}
+    if os.path.exists(SAMPLE_IMAGE):
+        paths["img1"] = SAMPLE_IMAGE
+    for seed, (name, (w, h, scale, lines)) in enumerate(sorted(SYNTHETIC_CASES.items())):
+        path = os.path.join(workdir, f"{name}.png")
+        cv2.imwrite(path, make_synthetic_image(w, h, scale, lines, seed=seed))
+        paths[name] = path
+    return paths
+
+
+def preprocess_variants() -> Dict[str, preprocessing.PreprocessPipeline]:
+    """比べる前処理の種類です。"""
+    return {
+        "app": preprocessing.PreprocessPipeline(preprocessing.APP_STAGES),
+        "simple": preprocessing.PreprocessPipeline(preprocessing.simple_stages(3, 2.0, False, "otsu")),
+        "simple_auto_scale": preprocessing.PreprocessPipeline(preprocessing.simple_stages(3, "auto", False, "otsu")),
+        "simple_otsu": preprocessing.PreprocessPipeline(preprocessing.simple_stages(3, 2.0, True, "otsu")),
+        "simple_adaptive": preprocessing.PreprocessPipeline(preprocessing.simple_stages(3, 2.0, True, "adaptive")),
+    }
+
+
+def text_similarity(expected: List[str], actual: List[str]) -> float:
+    """2つの認識結果（文字列のリスト）がどれくらい同じか（1.0 なら完全に一致）を返します。"""
+    a, b = "\n".join(expected), "\n".join(actual)
+    if not a and not b:
+        return 1.0
+    return round(difflib.SequenceMatcher(None, a, b).ratio(), 4)
+
+
+def compare_backends(images: Dict[str, np.ndarray], backends: List[str], repeat: int) -> Dict[str, object]:
+    """推論バックエンドごとに readtext の時間を計り、"torch"（いつもの EasyOCR）との一致度を調べます。"""
+    results: Dict[str, object] = {}
+    expected: Dict[str, List[str]] = {}
+    # 一致度の基準にするため、いつもの EasyOCR を最初に動かします
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        reader = reader_cache.create_reader(
+            ocr_from_path.LANGS, ocr_from_path.RECOG_NETWORK, ocr_from_path.MODEL_DIR, False, backend
+        )
+        per_image = {}
+        for name, image in images.items():
+            texts = [text for _, text, _ in reader.readtext(image, detail=1)]
+            if backend == "torch":
+                expected[name] = texts
+            per_image[name] = measure(lambda image=image: reader.readtext(image, detail=1), repeat)
+            per_image[name]["text_similarity"] = text_similarity(expected[name], texts)
+        if backend in backends:
+            results[f"backend[{backend}]"] = per_image
+        del reader
+    return results
+
+
+def run_benchmark(repeat: int = 5, skip_ocr: bool = False, skip_tts: bool = False,
+                  backends: Optional[List[str]] = None) -> Dict[str, object]:
+    """すべての段階を計測して、結果の辞書を返します。"""
+    results: Dict[str, Dict[str, object]] = {}
+    workdir = tempfile.mkdtemp(prefix="img2speech-bench-")
+    try:
+        paths = prepare_images(workdir)
+        images = {name: ocr_from_path.load_image(path) for name, path in paths.items()}
+
+        results["load_image"] = {
+            name: measure(lambda path=path: ocr_from_path.load_image(path), repeat) for name, path in paths.items()
+        }
+
+        # 文字の有無の判定（プレフィルター）は、認識を省けるかどうかを決めるので安さが大事です
+        blank = {"blank": np.full((1200, 1600, 3), 255, dtype=np.uint8)}
+        results["text_prefilter"] = {
+            name: measure(lambda image=image: text_presence.looks_like_text(image), repeat)
+            for name, image in dict(images, **blank).items()
+        }
+
+        pipelines = preprocess_variants()
+        processed = {}
+        for variant, pipeline in pipelines.items():
+            stage_times: Dict[str, List[float]] = {}
+            per_image = {}
+            for name, image in images.items():
+                def run(pipeline=pipeline, image=image, name=name):
+                    processed[(variant, name)] = pipeline.run(image)
+                    for stage, ms in pipeline.last_timings:
+                        stage_times.setdefault(stage, []).append(ms)
+                per_image[name] = measure(run, repeat)
+            results[f"preprocess[{variant}]"] = per_image
+            results[f"preprocess[{variant}].stages"] = {stage: summarize(ms) for stage, ms in stage_times.items()}
+
+        if not skip_ocr:
+            import fused_ocr
+            import ocr_batching
+
+            reader = ocr_from_path.get_reader()
+            results["readtext"] = {}
+            results["detect"] = {}
+            results["recognize"] = {}
+            for name in images:
+                image = processed[("app", name)]
+                results["readtext"][name] = measure(lambda image=image: reader.readtext(image, detail=1), repeat)
+                results["detect"][name] = measure(lambda image=image: ocr_batching.detect_regions(reader, image), repeat)
+                regions = ocr_batching.crop_regions(*ocr_batching.detect_regions(reader, image))
+                results["recognize"][name] = measure(
+                    lambda regions=regions: ocr_batching.recognize_regions(reader, regions), repeat
+                )
+                results["recognize"][name]["regions"] = len(regions)
+                # 前処理画像と元画像の両方で認識してまとめる（readtext の2倍より十分に短いことを確認する）
+                results.setdefault("readtext_fused", {})[name] = measure(
+                    lambda name=name, image=image: fused_ocr.readtext_fused(reader, images[name], processed=image),
+                    repeat,
+                )
+
+            if backends:
+                app_images = {name: processed[("app", name)] for name in images}
+                results.update(compare_backends(app_images, backends, repeat))
+
+        if not skip_tts:
+            import tts_cache
+
+            # キャッシュが効かないよう、毎回空のフォルダに合成します
+            tts_dir = os.path.join(workdir, "tts")
+            renderer = tts_cache.TTSRenderer(cache_dir=tts_dir)
+            texts = {"short": "こんにちは。", "long": "これは読み上げの速度を測るための少し長い文章です。" * 5}
+
+            def render(text):
+                shutil.rmtree(tts_dir, ignore_errors=True)
+                os.makedirs(tts_dir, exist_ok=True)
+                renderer.render(text)
+
+            results["tts_render"] = {
+                name: measure(lambda text=text: render(text), max(1, repeat // 2)) for name, text in texts.items()
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"meta": environment_info(repeat), "results": results}
+
+
+def environment_info(repeat: int) -> Dict[str, object]:
+    """結果を比べるときに必要な環境の情報です。"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(old: Dict[str, object], new: Dict[str, object]) -> List[str]:
+    """2つの結果の p50 を比べて、段階ごとの変化を文字列のリストで返します。"""
+    lines = []
+    for stage, cases in new["results"].items():
+        old_cases = old.get("results", {}).get(stage, {})
+        for case, stats in cases.items():
+            before = old_cases.get(case, {}).get("p50_ms")
+            after = stats.get("p50_ms")
+            if not before or after is None:
+                continue
+            ratio = after / before
+            mark = "  ← 遅くなりました" if ratio > REGRESSION_RATIO else ""
+            lines.append(f"{stage:<32} {case:<14} {before:10.2f} → {after:10.2f} ms ({ratio:5.2f}x){mark}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="読み込み・前処理・認識・音声合成の処理時間を計測します")
+    parser.add_argument("--repeat", type=int, default=5, help="1つの項目を計測する回数")
+    parser.add_argument("--output", "-o", help="結果（JSON）の保存先（省略時は画面に出力）")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="以前の結果と比べる")
+    parser.add_argument("--skip-ocr", action="store_true", help="検出・認識を計測しない（モデル不要）")
+    parser.add_argument("--skip-tts", action="store_true", help="音声合成を計測しない")
+    parser.add_argument("--backends", metavar="NAMES",
+                        help=f"比べる推論バックエンド（カンマ区切り: {','.join(inference_backend.BACKENDS)}）")
+    args = parser.parse_args(argv)
+
+    backends = [name.strip() for name in args.backends.split(",")] if args.backends else None
+    for backend in backends or []:
+        if backend not in inference_backend.BACKENDS:
+            parser.error(f"推論バックエンドは {', '.join(inference_backend.BACKENDS)} のどれかにしてください: {backend}")
+    report = run_benchmark(max(1, args.repeat), args.skip_ocr, args.skip_tts, backends)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"結果を保存しました: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        print("\n".join(compare(old, report)), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
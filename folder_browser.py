@@ -0,0 +1,206 @@
+"""
+フォルダの画像を「前へ / 次へ」で順に見るための先読み
+- 今の画像の前後 PREFETCH_AHEAD 枚を、裏のスレッドで読み込み・縮小しておきます
+- 先読みした画像は CACHE_ENTRIES 枚まで覚えておき、古いものから捨てます（メモリを使いすぎないため）
+- そのため「次へ」を押したときは、ほとんどの場合すぐに表示できます
+- 先読みで作るのは表示用の縮小画像だけです。文字認識に使う元の解像度の画像は、
+  認識を頼まれたときに初めてデコード・前処理します（縮小画像で認識すると精度が落ちるため）
+- JPEG は表示に足りる大きさで直接デコードするので、大きな写真でもすぐに表示できます（image_buffer.py）
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import cv2
+import numpy as np
+
+import image_buffer
+import page_stream
+import stage_metrics
+
+# 進む向きに先読みする枚数（戻る向きは1枚）
+PREFETCH_AHEAD = 2
+# 覚えておく画像の枚数（今の画像と先読みの分より多くしてください）
+CACHE_ENTRIES = 6
+# 先読みに使うスレッドの数
+PREFETCH_WORKERS = 2
+# 先読みした画像の文字認識もしておくか（結果は結果キャッシュに入ります）
+PREFETCH_OCR = False
+# 表示用に縮小する大きさ（長い辺のピクセル）
+DISPLAY_MAX_SIZE = 400
+# フォルダを開いたときに対象にする拡張子
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".gif", ".pdf")
+
+
+class PreparedImage:
+    """表示用の縮小画像と、文字認識用の元の解像度の画像
+
+    元の解像度の画像と前処理した画像は、最初に使うときにデコード・前処理し、release() まで覚えておきます。
+    """
+
+    __slots__ = ("path", "display", "page_count", "_preprocess", "_full", "_processed", "_lock")
+
+    def __init__(self, path: str, display: np.ndarray, page_count: int,
+                 preprocess: Callable[[np.ndarray], np.ndarray]):
+        self.path = path
+        self.display = display  # 表示用に縮小した画像（BGR）
+        self.page_count = page_count
+        self._preprocess = preprocess
+        self._full: Optional[np.ndarray] = None
+        self._processed: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+
+    def full_image(self) -> np.ndarray:
+        """文字認識用の元の解像度の画像（読み取り専用）です。"""
+        with self._lock:
+            if self._full is None:
+                self._full = decode_image(self.path)
+            return self._full
+
+    def processed_image(self) -> np.ndarray:
+        """元の解像度の画像を前処理した画像（読み取り専用）です。"""
+        with self._lock:
+            if self._processed is None:
+                # 前処理の結果は前処理の側のものなので、書き込みの可否は変えずにビューで持ちます
+                self._processed = image_buffer.read_only_view(self._preprocess(self.full_image()))
+            return self._processed
+
+    @property
+    def is_loaded(self) -> bool:
+        """元の解像度の画像をデコード済みなら True"""
+        return self._full is not None
+
+    def release(self) -> None:
+        """元の解像度の画像と前処理した画像を手放します（次に使うときはもう一度デコードします）。"""
+        with self._lock:
+            self._full = self._processed = None
+
+
+def list_images(folder: str, extensions=IMAGE_EXTENSIONS) -> List[str]:
+    """フォルダの中の画像ファイルを名前順に返します。"""
+    return [
+        os.path.join(folder, name) for name in sorted(os.listdir(folder))
+        if name.lower().endswith(extensions) and os.path.isfile(os.path.join(folder, name))
+    ]
+
+
+def decode_image(path: str, min_side: Optional[int] = None) -> np.ndarray:
+    """画像を読み取り専用で読み込みます（複数ページなら1ページ目。OpenCV で読めなければ PIL で読みます）。
+
+    min_side を指定すると、できる形式（JPEG）では長い辺が min_side 以上の範囲で小さく読み込みます。
+    """
+    if page_stream.is_multipage(path):
+        return image_buffer.read_only(next(page_stream.iter_pages(path))[1])
+    with stage_metrics.span("decode") as attrs:
+        image = image_buffer.decode_file(path, min_side)
+        attrs.update(stage_metrics.image_attrs(image))
+    return image
+
+
+def shrink_for_display(image: np.ndarray, max_size: int = DISPLAY_MAX_SIZE) -> np.ndarray:
+    """長い辺が max_size を超えていれば縮小します（超えていなければ同じ画像をそのまま返します）。"""
+    height, width = image.shape[:2]
+    if height > max_size or width > max_size:
+        scale = min(max_size / width, max_size / height)
+        image = image_buffer.read_only(
+            cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        )
+    return image
+
+
+def prepare_image(path: str, preprocess: Callable[[np.ndarray], np.ndarray],
+                  max_size: int = DISPLAY_MAX_SIZE) -> PreparedImage:
+    """表示用の縮小画像を作ります（裏のスレッドで呼ばれます）。
+
+    preprocess は文字認識を頼まれたときに、元の解像度の画像にかけます。
+    画像は読み取り専用なのでコピーせずに渡します（preprocess は新しい配列を返してください）。
+    """
+    display = shrink_for_display(decode_image(path, min_side=max_size), max_size)
+    return PreparedImage(path, display, page_stream.page_count(path), preprocess)
+
+
+class FolderBrowser:
+    """フォルダの画像を順に見るための位置と、先読みのキャッシュ"""
+
+    def __init__(self, paths: List[str], prepare: Callable[[str], PreparedImage],
+                 ahead: int = PREFETCH_AHEAD, max_entries: int = CACHE_ENTRIES,
+                 workers: int = PREFETCH_WORKERS,
+                 on_prefetched: Optional[Callable[[PreparedImage], None]] = None):
+        if not paths:
+            raise ValueError("画像ファイルがありません")
+        self.paths = list(paths)
+        self.index = 0
+        self.direction = 1  # 最後に進んだ向き（1: 次へ / -1: 前へ）
+        self.ahead = max(0, ahead)
+        self.max_entries = max(self.ahead + 2, max_entries)
+        self._prepare = prepare
+        self._on_prefetched = on_prefetched
+        self._cache: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def current_path(self) -> str:
+        return self.paths[self.index]
+
+    def _future(self, path: str, prefetch: bool = False) -> Future:
+        """path の準備（済みか実行中のもの）を返します。なければ始めます。"""
+        with self._lock:
+            future = self._cache.get(path)
+            if future is None:
+                future = self._executor.submit(self._prepare, path)
+                if prefetch and self._on_prefetched is not None:
+                    future.add_done_callback(self._notify_prefetched)
+                self._cache[path] = future
+            self._cache.move_to_end(path)
+            self._evict()
+            return future
+
+    def _notify_prefetched(self, future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self._on_prefetched(future.result())
+
+    def _evict(self) -> None:
+        """覚えている枚数が上限を超えたら、今の位置から遠いものから捨てます。"""
+        keep = set(self._window())
+        for path in list(self._cache):
+            if len(self._cache) <= self.max_entries:
+                break
+            if path not in keep:
+                self._cache.pop(path).cancel()  # まだ始まっていなければ取り消す
+
+    def _window(self) -> List[str]:
+        """今の画像と、先読みする画像のパス（進む向きの画像が先）"""
+        indices = [self.index + i * self.direction for i in range(self.ahead + 1)]
+        indices.append(self.index - self.direction)
+        return [self.paths[i] for i in indices if 0 <= i < len(self.paths)]
+
+    def go_to(self, index: int, step: int = 1) -> Future:
+        """index の画像に移り、その準備（Future）を返します。
+
+        step は進んだ向き（1: 次へ / -1: 前へ）で、その向きに多めに先読みします。
+        """
+        self.index = max(0, min(index, len(self.paths) - 1))
+        self.direction = 1 if step >= 0 else -1
+        future = self._future(self.current_path)
+        for path in self._window()[1:]:
+            self._future(path, prefetch=True)
+        return future
+
+    def move(self, step: int) -> Future:
+        """step 枚進み（負なら戻り）、その画像の準備を返します。端では止まります。"""
+        return self.go_to(self.index + step, step)
+
+    def close(self, wait: bool = False) -> None:
+        """まだ始まっていない先読みを取り消します（wait なら実行中の分が終わるまで待ちます）。"""
+        with self._lock:
+            for future in self._cache.values():
+                future.cancel()
+            self._cache.clear()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,232 @@
+"""
+動画ファイルやカメラの映像から、変化があったときだけ文字を読み取る処理
+- cv2.VideoCapture でフレーム（映像の1枚）を順に読みます
+- 前に文字認識したフレームと比べて、見た目（知覚ハッシュ）と画素の差が小さければ認識しません
+  （CPU の使用量がフレームレートではなく、場面の変化の回数に比例するようになります）
+- カメラを動かしている途中のぶれた画像は読まず、映像が落ち着いてから読みます
+- 読み取った文字のうち、まだ読み上げていないものだけを返します
+
+使い方:
+    python frame_stream.py --source 0              # カメラ（0番）を読み取り、新しい文字を表示
+    python frame_stream.py --source video.mp4 --speak
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+import unicodedata
+from collections import deque
+from difflib import SequenceMatcher
+from typing import Callable, Iterator, List, Optional, Union
+
+import cv2
+import numpy as np
+
+# アプリの「カメラで読み取り」で使う映像（カメラの番号か動画ファイルのパス）
+CAMERA_SOURCE = 0
+
+# === 変化の判定の設定 ===
+# 知覚ハッシュ（64ビット）の違うビット数がこれ以上なら「変わった」とみなします
+HASH_THRESHOLD = 10
+# 縮小したグレー画像の画素の差の平均（0〜255）がこれ以上なら「変わった」とみなします
+DELTA_THRESHOLD = 12.0
+# 直前のフレームとの差がこれより小さければ「落ち着いた」とみなします（ぶれている間は読みません）
+SETTLE_THRESHOLD = 6.0
+# 比べるときに縮小する大きさ
+COMPARE_SIZE = (64, 48)
+# 何フレームごとに調べるか（1 なら全フレーム）
+FRAME_STEP = 1
+
+# === 新しい文字の判定の設定 ===
+# この割合以上似ている行は、読み上げ済みの行と同じとみなします（OCR の揺れを吸収するため）
+SIMILAR_RATIO = 0.85
+# 覚えておく読み上げ済みの行の数
+REMEMBERED_LINES = 200
+
+
+def _small_gray(frame: np.ndarray) -> np.ndarray:
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, COMPARE_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def dhash(small_gray: np.ndarray) -> int:
+    """縮小したグレー画像の差分ハッシュ（dHash, 64ビット）を返します。"""
+    pixels = cv2.resize(small_gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def pixel_delta(a: np.ndarray, b: np.ndarray) -> float:
+    """2つの縮小グレー画像の画素の差の平均を返します。"""
+    return float(cv2.absdiff(a, b).mean())
+
+
+class ChangeDetector:
+    """前に文字認識したフレームから、見た目が変わったかどうかを判定します。"""
+
+    def __init__(self, hash_threshold: int = HASH_THRESHOLD, delta_threshold: float = DELTA_THRESHOLD,
+                 settle_threshold: Optional[float] = SETTLE_THRESHOLD):
+        self.hash_threshold = hash_threshold
+        self.delta_threshold = delta_threshold
+        self.settle_threshold = settle_threshold
+        self._last_small: Optional[np.ndarray] = None  # 最後に認識したフレーム
+        self._last_hash: Optional[int] = None
+        self._previous_small: Optional[np.ndarray] = None  # 直前のフレーム
+
+    def should_recognize(self, frame: np.ndarray) -> bool:
+        """このフレームを文字認識すべきなら True を返し、認識したフレームとして覚えます。"""
+        small = _small_gray(frame)
+        previous, self._previous_small = self._previous_small, small
+        if self.settle_threshold is not None and previous is not None \
+                and pixel_delta(small, previous) >= self.settle_threshold:
+            return False  # まだ動いている
+        frame_hash = dhash(small)
+        if self._last_small is not None:
+            changed = (hamming(frame_hash, self._last_hash) >= self.hash_threshold
+                       or pixel_delta(small, self._last_small) >= self.delta_threshold)
+            if not changed:
+                return False
+        self._last_small, self._last_hash = small, frame_hash
+        return True
+
+    def reset(self) -> None:
+        self._last_small = self._last_hash = self._previous_small = None
+
+
+def _normalize(line: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", line).split())
+
+
+class NewTextFilter:
+    """すでに読み上げた行を覚えておき、新しい行だけを返します。"""
+
+    def __init__(self, similar_ratio: float = SIMILAR_RATIO, remembered: int = REMEMBERED_LINES):
+        self.similar_ratio = similar_ratio
+        self._seen: "deque[str]" = deque(maxlen=remembered)
+
+    def _is_known(self, line: str) -> bool:
+        if line in self._seen:
+            return True
+        return any(SequenceMatcher(None, line, seen).ratio() >= self.similar_ratio for seen in self._seen)
+
+    def new_lines(self, lines: List[str]) -> List[str]:
+        """lines のうち、まだ読んでいない行を返し、読んだものとして覚えます。"""
+        fresh = []
+        for line in lines:
+            normalized = _normalize(line)
+            if not normalized or self._is_known(normalized):
+                continue
+            self._seen.append(normalized)
+            fresh.append(line.strip())
+        return fresh
+
+    def reset(self) -> None:
+        self._seen.clear()
+
+
+def open_capture(source: Union[int, str]) -> cv2.VideoCapture:
+    """数字ならカメラの番号、それ以外は動画ファイルのパスとして開きます。"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"映像を開けませんでした: {source}")
+    return capture
+
+
+def iter_frames(source: Union[int, str], step: int = FRAME_STEP,
+                stop_event: Optional[threading.Event] = None) -> Iterator[np.ndarray]:
+    """映像のフレームを順に返します（step フレームごと。stop_event が立ったら終わります）。"""
+    capture = open_capture(source)
+    try:
+        index = 0
+        while stop_event is None or not stop_event.is_set():
+            # 使わないフレームは grab だけしてデコードしません
+            if not capture.grab():
+                break
+            index += 1
+            if (index - 1) % max(1, step):
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+
+def watch(source: Union[int, str], recognize: Callable[[np.ndarray], List[str]],
+          on_new_text: Callable[[List[str]], None], stop_event: Optional[threading.Event] = None,
+          detector: Optional[ChangeDetector] = None,
+          text_filter: Optional[NewTextFilter] = None) -> dict:
+    """映像を見続け、変化したフレームだけを認識して、新しい行を on_new_text に渡します。
+
+    戻り値は {"frames": 調べたフレーム数, "recognized": 認識したフレーム数} です。
+    """
+    detector = detector or ChangeDetector()
+    text_filter = text_filter or NewTextFilter()
+    stats = {"frames": 0, "recognized": 0}
+    for frame in iter_frames(source, stop_event=stop_event):
+        stats["frames"] += 1
+        if not detector.should_recognize(frame):
+            continue
+        stats["recognized"] += 1
+        fresh = text_filter.new_lines(recognize(frame))
+        if fresh:
+            on_new_text(fresh)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="映像の変化したところだけ文字を読み取ります")
+    parser.add_argument("--source", default=CAMERA_SOURCE,
+                        help=f"カメラの番号か動画ファイルのパス（既定: {CAMERA_SOURCE}）")
+    parser.add_argument("--speak", action="store_true", help="新しい文字を読み上げる")
+    args = parser.parse_args(argv)
+
+    import ocr_from_path
+
+    speaker = None
+    # 新しい文は読み上げ中の文のあとに続けて読みます（読み上げを最初からやり直しません）
+    sentences: "queue.Queue[Optional[str]]" = queue.Queue()
+    if args.speak:
+        import speech_stream
+        import tts_cache
+
+        speaker = speech_stream.StreamingSpeaker(tts_cache.TTSRenderer(), tts_cache.AudioPlayer())
+        speaker.speak_iter(iter(sentences.get, None))
+
+    def on_new_text(lines: List[str]) -> None:
+        print("\n".join(lines), flush=True)
+        if speaker is not None:
+            for sentence in speech_stream.split_sentences("\n".join(lines)):
+                sentences.put(sentence)
+
+    try:
+        reader = ocr_from_path.get_reader()
+        stats = watch(args.source, lambda frame: ocr_from_path.read_lines_from_image(frame, reader), on_new_text)
+    except KeyboardInterrupt:
+        return 0
+    except Exception as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    finally:
+        sentences.put(None)  # 読み上げに終わりの合図を送ります
+    print(f"{stats['frames']} フレーム中 {stats['recognized']} フレームを認識しました", file=sys.stderr)
+    try:
+        # 動画が終わっても、残りの文を読み終わるまで待ちます
+        while speaker is not None and speaker.is_speaking():
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        speaker.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
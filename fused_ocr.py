@@ -0,0 +1,128 @@
+"""
+前処理した画像と元の画像の両方で認識し、結果を1つにまとめる処理（統合認識）
+- 「文字認識実行」（前処理あり）と「元画像で認識」を別々に押して見比べる代わりに、1回で両方を行います
+- 前処理が縦横同じ倍率の拡大・縮小と色の変換だけなら、文字領域の検出は前処理した画像で1回だけ行い、
+  同じ領域を「前処理した画像」と「元の画像」から切り出して、2つの認識を同時に動かします
+- そうでないときは2つの readtext() を同時に動かします（元の画像の方は前処理を待たずに始まります）
+- 同じ場所（IoU が FUSE_IOU 以上）の結果は信頼度の高い方を残し、片方にしかない結果はそのまま残します
+- 座標はすべて元の画像の座標で返します
+
+2つの認識は同じリーダーを使いますが、推論はモデルを読むだけなので同時に動かしても結果は変わりません。
+"""
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import ocr_batching
+import ocr_results
+import stage_metrics
+import text_presence
+from tiled_ocr import box_rect, iou
+
+# 同じ場所の結果とみなす IoU（重なりの面積 / 2つを合わせた面積）
+FUSE_IOU = 0.5
+# それぞれの認識で使う信頼度の下限（「文字認識実行」「元画像で認識」と同じ）
+MIN_CONFIDENCE_PROCESSED = 0.1
+MIN_CONFIDENCE_ORIGINAL = 0.05
+# 縦と横の倍率の差がこの割合より小さければ、同じ倍率とみなします（検出を共有できます）
+SCALE_TOLERANCE = 0.01
+
+# 結果がどちらの認識から来たか
+PROCESSED, ORIGINAL = 0, 1
+
+Result = Tuple[list, str, float]
+
+
+def _scale_results(results: Sequence[Result], fx: float, fy: float) -> List[Result]:
+    """結果の座標を、横 fx 倍・縦 fy 倍にします。"""
+    return [
+        ([[float(x) * fx, float(y) * fy] for x, y in box], text, float(confidence))
+        for box, text, confidence in results
+    ]
+
+
+def fuse(passes: Sequence[Tuple[Sequence[Result], float]],
+         iou_threshold: float = FUSE_IOU) -> Tuple[List[Result], List[int]]:
+    """いくつかの認識結果（同じ座標系）を1つにまとめます。
+
+    passes は (結果, 信頼度の下限) のリストです（下限より大きい結果を使います）。同じ場所の結果は信頼度の高い方を残します
+    （同じ信頼度なら先の認識の方）。戻り値は (まとめた結果, 各結果が何番目の認識から来たか) です。
+    """
+    candidates = [
+        (result, source)
+        for source, (results, min_confidence) in enumerate(passes)
+        for result in results if result[2] > min_confidence
+    ]
+    candidates.sort(key=lambda item: -item[0][2])
+    kept: List[Tuple[Result, int, Tuple[float, float, float, float]]] = []
+    for result, source in candidates:
+        rect = box_rect(result[0])
+        if any(iou(rect, other) >= iou_threshold for _, _, other in kept):
+            continue
+        kept.append((result, source, rect))
+    return [result for result, _, _ in kept], [source for _, source, _ in kept]
+
+
+def _recognize_shared(reader, image: np.ndarray, processed: np.ndarray, factor: float,
+                      executor: Executor) -> Tuple[List[Result], List[Result]]:
+    """前処理した画像で1回だけ検出し、同じ領域を両方の画像から認識します。
+
+    戻り値は (前処理した画像の座標の結果, 元の画像の座標の結果) です。
+    """
+    from easyocr.utils import reformat_input
+
+    processed_grey, horizontal, free = ocr_batching.detect_regions(reader, processed)
+    _, original_grey = reformat_input(image)
+    original_horizontal, original_free = text_presence.scale_boxes(horizontal, free, 1.0 / factor)
+    # 縮めると幅か高さが 0 になる小さな領域は、元の画像からは切り出せません
+    original_horizontal = [box for box in original_horizontal if box[1] > box[0] and box[3] > box[2]]
+
+    original_regions = ocr_batching.crop_regions(original_grey, original_horizontal, original_free)
+    original_future = executor.submit(ocr_batching.recognize_regions, reader, original_regions)
+    processed_results = ocr_batching.recognize_regions(
+        reader, ocr_batching.crop_regions(processed_grey, horizontal, free)
+    )
+    return processed_results, original_future.result()
+
+
+def readtext_fused(reader, image: np.ndarray,
+                   preprocess: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                   processed: Optional[np.ndarray] = None,
+                   share_detection: bool = True) -> ocr_results.OCRResults:
+    """前処理した画像と元の画像の両方で認識し、まとめた結果を元の画像の座標で返します。
+
+    前処理済みの画像があれば processed に、なければ前処理の関数を preprocess に渡します。
+    share_detection を False にすると、検出も2回（それぞれの画像で）行います。
+    """
+    if processed is None and preprocess is None:
+        raise ValueError("preprocess か processed のどちらかを渡してください")
+    with stage_metrics.span("fused", **stage_metrics.image_attrs(image)) as attrs, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="fused") as executor:
+        original_future = None
+        if not share_detection:
+            # 元の画像の認識は前処理を待たずに始めます
+            original_future = executor.submit(reader.readtext, image, detail=1)
+        if processed is None:
+            processed = preprocess(image)
+
+        fx = image.shape[1] / float(processed.shape[1])
+        fy = image.shape[0] / float(processed.shape[0])
+        uniform = abs(fx - fy) <= SCALE_TOLERANCE * max(fx, fy)
+        if original_future is None and uniform:
+            processed_results, original_results = _recognize_shared(reader, image, processed, 1.0 / fx, executor)
+        else:
+            if original_future is None:
+                original_future = executor.submit(reader.readtext, image, detail=1)
+            processed_results = reader.readtext(processed, detail=1)
+            original_results = original_future.result()
+        attrs["shared_detection"] = original_future is None
+
+        fused, sources = fuse([
+            (_scale_results(processed_results, fx, fy), MIN_CONFIDENCE_PROCESSED),
+            (original_results, MIN_CONFIDENCE_ORIGINAL),
+        ])
+        attrs["boxes"] = len(fused)
+        attrs["from_original"] = sources.count(ORIGINAL)
+    return ocr_results.OCRResults.from_readtext(fused)
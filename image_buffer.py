@@ -0,0 +1,113 @@
+"""
+画像の読み込み（デコード）を1回だけにして、表示と文字認識で同じ画像を共有するための処理
+- ファイルはメモリマップ（mmap）で開いて、そのまま cv2.imdecode に渡します
+  （ファイルの中身を bytes に読み込むコピーがなくなります）
+- OpenCV で読めない形式（GIF など）は PIL で読み、PIL から直接 BGR の並びで取り出します
+  （np.array でのコピーと、RGB → BGR の変換で作る配列がなくなります）
+- デコードした画像は読み取り専用（writeable=False）にします。表示用の縮小画像や前処理の入力は
+  この画像そのもの（またはビュー）なので、コピーしなくても書き換えられる心配がありません
+- Tk に表示するときは、BGR の配列から直接 PIL の画像を作ります（RGB に変換した配列を作りません）
+- 表示用に読むときは min_side を指定します。JPEG はデコーダーが 1/2・1/4・1/8 の大きさで直接デコードできるので、
+  表示に足りる一番小さい大きさでデコードします（大きな写真でもすぐに表示でき、元の解像度の画像は作りません）
+
+1枚あたりのピークメモリの目安（W×H のカラー画像、F = W×H×3 バイト、test_app.py で確認しています）:
+- numpy と Python の分（tracemalloc で測れる分）は、どの形式でも F ＋ 表示用の縮小画像です
+- libpng や PIL の中の作業用のメモリも含めたプロセスのピーク（RSS）は、これより多くなります
+  - OpenCV で読める形式（PNG など）: 約 2F（cv2.imread と同じです）
+  - PIL で読む形式（GIF など）: 約 2.7F（np.array と RGB → BGR の変換で読んでいたときは約 3.7F）
+"""
+
+import mmap
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 縮小しながらデコードできる形式
+REDUCED_DECODE_EXTENSIONS = (".jpg", ".jpeg")
+# (縮小の割合, cv2.imdecode のフラグ)。小さい方から試します
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def read_only(image: np.ndarray) -> np.ndarray:
+    """画像を読み取り専用にして返します（共有しても書き換えられないように）。"""
+    image.flags.writeable = False
+    return image
+
+
+def read_only_view(image: np.ndarray) -> np.ndarray:
+    """画像の読み取り専用のビューを返します（元の配列はこれまでどおり書き換えられます）。
+
+    ほかの処理が持っている配列（前処理の結果など）を共有するときに使います。
+    """
+    view = image.view()
+    view.flags.writeable = False
+    return view
+
+
+def _decode_with_pil(path: str) -> np.ndarray:
+    """PIL で読み込み、BGR の並びで取り出します（配列は取り出した bytes のビューです）。"""
+    with Image.open(path) as pil_image:
+        rgb = pil_image if pil_image.mode == "RGB" else pil_image.convert("RGB")
+        try:
+            data = rgb.tobytes("raw", "BGR")
+            width, height = rgb.size
+        finally:
+            if rgb is not pil_image:
+                rgb.close()
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+
+
+def _decode_flags(path: str, min_side: Optional[int]) -> int:
+    """長い辺が min_side 以上になる範囲で、一番小さくデコードするフラグを選びます。"""
+    if min_side is None or not path.lower().endswith(REDUCED_DECODE_EXTENSIONS):
+        return cv2.IMREAD_COLOR
+    try:
+        with Image.open(path) as pil_image:  # ヘッダーだけを読みます
+            long_side = max(pil_image.size)
+    except OSError:
+        return cv2.IMREAD_COLOR
+    for factor, flags in _REDUCED_FLAGS:
+        if long_side / factor >= min_side:
+            return flags
+    return cv2.IMREAD_COLOR
+
+
+def decode_file(path: str, min_side: Optional[int] = None) -> np.ndarray:
+    """画像ファイルを1回だけデコードし、読み取り専用の BGR 画像を返します。
+
+    min_side を指定すると、JPEG は長い辺が min_side 以上になる範囲で小さくデコードします（表示用）。
+    OpenCV で読めなければ PIL で読みます。
+    """
+    image = None
+    if os.path.getsize(path) > 0:
+        flags = _decode_flags(path, min_side)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            try:
+                image = cv2.imdecode(data, flags)
+            finally:
+                del data  # mmap を閉じる前に、ビューを手放します
+    if image is None:
+        print("OpenCVでの読み込みに失敗。PILで試行します...")
+        image = _decode_with_pil(path)
+        print("PILでの読み込みに成功しました")
+    return read_only(image)
+
+
+def to_pil(image: np.ndarray) -> Image.Image:
+    """BGR（またはグレースケール）の画像から、表示用の PIL の画像を作ります。
+
+    色の並びは PIL が読み込むときに入れ替えるので、RGB の配列を別に作りません。
+    """
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    if image.ndim == 2:
+        return Image.frombuffer("L", (width, height), image, "raw", "L", 0, 1)
+    return Image.frombuffer("RGB", (width, height), image, "raw", "BGR", 0, 1)
@@ -1,14 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import easyocr
-import pyttsx3
-import cv2
-import numpy as np
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import threading
+import queue
 import os
 import time
 
+import folder_browser
+import frame_stream
+import image_buffer
+import ocr_batching
+import ocr_jobs
+import ocr_pipeline
+import ocr_results
+import page_stream
+import reader_cache
+import speech_stream
+import tts_cache
+
 class ImageToSpeechApp:
     def __init__(self, root):
         self.root = root
@@ -18,8 +27,24 @@ class ImageToSpeechApp:
         
         # EasyOCRリーダーの初期化
         self.reader = None
+        # リーダーの設定（言語, 認識モデル, モデル保存先, GPU使用）
+        self.reader_config = reader_cache.make_key(
+            ['ja', 'en'],
+            recog_network='japanese_g2',  # 日本語専用モデル
+            model_dir='./models',  # モデル保存ディレクトリ
+            gpu=False  # CPU使用で安定性を向上
+        )
+        # 文字認識の仕事は1つのワーカーで順番に処理する（同じリーダーで推論が重ならないように）
+        self.jobs = ocr_jobs.JobScheduler(workers=1)
         self.engine = None
-        self.current_image = None
+        self.tts = None
+        self.speaker = None
+        # 表示中の画像（folder_browser.PreparedImage。認識用の元の解像度の画像は認識するときに読み込む）
+        self.prepared = None
+        # フォルダの画像を「前へ / 次へ」で見るための先読み（画像を選ぶと作る）
+        self.browser = None
+        # カメラで読み取り中は、止める合図（threading.Event）
+        self.camera_stop = None
         self.recognized_text = ""
         
         # GUIの構築
@@ -53,6 +78,13 @@ class ImageToSpeechApp:
         ttk.Button(left_panel, text="文字認識実行", command=self.recognize_text).grid(row=1, column=1, pady=5)
         ttk.Button(left_panel, text="前処理画像表示", command=self.show_processed_image).grid(row=2, column=0, pady=5)
         ttk.Button(left_panel, text="元画像で認識", command=self.recognize_original_image).grid(row=2, column=1, pady=5)
+        ttk.Button(left_panel, text="認識しながら読み上げ", command=self.recognize_and_speak).grid(row=3, column=0, columnspan=2, pady=5)
+        ttk.Button(left_panel, text="◀ 前の画像", command=lambda: self.browse(-1)).grid(row=4, column=0, pady=5)
+        ttk.Button(left_panel, text="次の画像 ▶", command=lambda: self.browse(1)).grid(row=4, column=1, pady=5)
+        ttk.Button(left_panel, text="フォルダを開く", command=self.choose_folder).grid(row=5, column=0, columnspan=2, pady=5)
+        self.camera_button = ttk.Button(left_panel, text="カメラで読み取り", command=self.toggle_camera)
+        self.camera_button.grid(row=6, column=0, columnspan=2, pady=5)
+        ttk.Button(left_panel, text="前処理＋元画像で認識", command=self.recognize_fused).grid(row=7, column=0, columnspan=2, pady=5)
         
         # 右側のパネル（テキスト表示・音声操作）
         right_panel = ttk.LabelFrame(main_frame, text="テキスト・音声操作", padding="10")
@@ -86,7 +118,8 @@ class ImageToSpeechApp:
         
         ttk.Button(button_frame, text="音声読み上げ", command=self.speak_text).grid(row=0, column=0, padx=(0, 5))
         ttk.Button(button_frame, text="停止", command=self.stop_speech).grid(row=0, column=1, padx=5)
-        ttk.Button(button_frame, text="テキストクリア", command=self.clear_text).grid(row=0, column=2, padx=5)
+        ttk.Button(button_frame, text="次の文へ", command=self.skip_sentence).grid(row=0, column=2, padx=5)
+        ttk.Button(button_frame, text="テキストクリア", command=self.clear_text).grid(row=0, column=3, padx=5)
         
         # ステータスバー
         self.status_var = tk.StringVar(value="準備完了")
@@ -111,14 +144,8 @@ class ImageToSpeechApp:
         # EasyOCRの初期化（バックグラウンドで実行）
         def init_easyocr():
             try:
-                # 日本語認識に特化した設定
-                self.reader = easyocr.Reader(
-                    ['ja', 'en'], 
-                    gpu=False,  # CPU使用で安定性を向上
-                    model_storage_directory='./models',  # モデル保存ディレクトリ
-                    download_enabled=True,
-                    recog_network='japanese_g2'  # 日本語専用モデル
-                )
+                # 日本語認識に特化した設定（同じ設定のリーダーは共有キャッシュから再利用）
+                self.reader = reader_cache.get_reader(*self.reader_config)
                 self.root.after(0, lambda: self.status_var.set("EasyOCR初期化完了"))
             except Exception as e:
                 self.root.after(0, lambda: self.status_var.set(f"EasyOCR初期化エラー: {str(e)}"))
@@ -126,9 +153,14 @@ class ImageToSpeechApp:
         # pyttsx3の初期化
         def init_pyttsx3():
             try:
+                # 読み込みに時間がかかるため、ウィンドウを出したあとで読み込む
+                import pyttsx3
                 self.engine = pyttsx3.init()
                 self.engine.setProperty('rate', 150)
                 self.engine.setProperty('volume', 1.0)
+                # 合成した音声はファイルにキャッシュして、再生はそのファイルから行う
+                self.tts = tts_cache.TTSRenderer(self.engine)
+                self.speaker = speech_stream.StreamingSpeaker(self.tts, tts_cache.AudioPlayer())
                 self.root.after(0, lambda: self.status_var.set("準備完了"))
             except Exception as e:
                 self.root.after(0, lambda: self.status_var.set(f"音声エンジン初期化エラー: {str(e)}"))
@@ -142,7 +174,7 @@ class ImageToSpeechApp:
         file_path = filedialog.askopenfilename(
             title="画像ファイルを選択",
             filetypes=[
-                ("画像ファイル", "*.png *.jpg *.jpeg *.bmp *.tiff *.gif"),
+                ("画像ファイル", "*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.gif *.pdf"),
                 ("すべてのファイル", "*.*")
             ]
         )
@@ -166,123 +198,135 @@ class ImageToSpeechApp:
                 print(f"画像ファイルを読み込み中: {file_path}")
                 print(f"ファイルサイズ: {file_size} bytes")
                 
-                # 画像を読み込み（OpenCVで試行）
-                image = cv2.imread(file_path)
-                if image is None:
-                    print("OpenCVでの読み込みに失敗。PILで試行します...")
-                    # PILで読み込みを試行
-                    try:
-                        pil_image = Image.open(file_path)
-                        # PIL画像をOpenCV形式に変換
-                        image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-                        print("PILでの読み込みに成功しました")
-                    except Exception as pil_error:
-                        print(f"PILでの読み込みも失敗: {pil_error}")
-                        messagebox.showerror("エラー", f"画像の読み込みに失敗しました\nファイルパス: {file_path}\nファイルサイズ: {file_size} bytes\nOpenCVエラー: 読み込み失敗\nPILエラー: {pil_error}")
-                        return
-                
-                # 画像をリサイズ（表示用）
-                height, width = image.shape[:2]
-                max_size = 400
-                if height > max_size or width > max_size:
-                    scale = min(max_size / width, max_size / height)
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    image = cv2.resize(image, (new_width, new_height))
-                
-                # BGRからRGBに変換
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                
-                # PIL画像に変換
-                pil_image = Image.fromarray(image_rgb)
-                photo = ImageTk.PhotoImage(pil_image)
-                
-                # 画像を表示
-                self.image_label.configure(image=photo, text="")
-                self.image_label.image = photo
-                
-                # 元の画像を保存（表示用の画像をコピー）
-                self.current_image = image.copy()
-                
-                # 文字認識用の画像を前処理
-                self.processed_image = self.preprocess_image_for_ocr(image.copy())
-                
-                self.status_var.set(f"画像を読み込みました: {os.path.basename(file_path)}")
+                # 同じフォルダの画像を「前へ / 次へ」で見られるようにして、選んだ画像を表示する
+                self.open_folder(os.path.dirname(file_path), file_path)
                 
             except Exception as e:
                 messagebox.showerror("エラー", f"画像の読み込み中にエラーが発生しました: {str(e)}")
     
-    def preprocess_image_for_ocr(self, image):
-        """OCR用の画像前処理"""
+    def choose_folder(self):
+        """フォルダを選んで、中の画像を先頭から表示"""
+        folder = filedialog.askdirectory(title="画像フォルダを選択")
+        if folder:
+            try:
+                self.open_folder(os.path.abspath(folder))
+            except Exception as e:
+                messagebox.showerror("エラー", f"フォルダを開けませんでした: {str(e)}")
+    
+    def open_folder(self, folder, start_path=None):
+        """フォルダの画像を順に見られるようにし、start_path（なければ先頭）を表示"""
+        paths = folder_browser.list_images(folder)
+        if start_path is not None and start_path not in paths:
+            paths = sorted(paths + [start_path])  # 一覧にない拡張子のファイルも開けるように
+        if self.browser is not None:
+            self.browser.close()
+        # 読み込み・縮小・前処理は裏のスレッドで行う（画面が固まらないように）
+        self.browser = folder_browser.FolderBrowser(
+            paths,
+            lambda path: folder_browser.prepare_image(path, self.preprocess_image_for_ocr),
+            on_prefetched=self.prefetch_ocr,
+        )
+        index = paths.index(start_path) if start_path is not None else 0
+        self.show_browser_image(self.browser.go_to(index))
+    
+    def browse(self, step):
+        """前（step=-1）または次（step=1）の画像を表示"""
+        if self.browser is None:
+            messagebox.showwarning("警告", "先に画像かフォルダを選択してください")
+            return
+        self.show_browser_image(self.browser.move(step))
+    
+    def show_browser_image(self, future):
+        """準備ができたら画像を表示（先読み済みならすぐに表示される）"""
+        browser = self.browser
+        index = browser.index
+        if not future.done():
+            self.status_var.set(f"画像を読み込み中: {os.path.basename(browser.current_path)}")
+        future.add_done_callback(
+            lambda future: self.root.after(0, lambda: self.show_prepared_image(browser, index, future))
+        )
+    
+    def show_prepared_image(self, browser, index, future):
+        """準備のできた画像を表示し、文字認識に使う画像を切り替える"""
+        # 読み込み中に別の画像へ移っていたら表示しない
+        if browser is not self.browser or browser.index != index:
+            return
         try:
-            # グレースケール変換
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # ノイズ除去
-            denoised = cv2.fastNlMeansDenoising(gray)
-            
-            # コントラスト改善
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(denoised)
-            
-            # ガウシアンブラーでノイズを軽減
-            blurred = cv2.GaussianBlur(enhanced, (1, 1), 0)
-            
-            # アダプティブ二値化
-            binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-            
-            # モルフォロジー処理でノイズ除去
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 1))
-            cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-            
-            # 画像を拡大（文字を大きくする）
-            height, width = cleaned.shape
-            scale_factor = 2
-            enlarged = cv2.resize(cleaned, (width * scale_factor, height * scale_factor), interpolation=cv2.INTER_CUBIC)
-            
-            return enlarged
-            
+            prepared = future.result()
         except Exception as e:
-            print(f"画像前処理エラー: {e}")
-            return image  # 前処理に失敗した場合は元の画像を返す
+            print(f"画像の読み込みに失敗: {e}")
+            messagebox.showerror("エラー", f"画像の読み込みに失敗しました\nファイルパス: {browser.current_path}\nエラー: {e}")
+            return
+        
+        # BGRのまま PIL の画像にして表示（RGBに変換した配列は作らない）
+        photo = ImageTk.PhotoImage(image_buffer.to_pil(prepared.display))
+        self.image_label.configure(image=photo, text="")
+        self.image_label.image = photo
+        
+        # 前の画像の認識はもう要らないので取り消す（結果が新しい画像の表示を上書きしないように）
+        self.jobs.cancel_group("recognize")
+        self.jobs.cancel_group("preview")
+        # 前の画像の元の解像度の画像は手放す（もう一度表示したときは読み込み直す）
+        if self.prepared is not None and self.prepared is not prepared:
+            self.prepared.release()
+        self.prepared = prepared
+        # 複数ページのファイル（TIFF・PDF）は1ページ目を表示し、読み上げでは全ページを順に読む
+        pages_note = f"（{prepared.page_count}ページ）" if prepared.page_count > 1 else ""
+        self.status_var.set(
+            f"画像を読み込みました: {os.path.basename(prepared.path)}{pages_note} [{index + 1}/{len(browser)}]"
+        )
+    
+    def prefetch_ocr(self, prepared):
+        """先読みした画像の文字認識を後回しの優先度でしておく（結果は結果キャッシュに入る）"""
+        if not folder_browser.PREFETCH_OCR or self.reader is None:
+            return
+        def recognize(job):
+            try:
+                ocr_pipeline.readtext_cached(
+                    self.reader, prepared.processed_image(), self.reader_config, mode="preprocessed"
+                )
+            finally:
+                # 表示中でなければ、元の解像度の画像は手放す（結果は結果キャッシュに残る）
+                if prepared is not self.prepared:
+                    prepared.release()
+        
+        self.jobs.submit(recognize, ocr_jobs.PRIORITY_BACKGROUND)
+    
+    def preprocess_image_for_ocr(self, image):
+        """OCR用の画像前処理（処理本体は ocr_pipeline に共通化）"""
+        return ocr_pipeline.preprocess_image_for_ocr(image)
     
     def show_processed_image(self):
         """前処理された画像を表示"""
-        if hasattr(self, 'processed_image') and self.processed_image is not None:
+        if self.prepared is None:
+            messagebox.showwarning("警告", "前処理画像がありません。先に画像を選択してください。")
+            return
+        
+        self.status_var.set("前処理中...")
+        prepared = self.prepared
+        
+        def preview(job):
             try:
-                # 前処理画像を表示用に変換
-                if len(self.processed_image.shape) == 2:  # グレースケール
-                    display_image = cv2.cvtColor(self.processed_image, cv2.COLOR_GRAY2RGB)
-                else:
-                    display_image = cv2.cvtColor(self.processed_image, cv2.COLOR_BGR2RGB)
-                
-                # リサイズ
-                height, width = display_image.shape[:2]
-                max_size = 400
-                if height > max_size or width > max_size:
-                    scale = min(max_size / width, max_size / height)
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    display_image = cv2.resize(display_image, (new_width, new_height))
-                
-                # PIL画像に変換
-                pil_image = Image.fromarray(display_image)
-                photo = ImageTk.PhotoImage(pil_image)
-                
-                # 画像を表示
-                self.image_label.configure(image=photo, text="")
-                self.image_label.image = photo
-                
-                self.status_var.set("前処理画像を表示しました")
-                
+                # 元の解像度で前処理（認識と同じ画像）し、表示用に縮小する
+                display_image = folder_browser.shrink_for_display(prepared.processed_image())
             except Exception as e:
-                messagebox.showerror("エラー", f"前処理画像の表示に失敗しました: {str(e)}")
-        else:
-            messagebox.showwarning("警告", "前処理画像がありません。先に画像を選択してください。")
+                error_msg = str(e)
+                self.run_if_current(job, lambda: messagebox.showerror("エラー", f"前処理画像の表示に失敗しました: {error_msg}"))
+                return
+            self.run_if_current(job, lambda: show(display_image))
+        
+        def show(display_image):
+            # PIL画像に変換して表示（グレースケールのまま表示できる）
+            photo = ImageTk.PhotoImage(image_buffer.to_pil(display_image))
+            self.image_label.configure(image=photo, text="")
+            self.image_label.image = photo
+            self.status_var.set("前処理画像を表示しました")
+        
+        self.jobs.submit(preview, ocr_jobs.PRIORITY_CURRENT, group="preview")
     
     def recognize_original_image(self):
         """元の画像で文字認識を実行"""
-        if self.current_image is None:
+        if self.prepared is None:
             messagebox.showwarning("警告", "先に画像を選択してください")
             return
         
@@ -293,64 +337,41 @@ class ImageToSpeechApp:
         self.status_var.set("元画像で文字認識中...")
         self.root.update()
         
-        def recognize():
+        # 押した時点の画像を認識する（途中で画像が変わってもまざらないように）
+        prepared = self.prepared
+        
+        def recognize(job):
             try:
                 print("元画像で文字認識を開始します...")
-                print(f"画像サイズ: {self.current_image.shape}")
+                # 表示用の縮小画像ではなく、元の解像度の画像で認識する（初回はここで読み込む）
+                image_to_use = prepared.full_image()
+                print(f"画像サイズ: {image_to_use.shape}")
                 
-                # 元画像で文字認識実行
-                results = self.reader.readtext(
-                    self.current_image,
-                    detail=1
+                # 元画像で文字認識実行（同じ画像なら結果キャッシュから返す）
+                results = ocr_pipeline.readtext_cached(
+                    self.reader, image_to_use, self.reader_config, mode="original"
                 )
                 
-                print(f"認識結果数: {len(results)}")
-                
-                # 結果をテキストに変換
-                recognized_text = ""
-                total_confidence = 0
-                valid_results = 0
-                
-                for result in results:
-                    try:
-                        if len(result) == 3:
-                            bbox, text, confidence = result
-                        elif len(result) == 2:
-                            bbox, text = result
-                            confidence = 0.5
-                        else:
-                            continue
-                        
-                        if confidence > 0.05:  # より低い閾値
-                            recognized_text += f"{text} (信頼度: {confidence:.2f})\n"
-                            total_confidence += confidence
-                            valid_results += 1
-                        else:
-                            print(f"低信頼度の結果を除外: '{text}' (信頼度: {confidence:.2f})")
-                    except Exception as parse_error:
-                        print(f"結果の解析エラー: {parse_error}")
-                        continue
-                
-                if valid_results > 0:
-                    avg_confidence = total_confidence / valid_results
-                    print(f"平均信頼度: {avg_confidence:.2f}")
+                # 信頼度が5%以上の結果を使用（元画像はより低い閾値）
+                valid = self.filter_results(results, 0.05)
+                recognized_text = valid.format_lines()
                 
                 # GUIを更新
-                self.root.after(0, lambda: self.update_recognized_text(recognized_text))
-                self.root.after(0, lambda: self.status_var.set(f"元画像認識完了 ({valid_results}個のテキストを検出)"))
+                self.run_if_current(job, lambda: self.update_recognized_text(recognized_text))
+                self.run_if_current(job, lambda: self.status_var.set(f"元画像認識完了 ({len(valid)}個のテキストを検出)"))
                 
             except Exception as e:
                 error_msg = str(e)
                 print(f"元画像文字認識エラー: {error_msg}")
-                self.root.after(0, lambda: messagebox.showerror("エラー", f"文字認識中にエラーが発生しました: {error_msg}"))
-                self.root.after(0, lambda: self.status_var.set("文字認識エラー"))
+                self.run_if_current(job, lambda: messagebox.showerror("エラー", f"文字認識中にエラーが発生しました: {error_msg}"))
+                self.run_if_current(job, lambda: self.status_var.set("文字認識エラー"))
         
-        # バックグラウンドで実行
-        threading.Thread(target=recognize, daemon=True).start()
+        # バックグラウンドで実行（前に頼んだ認識がまだなら取り消す）
+        self.jobs.submit(recognize, ocr_jobs.PRIORITY_CURRENT, group="recognize")
     
     def recognize_text(self):
         """画像から文字を認識"""
-        if self.current_image is None:
+        if self.prepared is None:
             messagebox.showwarning("警告", "先に画像を選択してください")
             return
         
@@ -361,67 +382,105 @@ class ImageToSpeechApp:
         self.status_var.set("文字認識中...")
         self.root.update()
         
-        def recognize():
+        # 前処理された画像を使用して文字認識実行（押した時点の画像）
+        prepared = self.prepared
+        
+        def recognize(job):
             try:
-                # 前処理された画像を使用して文字認識実行
-                image_to_use = self.processed_image if hasattr(self, 'processed_image') else self.current_image
-                
                 print("文字認識を開始します...")
+                # 元の解像度の画像を前処理して使う（初回はここで読み込み・前処理する）
+                image_to_use = prepared.processed_image()
                 print(f"画像サイズ: {image_to_use.shape}")
                 
-                # 文字認識実行（シンプルな設定）
-                results = self.reader.readtext(
-                    image_to_use,
-                    detail=1  # 詳細情報を取得
+                # 文字認識実行（詳細情報を取得、同じ画像なら結果キャッシュから返す）
+                results = ocr_pipeline.readtext_cached(
+                    self.reader, image_to_use, self.reader_config, mode="preprocessed"
                 )
                 
-                print(f"認識結果数: {len(results)}")
-                
-                # 結果をテキストに変換（信頼度も表示）
-                recognized_text = ""
-                total_confidence = 0
-                valid_results = 0
+                # 信頼度が10%以上の結果を使用（信頼度も表示）
+                valid = self.filter_results(results, 0.1)
+                recognized_text = valid.format_lines()
+                avg_confidence = valid.mean_confidence()
                 
-                print(f"結果の形式: {type(results)}")
-                print(f"最初の結果: {results[0] if results else 'None'}")
+                # GUIを更新
+                self.run_if_current(job, lambda: self.update_recognized_text(recognized_text))
+                self.run_if_current(job, lambda: self.status_var.set(f"文字認識完了 ({len(valid)}個のテキストを検出、平均信頼度: {avg_confidence:.2f})"))
                 
-                for result in results:
-                    try:
-                        if len(result) == 3:
-                            bbox, text, confidence = result
-                        elif len(result) == 2:
-                            bbox, text = result
-                            confidence = 0.5  # デフォルト信頼度
-                        else:
-                            print(f"予期しない結果形式: {result}")
-                            continue
-                        
-                        if confidence > 0.1:  # 信頼度が10%以上の結果を使用
-                            recognized_text += f"{text} (信頼度: {confidence:.2f})\n"
-                            total_confidence += confidence
-                            valid_results += 1
-                        else:
-                            print(f"低信頼度の結果を除外: '{text}' (信頼度: {confidence:.2f})")
-                    except Exception as parse_error:
-                        print(f"結果の解析エラー: {parse_error}, 結果: {result}")
-                        continue
+            except Exception as e:
+                error_msg = str(e)
+                print(f"文字認識エラー: {error_msg}")
+                self.run_if_current(job, lambda: messagebox.showerror("エラー", f"文字認識中にエラーが発生しました: {error_msg}"))
+                self.run_if_current(job, lambda: self.status_var.set("文字認識エラー"))
+        
+        # バックグラウンドで実行（前に頼んだ認識がまだなら取り消す）
+        self.jobs.submit(recognize, ocr_jobs.PRIORITY_CURRENT, group="recognize")
+    
+    def recognize_fused(self):
+        """前処理画像と元画像の両方で同時に認識し、同じ場所の結果は信頼度の高い方を残す"""
+        if self.prepared is None:
+            messagebox.showwarning("警告", "先に画像を選択してください")
+            return
+        
+        if self.reader is None:
+            messagebox.showwarning("警告", "EasyOCRの初期化が完了していません")
+            return
+        
+        self.status_var.set("前処理画像と元画像で文字認識中...")
+        self.root.update()
+        
+        # 押した時点の画像を認識する（前処理済みの画像があれば使い回す）
+        prepared = self.prepared
+        
+        def recognize(job):
+            try:
+                print("前処理画像と元画像で文字認識を開始します...")
+                image_to_use = prepared.full_image()
+                processed = prepared.processed_image()
+                print(f"画像サイズ: {image_to_use.shape}")
                 
-                if valid_results > 0:
-                    avg_confidence = total_confidence / valid_results
-                    print(f"平均信頼度: {avg_confidence:.2f}")
+                # 信頼度の下限はそれぞれのボタンと同じ（前処理画像 10%、元画像 5%）
+                results = ocr_pipeline.readtext_fused_cached(
+                    self.reader, image_to_use, self.reader_config, processed
+                )
+                valid = self.filter_results(results, 0.0)
+                recognized_text = valid.format_lines()
+                avg_confidence = valid.mean_confidence()
                 
-                # GUIを更新
-                self.root.after(0, lambda: self.update_recognized_text(recognized_text))
-                self.root.after(0, lambda: self.status_var.set(f"文字認識完了 ({valid_results}個のテキストを検出、平均信頼度: {avg_confidence:.2f})"))
+                self.run_if_current(job, lambda: self.update_recognized_text(recognized_text))
+                self.run_if_current(job, lambda: self.status_var.set(f"統合認識完了 ({len(valid)}個のテキストを検出、平均信頼度: {avg_confidence:.2f})"))
                 
             except Exception as e:
                 error_msg = str(e)
-                print(f"文字認識エラー: {error_msg}")
-                self.root.after(0, lambda: messagebox.showerror("エラー", f"文字認識中にエラーが発生しました: {error_msg}"))
-                self.root.after(0, lambda: self.status_var.set("文字認識エラー"))
+                print(f"統合認識エラー: {error_msg}")
+                self.run_if_current(job, lambda: messagebox.showerror("エラー", f"文字認識中にエラーが発生しました: {error_msg}"))
+                self.run_if_current(job, lambda: self.status_var.set("文字認識エラー"))
         
-        # バックグラウンドで実行
-        threading.Thread(target=recognize, daemon=True).start()
+        # バックグラウンドで実行（前に頼んだ認識がまだなら取り消す）
+        self.jobs.submit(recognize, ocr_jobs.PRIORITY_CURRENT, group="recognize")
+    
+    def filter_results(self, results, min_confidence):
+        """信頼度が min_confidence より大きい結果だけを、読む順番に並べて返す"""
+        print(f"認識結果数: {len(results)}")
+        valid = results.filter(min_confidence)
+        for text, confidence in zip(results.texts, results.confidences):
+            if confidence <= min_confidence:
+                print(f"低信頼度の結果を除外: '{text}' (信頼度: {confidence:.2f})")
+        if len(valid) > 0:
+            print(f"平均信頼度: {valid.mean_confidence():.2f}")
+        return valid.sorted()
+    
+    @property
+    def recognized_text(self):
+        """認識されたテキスト（追加のたびに文字列をつなぎ直さないよう、部分ごとに持つ）"""
+        return "".join(self._recognized_parts)
+    
+    @recognized_text.setter
+    def recognized_text(self, text):
+        self._recognized_parts = [text]
+    
+    def run_if_current(self, job, func):
+        """仕事が取り消されていなければ、GUIのスレッドで func を実行"""
+        self.root.after(0, lambda: None if job.cancelled else func())
     
     def update_recognized_text(self, text):
         """認識されたテキストを更新"""
@@ -429,36 +488,203 @@ class ImageToSpeechApp:
         self.text_area.delete(1.0, tk.END)
         self.text_area.insert(1.0, text)
     
+    def append_recognized_text(self, text):
+        """認識されたテキストを末尾に追加"""
+        self._recognized_parts.append(text)
+        self.text_area.insert(tk.END, text)
+    
+    def recognize_and_speak(self):
+        """文字を認識しながら、認識できた領域から順に読み上げ"""
+        if self.prepared is None:
+            messagebox.showwarning("警告", "先に画像を選択してください")
+            return
+        
+        if self.reader is None:
+            messagebox.showwarning("警告", "EasyOCRの初期化が完了していません")
+            return
+        
+        if self.engine is None or self.speaker is None:
+            messagebox.showwarning("警告", "音声エンジンが初期化されていません")
+            return
+        
+        prepared = self.prepared
+        rate = int(tts_cache.BASE_RATE * self.speed_var.get())
+        volume = round(self.volume_var.get(), 2)
+        text_queue = queue.Queue()
+        
+        self.update_recognized_text("")
+        self.status_var.set("認識しながら読み上げ中...")
+        
+        file_path = prepared.path if prepared.page_count > 1 else None
+        
+        def iter_pages():
+            """(ページ番号, 認識に使う画像) を返す（複数ページなら1ページずつ読み込む）"""
+            if file_path is None:
+                yield 1, prepared.processed_image()
+                return
+            for page_no, page in page_stream.iter_pages(file_path):
+                yield page_no, self.preprocess_image_for_ocr(page)
+        
+        def recognize(job):
+            valid_results = 0
+            try:
+                for page_no, page_image in iter_pages():
+                    if job.cancelled:
+                        break
+                    if file_path is not None:
+                        self.run_if_current(job, lambda page_no=page_no: self.append_recognized_text(f"--- {page_no} ページ ---\n"))
+                    # 検出後、読む順番に1領域ずつ認識して、すぐ読み上げに回す
+                    for bbox, text, confidence in ocr_batching.iter_recognized_regions(self.reader, page_image):
+                        if job.cancelled:
+                            break
+                        if confidence <= 0.1:  # 信頼度が10%以下の結果は除外
+                            print(f"低信頼度の結果を除外: '{text}' (信頼度: {confidence:.2f})")
+                            continue
+                        text_queue.put(text)
+                        valid_results += 1
+                        line = f"{text} (信頼度: {confidence:.2f})\n"
+                        self.run_if_current(job, lambda line=line: self.append_recognized_text(line))
+                self.run_if_current(job, lambda: self.status_var.set(f"文字認識完了 ({valid_results}個のテキストを検出)、読み上げ中..."))
+            except Exception as e:
+                error_msg = str(e)
+                print(f"文字認識エラー: {error_msg}")
+                self.run_if_current(job, lambda: messagebox.showerror("エラー", f"文字認識中にエラーが発生しました: {error_msg}"))
+            finally:
+                text_queue.put(None)  # 終わりの合図
+        
+        def on_error(e):
+            error_msg = str(e)
+            self.root.after(0, lambda: messagebox.showerror("エラー", f"音声読み上げ中にエラーが発生しました: {error_msg}"))
+        
+        # 認識できたテキストを待ちながら、順番に合成・再生する
+        self.speaker.speak_iter(
+            iter(text_queue.get, None), rate, volume,
+            on_error=on_error,
+            on_finish=lambda: self.root.after(0, lambda: self.status_var.set("音声読み上げが完了しました")),
+        )
+        # 始まる前に取り消されたときも終わりの合図を送る（送らないと読み上げがずっと待ち続ける）
+        self.jobs.submit(recognize, ocr_jobs.PRIORITY_CURRENT, group="recognize",
+                         on_cancel=lambda: text_queue.put(None))
+    
+    def toggle_camera(self):
+        """カメラの映像を見続け、変化したときだけ文字認識して、新しい文字を読み上げる（もう一度押すと止める）"""
+        if self.camera_stop is not None:
+            self.camera_stop.set()
+            self.camera_stop = None
+            self.jobs.cancel_group("camera")
+            self.camera_button.configure(text="カメラで読み取り")
+            self.status_var.set("カメラの読み取りを停止しました")
+            return
+        
+        if self.reader is None:
+            messagebox.showwarning("警告", "EasyOCRの初期化が完了していません")
+            return
+        
+        stop = threading.Event()
+        self.camera_stop = stop
+        detector = frame_stream.ChangeDetector()
+        text_filter = frame_stream.NewTextFilter()
+        rate = int(tts_cache.BASE_RATE * self.speed_var.get())
+        volume = round(self.volume_var.get(), 2)
+        # 新しい文は読み上げ中の文のあとに続けて読む（読み上げを最初からやり直さない）
+        sentence_queue = queue.Queue()
+        
+        self.update_recognized_text("")
+        self.camera_button.configure(text="カメラを停止")
+        self.status_var.set("カメラで読み取り中...")
+        if self.speaker is not None:
+            self.speaker.speak_iter(iter(sentence_queue.get, None), rate, volume)
+        
+        def recognize(job, frame):
+            try:
+                # 映像のフレームは毎回違うので、結果キャッシュは使わない
+                results = ocr_results.OCRResults.from_readtext(
+                    self.reader.readtext(self.preprocess_image_for_ocr(frame))
+                )
+            except Exception as e:
+                # フレームごとにダイアログを出すと閉じきれないので、ステータスバーに出して次のフレームを待つ
+                error_msg = str(e)
+                print(f"カメラの文字認識エラー: {error_msg}")
+                self.run_if_current(job, lambda: self.status_var.set(f"文字認識中にエラーが発生しました: {error_msg}"))
+                return
+            # 文字認識は1つのワーカーで順番に行うので、text_filter を同時に触ることはない
+            fresh = text_filter.new_lines(results.filter(0.1).sorted().texts)
+            if fresh:
+                text = "".join(line + "\n" for line in fresh)
+                self.run_if_current(job, lambda: self.append_recognized_text(text))
+                for sentence in speech_stream.split_sentences(text):
+                    sentence_queue.put(sentence)
+        
+        def capture():
+            try:
+                for frame in frame_stream.iter_frames(frame_stream.CAMERA_SOURCE, stop_event=stop):
+                    if not detector.should_recognize(frame):
+                        continue
+                    self.root.after(0, lambda frame=frame: self.show_camera_frame(stop, frame))
+                    # 前のフレームの認識がまだ始まっていなければ取り消し、新しいフレームを読む
+                    self.jobs.submit(lambda job, frame=frame: recognize(job, frame),
+                                     ocr_jobs.PRIORITY_CURRENT, group="camera")
+            except Exception as e:
+                error_msg = str(e)
+                print(f"カメラ読み取りエラー: {error_msg}")
+                self.root.after(0, lambda: messagebox.showerror("エラー", f"カメラの読み取り中にエラーが発生しました: {error_msg}"))
+            finally:
+                # 残っている認識が終わってから、読み上げに終わりの合図を送る
+                self.jobs.submit(lambda job: sentence_queue.put(None), ocr_jobs.PRIORITY_BACKGROUND)
+                self.root.after(0, lambda: self.camera_finished(stop))
+        
+        threading.Thread(target=capture, daemon=True).start()
+    
+    def show_camera_frame(self, stop, frame):
+        """認識に回したフレームを表示"""
+        if stop is not self.camera_stop:
+            return
+        photo = ImageTk.PhotoImage(image_buffer.to_pil(folder_browser.shrink_for_display(frame)))
+        self.image_label.configure(image=photo, text="")
+        self.image_label.image = photo
+    
+    def camera_finished(self, stop):
+        """映像が終わったとき（動画ファイルの最後など）にボタンを元に戻す"""
+        if stop is self.camera_stop:
+            self.camera_stop = None
+            self.camera_button.configure(text="カメラで読み取り")
+            self.status_var.set("カメラの読み取りが終わりました")
+    
     def speak_text(self):
         """テキストを音声で読み上げ"""
         if not self.recognized_text.strip():
             messagebox.showwarning("警告", "読み上げるテキストがありません")
             return
         
-        if self.engine is None:
+        if self.engine is None or self.speaker is None:
             messagebox.showwarning("警告", "音声エンジンが初期化されていません")
             return
         
-        def speak():
-            try:
-                # 音声設定を適用
-                self.engine.setProperty('rate', int(150 * self.speed_var.get()))
-                self.engine.setProperty('volume', self.volume_var.get())
-                
-                # テキストを読み上げ
-                self.engine.say(self.recognized_text)
-                self.engine.runAndWait()
-                
-            except Exception as e:
-                error_msg = str(e)
-                self.root.after(0, lambda: messagebox.showerror("エラー", f"音声読み上げ中にエラーが発生しました: {error_msg}"))
+        # 音声設定（Tkの変数はメインスレッドで読む）
+        rate = int(tts_cache.BASE_RATE * self.speed_var.get())
+        volume = round(self.volume_var.get(), 2)
+        
+        def on_error(e):
+            error_msg = str(e)
+            self.root.after(0, lambda: messagebox.showerror("エラー", f"音声読み上げ中にエラーが発生しました: {error_msg}"))
         
-        # バックグラウンドで実行
-        threading.Thread(target=speak, daemon=True).start()
+        # 文ごとに合成して、再生中に次の文を合成しておく（合成済みの文はキャッシュを使う）
+        self.speaker.speak(
+            self.recognized_text, rate, volume,
+            on_error=on_error,
+            on_finish=lambda: self.root.after(0, lambda: self.status_var.set("音声読み上げが完了しました")),
+        )
         self.status_var.set("音声読み上げ中...")
     
+    def skip_sentence(self):
+        """読み上げ中の文を飛ばして次の文へ"""
+        if self.speaker is not None:
+            self.speaker.skip()
+    
     def stop_speech(self):
         """音声読み上げを停止"""
+        if self.speaker is not None:
+            self.speaker.stop()
         if self.engine:
             self.engine.stop()
         self.status_var.set("音声読み上げを停止しました")
@@ -0,0 +1,177 @@
+"""
+文字の検出・認識モデルを動かす方法（推論バックエンド）の切り替え
+- "torch": EasyOCR そのまま。CPU では認識モデルが INT8 に動的量子化されます（EasyOCR の既定）
+- "torch_fp32": 量子化しない PyTorch モデル（精度を比べるときの基準用）
+- "onnx": 検出（CRAFT）と認識モデルを ONNX に書き出し、ONNX Runtime で動かします
+  （pip install onnxruntime が必要。書き出したファイルは モデル保存先/onnx/ に残り、次回から使い回します）
+
+どのバックエンドでも、1つの推論で使うスレッド数（intra-op）を set_intra_op_threads() で変えられます。
+"""
+
+import os
+import threading
+from typing import Optional, Tuple
+
+BACKENDS = ("torch", "torch_fp32", "onnx")
+DEFAULT_BACKEND = "torch"
+# 1つの推論で使うスレッド数（0 なら各ライブラリの既定 = CPU のコア数）
+INTRA_OP_THREADS = 0
+# ONNX に書き出すときの opset
+ONNX_OPSET = 17
+
+_intra_op_threads = INTRA_OP_THREADS
+
+
+def set_intra_op_threads(threads: int) -> None:
+    """推論で使うスレッド数を設定します（PyTorch はすぐに、ONNX Runtime は次に作るセッションから）。"""
+    global _intra_op_threads
+    _intra_op_threads = max(0, int(threads))
+    if _intra_op_threads:
+        try:
+            import torch
+
+            torch.set_num_threads(_intra_op_threads)
+        except ImportError:
+            pass
+
+
+def validate(backend: str, gpu: bool) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"推論バックエンドは {', '.join(BACKENDS)} のどれかにしてください: {backend!r}")
+    if backend == "onnx" and gpu:
+        raise ValueError("onnx バックエンドは CPU 専用です（gpu=False にしてください）")
+
+
+def quantize_for(backend: str) -> bool:
+    """easyocr.Reader(quantize=...) に渡す値です。"""
+    # onnx は量子化前の重みから書き出します
+    return backend == "torch"
+
+
+class OnnxModule:
+    """ONNX Runtime のセッションを、EasyOCR からは PyTorch のモデルと同じように呼べるようにします。
+
+    セッションは最初に使うときに作ります（デーモンが fork した後の各プロセスで作られるように）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._session = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                import onnxruntime
+
+                options = onnxruntime.SessionOptions()
+                if _intra_op_threads:
+                    options.intra_op_num_threads = _intra_op_threads
+                options.inter_op_num_threads = 1
+                self._session = onnxruntime.InferenceSession(
+                    self.path, options, providers=["CPUExecutionProvider"]
+                )
+                self._pid = os.getpid()
+            return self._session
+
+    def eval(self) -> "OnnxModule":
+        return self  # EasyOCR が model.eval() を呼ぶため
+
+    def __call__(self, *inputs):
+        import torch
+
+        session = self.session
+        # 認識モデルは (画像, テキスト) で呼ばれますが、ONNX の入力は画像だけです
+        feeds = {
+            spec.name: tensor.detach().cpu().numpy()
+            for spec, tensor in zip(session.get_inputs(), inputs)
+        }
+        outputs = [torch.from_numpy(output) for output in session.run(None, feeds)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+def _unwrap(model):
+    return getattr(model, "module", model)  # DataParallel の中身
+
+
+def onnx_paths(model_dir: str, recog_network: str) -> Tuple[str, str]:
+    directory = os.path.join(model_dir, "onnx")
+    return (
+        os.path.join(directory, "craft_detector.onnx"),
+        os.path.join(directory, f"{recog_network}_recognizer.onnx"),
+    )
+
+
+def _temp_path(path: str) -> str:
+    """書き出し途中のファイル名です（複数のプロセスが同時に書き出しても混ざらないよう、プロセスごとに別にします）。"""
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def export_onnx(reader, model_dir: str, recog_network: str) -> Tuple[str, str]:
+    """リーダーの検出・認識モデルを ONNX に書き出します（書き出し済みなら何もしません）。"""
+    import torch
+    from easyocr.config import imgH
+
+    detector_path, recognizer_path = onnx_paths(model_dir, recog_network)
+    os.makedirs(os.path.dirname(detector_path), exist_ok=True)
+
+    class RecognizerForExport(torch.nn.Module):
+        """認識モデルの2つ目の引数（テキスト）は使われないので、画像だけを入力にします。"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image):
+            return self.model(image, None)
+
+    exports = [
+        (detector_path, _unwrap(reader.detector), torch.zeros(1, 3, 640, 640),
+         ["image"], ["y", "feature"],
+         {"image": {0: "batch", 2: "height", 3: "width"},
+          "y": {0: "batch", 1: "out_height", 2: "out_width"},
+          "feature": {0: "batch", 2: "out_height", 3: "out_width"}}),
+        (recognizer_path, RecognizerForExport(_unwrap(reader.recognizer)), torch.zeros(1, 1, imgH, imgH * 4),
+         ["image"], ["preds"],
+         {"image": {0: "batch", 3: "width"}, "preds": {0: "batch", 1: "steps"}}),
+    ]
+    for path, model, dummy, input_names, output_names, dynamic_axes in exports:
+        if os.path.exists(path):
+            continue
+        print(f"ONNX に書き出し中: {path}")
+        model.eval()
+        tmp_path = _temp_path(path)
+        with torch.no_grad():
+            torch.onnx.export(
+                model, (dummy,), tmp_path, input_names=input_names, output_names=output_names,
+                dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET,
+            )
+        os.replace(tmp_path, path)  # 書き出しの途中で止まっても、壊れたファイルを使わないように
+    return detector_path, recognizer_path
+
+
+def _quantize_recognizer(reader) -> None:
+    """認識モデルを INT8 に動的量子化します（quantize=True で作ったときと同じ）。"""
+    import torch
+
+    torch.quantization.quantize_dynamic(_unwrap(reader.recognizer), dtype=torch.qint8, inplace=True)
+
+
+def apply(reader, backend: str, model_dir: str, recog_network: str):
+    """作ったリーダーを、バックエンドに合わせて差し替えます。"""
+    if backend != "onnx":
+        return reader
+    try:
+        import onnxruntime  # noqa: F401  使えるかどうかを書き出す前に確かめます
+
+        detector_path, recognizer_path = export_onnx(reader, model_dir, recog_network)
+    except Exception as e:
+        # 使えなければ、いつもの（量子化した）PyTorch モデルで動かします
+        print(f"ONNX バックエンドを使えません。torch で動かします: {e}")
+        _quantize_recognizer(reader)
+        return reader
+    reader.detector = OnnxModule(detector_path)
+    reader.recognizer = OnnxModule(recognizer_path)
+    return reader
@@ -0,0 +1,125 @@
+"""
+複数の画像をまとめて文字認識する処理（マイクロバッチ）
+- readtext() は画像1枚ずつ「検出 → 認識」を行い、認識は1枚分の文字領域だけで動きます
+- ここでは先に全画像の文字領域を検出し、切り出した領域をまとめて認識器に通します
+- 最後に結果を元の画像ごとに振り分けるので、戻り値は readtext(detail=1) と同じ形です
+
+幅がばらばらの領域を同じバッチに入れると、一番幅の広い領域に合わせた余白の計算が
+増えてしまいます。そのため領域を幅の順に並べ、近い幅どうしでバッチを作ります。
+
+easyocr（と PyTorch）の読み込みには時間がかかるため、実際に使うときに読み込みます。
+"""
+
+import math
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+import ocr_results
+import stage_metrics
+
+# 1回の認識でまとめて処理する領域の数
+RECOGNIZE_BATCH_SIZE = 32
+
+Region = Tuple[list, np.ndarray]  # (座標, 切り出した領域の画像)
+
+
+def detect_regions(reader, image) -> Tuple[np.ndarray, list, list]:
+    """文字領域の検出だけを行います。
+
+    戻り値は (グレースケール画像, 横書きの領域リスト, 傾いた領域リスト) です。
+    """
+    from easyocr.utils import reformat_input
+
+    img, img_cv_grey = reformat_input(image)
+    horizontal_list, free_list = reader.detect(img)
+    return img_cv_grey, horizontal_list[0], free_list[0]
+
+
+def crop_regions(img_cv_grey: np.ndarray, horizontal_list: list, free_list: list) -> List[Region]:
+    """検出した領域を、認識器の高さ（imgH）にそろえて切り出します。"""
+    from easyocr.config import imgH
+    from easyocr.utils import get_image_list
+
+    image_list, _ = get_image_list(horizontal_list, free_list, img_cv_grey, model_height=imgH)
+    return image_list
+
+
+def _ignore_char(reader) -> str:
+    """Reader.recognize() と同じく、選んだ言語以外の文字を無視する設定を作ります。"""
+    return "".join(set(reader.character) - set(reader.lang_char))
+
+
+def recognize_regions(reader, regions: Sequence[Region],
+                      batch_size: int = RECOGNIZE_BATCH_SIZE) -> List[Tuple[list, str, float]]:
+    """切り出した領域をまとめて認識し、入力と同じ順番で (座標, テキスト, 信頼度) を返します。"""
+    if not regions:
+        return []
+    from easyocr.config import imgH
+    from easyocr.recognition import get_text
+
+    ignore_char = _ignore_char(reader)
+
+    def recognize_chunk(chunk: List[Region]) -> List[Tuple[list, str, float]]:
+        max_ratio = max(crop.shape[1] / max(1, crop.shape[0]) for _, crop in chunk)
+        max_width = math.ceil(max(1.0, max_ratio)) * imgH
+        return get_text(
+            reader.character, imgH, int(max_width), reader.recognizer, reader.converter, chunk,
+            ignore_char, "greedy", 5, len(chunk), 0.1, 0.5, 0.003, 0, reader.device,
+        )
+
+    with stage_metrics.span("recognize", boxes=len(regions)):
+        return batch_by_width(regions, batch_size, recognize_chunk)
+
+
+def batch_by_width(regions: Sequence[Region], batch_size: int,
+                   recognize_chunk: Callable[[List[Region]], list]) -> list:
+    """領域を幅（縦横比）の小さい順に並べ、近い幅どうしのバッチで recognize_chunk に渡します。
+
+    戻り値は入力と同じ順番に戻した結果です。
+    """
+    order = sorted(range(len(regions)), key=lambda i: regions[i][1].shape[1] / max(1, regions[i][1].shape[0]))
+    results: list = [None] * len(regions)
+    for start in range(0, len(order), max(1, batch_size)):
+        indices = order[start:start + batch_size]
+        for i, result in zip(indices, recognize_chunk([regions[i] for i in indices])):
+            results[i] = result
+    return results
+
+
+def recognize_many(reader, images: Sequence[np.ndarray],
+                   batch_size: int = RECOGNIZE_BATCH_SIZE) -> List[List[Tuple[list, str, float]]]:
+    """複数の画像をまとめて認識し、画像ごとの readtext(detail=1) 形式の結果を返します。"""
+    all_regions: List[Region] = []
+    owners: List[int] = []
+    for index, image in enumerate(images):
+        img_cv_grey, horizontal_list, free_list = detect_regions(reader, image)
+        regions = crop_regions(img_cv_grey, horizontal_list, free_list)
+        all_regions.extend(regions)
+        owners.extend([index] * len(regions))
+
+    per_image: List[List[Tuple[list, str, float]]] = [[] for _ in images]
+    for owner, result in zip(owners, recognize_regions(reader, all_regions, batch_size)):
+        per_image[owner].append(result)
+    return per_image
+
+
+def sort_reading_order(regions: Sequence[Region]) -> List[Region]:
+    """上の行から順に、同じ行なら左から読む順番に並べます（並べ方は ocr_results.reading_order）。"""
+    if not regions:
+        return []
+    order = ocr_results.reading_order(np.asarray([box for box, _ in regions], dtype=np.float32))
+    return [regions[i] for i in order]
+
+
+def iter_recognized_regions(reader, image, batch_size: int = 1) -> Iterator[Tuple[list, str, float]]:
+    """先に文字領域を検出し、読む順番に1つずつ認識した結果を順に返します（ジェネレーター）。
+
+    全体の認識が終わるのを待たずに、認識できた領域から読み上げなどに回せます。
+    batch_size を大きくすると、その数ずつまとめて認識してから返します。
+    """
+    img_cv_grey, horizontal_list, free_list = detect_regions(reader, image)
+    regions = sort_reading_order(crop_regions(img_cv_grey, horizontal_list, free_list))
+    for start in range(0, len(regions), max(1, batch_size)):
+        for result in recognize_regions(reader, regions[start:start + batch_size], batch_size):
+            yield result
@@ -0,0 +1,147 @@
+"""
+文字認識結果のキャッシュ
+- 画像の中身（バイト列）のハッシュ＋前処理・リーダーの設定をキーにして、結果を覚えておきます
+- メモリ上の LRU と、SQLite ファイルに保存するディスク上のキャッシュの2段構えです
+- ディスク上のキャッシュは合計サイズの上限を超えると、古く使われていないものから消します
+- 同じ画像をもう一度認識するときは、モデルを動かさずにすぐ結果を返せます
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# === キャッシュの設定 ===
+# ディスク上のキャッシュの保存先
+CACHE_PATH = os.path.join(".", "cache", "ocr_results.sqlite3")
+# メモリ上に持っておく件数
+MEMORY_ENTRIES = 256
+# ディスク上のキャッシュの合計サイズの上限（バイト）
+DISK_MAX_BYTES = 64 * 1024 * 1024
+
+
+def make_key(image: Any, config: Optional[Dict[str, Any]] = None) -> str:
+    """画像と設定からキャッシュのキーを作ります。
+
+    image にはファイルの中身（bytes）か、OpenCV の画像（numpy 配列）を渡せます。
+    config には前処理やリーダーの設定など、結果が変わる値をすべて入れてください。
+    """
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(image, np.ndarray):
+        h.update(f"{image.shape}{image.dtype}".encode("ascii"))
+        h.update(np.ascontiguousarray(image).data)
+    else:
+        h.update(bytes(image))
+    h.update(json.dumps(config or {}, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+class OCRResultCache:
+    """メモリ（LRU）とディスク（SQLite）の2段の結果キャッシュ"""
+
+    def __init__(self, path: Optional[str] = CACHE_PATH, memory_entries: int = MEMORY_ENTRIES,
+                 disk_max_bytes: int = DISK_MAX_BYTES):
+        self.memory_entries = max(0, int(memory_entries))
+        self.disk_max_bytes = max(0, int(disk_max_bytes))
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 複数のスレッド・プロセスから使うため、ロック待ちの時間を長めにします
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        """キャッシュにあれば結果を、なければ None を返します。"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """結果を保存します（JSON に変換できる値だけ保存できます）。"""
+        payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._remember(key, value)
+            if self._db is None or len(payload) > self.disk_max_bytes:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _remember(self, key: str, value: Any) -> None:
+        if self.memory_entries == 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        """ディスク上の合計サイズが上限を超えていたら、古く使われていないものから消します。"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM results ORDER BY last_used").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.disk_max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def clear(self) -> None:
+        """メモリとディスクのキャッシュをすべて消します。"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_shared_cache: Optional[OCRResultCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_result_cache() -> OCRResultCache:
+    """プロセス全体で共有する結果キャッシュを返します（最初に使うときに開きます）。"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = OCRResultCache()
+        return _shared_cache
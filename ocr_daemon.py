@@ -0,0 +1,227 @@
+"""
+OCRモデルを読み込んだまま待機する常駐プロセス（デーモン）
+- 起動時に1回だけリーダーを読み込み、ワーカープロセスを先に作って（pre-fork）待機します
+- ocr_from_path.py はデーモンが動いていれば Unix ソケット経由で仕事を渡すので、
+  毎回のモデル読み込み（数秒）がなくなります
+- Unix ソケットと fork を使うため、macOS / Linux 専用です
+
+使い方:
+    python ocr_daemon.py --workers 2          # 前面で起動（Ctrl+C で停止）
+    python ocr_daemon.py --detach             # 裏で起動
+    python ocr_daemon.py --stop               # 停止
+    python ocr_from_path.py                   # デーモンが動いていれば自動で使います
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+# === デーモンの設定 ===
+# 待ち受けるソケットのパス
+SOCKET_PATH = os.path.join(tempfile.gettempdir(), f"img2speech-ocr-{os.getuid() if hasattr(os, 'getuid') else 0}.sock")
+# 同時に処理するワーカープロセスの数
+NUM_WORKERS = 2
+# デーモンへの接続を待つ時間（秒）。つながらなければ自分で処理します
+CONNECT_TIMEOUT = 0.5
+
+
+def _send(conn: socket.socket, message: Dict[str, object]) -> None:
+    conn.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _receive(conn: socket.socket) -> Optional[Dict[str, object]]:
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode("utf-8")) if data.strip() else None
+
+
+def request(message: Dict[str, object], socket_path: str = SOCKET_PATH,
+            timeout: Optional[float] = None) -> Optional[Dict[str, object]]:
+    """デーモンに1件送って返事を受け取ります（デーモンが動いていなければ None）。"""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.settimeout(CONNECT_TIMEOUT)
+        conn.connect(socket_path)
+        conn.settimeout(timeout)
+        _send(conn, message)
+        return _receive(conn)
+    except (ConnectionError, FileNotFoundError, socket.timeout):
+        return None
+    finally:
+        conn.close()
+
+
+def config_key(config: Dict[str, object]) -> str:
+    """読み取り結果が変わる設定から、比べるための短い文字列を作ります。"""
+    return hashlib.blake2b(json.dumps(config, sort_keys=True, default=str).encode("utf-8"),
+                           digest_size=16).hexdigest()
+
+
+def try_read_lines(path: str, config: Dict[str, object],
+                   socket_path: str = SOCKET_PATH) -> Optional[List[str]]:
+    """デーモンに画像の読み取りを頼みます。デーモンが使えなければ None を返します。
+
+    config には呼び出し側の設定（ocr_from_path._result_cache_config()）を渡します。
+    デーモンが起動時に読み込んだ設定と違うときも None を返します（呼び出し側で読み取ってください）。
+    """
+    reply = request({"path": os.path.abspath(path), "config": config_key(config)}, socket_path)
+    if reply is None:
+        return None
+    if reply.get("stale"):
+        print("デーモンの設定が今の設定と違うため、デーモンを使わずに読み取ります"
+              "（python ocr_daemon.py --stop で止めてから起動し直してください）", file=sys.stderr)
+        return None
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    return list(reply["lines"])
+
+
+def _handle(conn: socket.socket) -> None:
+    """1つの接続の依頼を処理します（ワーカープロセスの中で呼ばれます）。"""
+    import ocr_from_path
+
+    try:
+        message = _receive(conn)
+        if message is None:
+            return
+        if message.get("cmd") == "ping":
+            _send(conn, {"ok": True, "pid": os.getpid()})
+            return
+        # 起動後に設定（定数）が書き換えられていたら、古い設定の結果は返さない
+        if message.get("config") != config_key(ocr_from_path._result_cache_config()):
+            _send(conn, {"stale": True, "error": "デーモンの設定が依頼の設定と違います"})
+            return
+        try:
+            lines = ocr_from_path.read_lines_from_file(str(message["path"]))
+            _send(conn, {"lines": lines})
+        except Exception as e:
+            _send(conn, {"error": str(e)})
+    finally:
+        conn.close()
+
+
+def _worker_loop(server: socket.socket, threads: int) -> None:
+    """ワーカープロセス: 同じソケットで接続を待ち、1件ずつ処理します。"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C は親プロセスがまとめて処理
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    import inference_backend
+
+    inference_backend.set_intra_op_threads(threads)
+
+    # 最初の依頼が遅くならないよう、小さな画像で一度動かしておきます（ウォームアップ）
+    import numpy as np
+    import ocr_from_path
+
+    ocr_from_path.get_reader().readtext(np.full((32, 32), 255, dtype=np.uint8))
+
+    while True:
+        conn, _ = server.accept()
+        _handle(conn)
+
+
+def serve(socket_path: str = SOCKET_PATH, workers: int = NUM_WORKERS) -> None:
+    """リーダーを読み込んでからワーカーを作り、停止されるまで待機します。
+
+    動いている間は「ソケットのパス + .pid」にプロセス番号を書いておきます（--stop で使います）。
+    """
+    import ocr_from_path
+
+    if not hasattr(socket, "AF_UNIX") or not hasattr(os, "fork"):
+        raise RuntimeError("このOSではデーモンを使えません（macOS / Linux 専用です）")
+    if request({"cmd": "ping"}, socket_path) is not None:
+        raise RuntimeError(f"デーモンはすでに動いています: {socket_path}")
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # 前回の残り
+
+    # fork する前に読み込むと、モデルのメモリをワーカー間で共有できます
+    # （PyTorch のスレッドが動き出す前に fork するため、ここでは推論しません）
+    print("リーダーを読み込み中...")
+    ocr_from_path.get_reader()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(64)
+    with open(_pid_path(socket_path), "w") as f:
+        f.write(str(os.getpid()))
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _worker_loop(server, threads)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f"デーモンを起動しました（ワーカー {workers} 個）: {socket_path}")
+
+    def shutdown(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    try:
+        for _ in children:
+            os.wait()
+    finally:
+        server.close()
+        for path in (socket_path, _pid_path(socket_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _pid_path(socket_path: str) -> str:
+    return socket_path + ".pid"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="OCRモデルを読み込んだまま待機するデーモン")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="ワーカープロセスの数")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="待ち受けるソケットのパス")
+    parser.add_argument("--detach", action="store_true", help="裏で起動する")
+    parser.add_argument("--stop", action="store_true", help="動いているデーモンを停止する")
+    args = parser.parse_args(argv)
+
+    if args.stop:
+        try:
+            with open(_pid_path(args.socket)) as f:
+                os.kill(int(f.read().strip()), signal.SIGTERM)
+            print("デーモンを停止しました")
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"デーモンを停止できませんでした: {e}", file=sys.stderr)
+            return 1
+
+    if args.detach and os.fork() > 0:
+        return 0  # 親プロセスはすぐに戻る
+    if args.detach:
+        os.setsid()
+
+    try:
+        serve(args.socket, max(1, args.workers))
+        return 0
+    except Exception as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,16 +3,35 @@
 - 画像のパスなどを下の定数で設定します（引数は不要）
 - 最小限の前処理で、読み取ったテキストを表示します
 - 必要に応じて設定を少し変えられるようにしています
+- たくさんの画像は「--batch フォルダ」でまとめて読み取れます（結果は JSONL）
+- 複数ページの TIFF・PDF は1ページずつ読み込んで、ページごとに結果を出します
+- 決まった形の用紙は「--template 名前」で、読みたい欄だけを読み取れます
+- OCRモデル（easyocr と PyTorch）は使う直前に読み込むので、--help や --check はすぐ終わります
 """
 
+import argparse
+import functools
+import glob
+import json
+import multiprocessing
 import os
 import sys
-from typing import List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 
 import cv2
-import easyocr
 import numpy as np
 
+import inference_backend
+import ocr_cache
+import ocr_results
+import page_stream
+import preprocessing
+import reader_cache
+import roi_templates
+import stage_metrics
+import text_presence
+import tiled_ocr
+
 
 # === 1) 基本設定（ここを変更して使います） ===
 # 読み取る画像（相対パスでも絶対パスでもOK）
@@ -30,13 +49,21 @@ MODEL_DIR = "./models"
 # GPUを使うか（CPUで十分なら False のままでOK）
 USE_GPU = False
 
+# モデルを動かす方法（推論バックエンド）
+# "torch": いつもの EasyOCR（CPU では認識モデルを INT8 に量子化して動かします）
+# "torch_fp32": 量子化しない（精度の基準用） / "onnx": ONNX Runtime で動かす（pip install onnxruntime）
+INFERENCE_BACKEND = "torch"
+# 1つの推論で使うスレッド数（0 なら CPU のコア数。バッチモードでは TORCH_THREADS_PER_WORKER を使います）
+INFERENCE_THREADS = 0
+
 
 # === 2) 前処理の設定（読みやすくするための軽い加工） ===
 # 前処理を使うか
 USE_PREPROCESS = True
 
 # 画像をどれくらい大きくするか（2.0 なら縦横2倍）
-RESIZE_SCALE = 2.0
+# "auto" なら文字の大きさを見て自動で決めます（大きい文字の画像は縮小して速くします）
+RESIZE_SCALE = "auto"
 
 # ぼかしのカーネルサイズ（奇数推奨: 3, 5 など）
 BLUR_KERNEL = 3
@@ -51,6 +78,16 @@ THRESH_METHOD = "otsu"  # or "adaptive"
 # ROI = (x, y, w, h) 形式で指定。例: ROI = (100, 50, 400, 200)
 ROI: Optional[Tuple[int, int, int, int]] = None
 
+# 決まった形の用紙（伝票など）では、読みたい欄だけを名前をつけて指定できます（ROI より優先）
+# 例: ROI_TEMPLATES = {"receipt": {"date": (40, 30, 300, 40), "total": (400, 900, 250, 60)}}
+ROI_TEMPLATES: Dict[str, Dict[str, Tuple[int, int, int, int]]] = {}
+# テンプレートを JSON ファイルから読むときのパス（None なら読みません）
+ROI_TEMPLATES_FILE: Optional[str] = None
+# 使うテンプレートの名前（None なら使いません。--template でも指定できます）
+ROI_TEMPLATE: Optional[str] = None
+# テンプレートの欄を同時に読み取る数（1 なら1欄ずつ）
+ROI_WORKERS = 1
+
 
 # === 4) 出力の設定 ===
 # DETAIL=0: 文字だけの結果 / DETAIL=1: 座標や信頼度も（内部で使う）
@@ -60,11 +97,69 @@ MIN_CONFIDENCE = 0.0
 # すべての行を1行にまとめて表示するか
 JOIN_LINES = False
 
+# とても大きな画像（tiled_ocr.TILE_THRESHOLD_PIXELS 画素より大きい）をタイルに分けて読むか
+# （分けると、画像の大きさに関係なくメモリの使用量がほぼ一定になります）
+USE_TILING = True
+
+# 文字がなさそうな画像を、認識の前に見分けて省くか（たくさんの画像をまとめて読むときに速くなります）
+# None: 使わない / "edges": 輪郭の量と文字らしい形で判定（モデル不要・とても速い）
+# "craft": 縮小画像で文字領域の検出だけを行い、見つかった領域だけを認識する
+TEXT_PREFILTER: Optional[str] = None
+
+# OCRデーモン（ocr_daemon.py）が動いていれば、読み取りを任せるか
+# （モデルを読み込んだまま待っているので、毎回の読み込み時間がなくなります）
+USE_DAEMON = True
+
+# 一度読み取った画像の結果を覚えておくか（同じ画像なら一瞬で結果が出ます）
+USE_RESULT_CACHE = True
+
 # デバッグ用：前処理画像をファイル保存するか
 DEBUG_SAVE = False
 DEBUG_SAVE_PATH = os.path.join(os.path.dirname(__file__), "preprocessed.png")
 
 
+# === 5) まとめて処理（バッチモード）の設定 ===
+# 「--batch フォルダ or パターン」を付けて実行したときに使います
+# 同時に動かすプロセス数（0 なら CPU のコア数）
+BATCH_WORKERS = 0
+# 1プロセスあたりの PyTorch スレッド数（1 にするとコア数に比例して速くなりやすい）
+TORCH_THREADS_PER_WORKER = 1
+# フォルダを指定したときに読み取る拡張子
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".pdf")
+
+
+def validate_settings() -> List[str]:
+    """設定（上の定数）の間違いを探して、見つかった問題のリストを返します。"""
+    problems: List[str] = []
+    if not os.path.exists(IMAGE_PATH):
+        problems.append(f"IMAGE_PATH の画像が見つかりません: {IMAGE_PATH}")
+    if not LANGS:
+        problems.append("LANGS が空です")
+    if RESIZE_SCALE != "auto" and not isinstance(RESIZE_SCALE, (int, float)):
+        problems.append(f"RESIZE_SCALE は数値か \"auto\" にしてください: {RESIZE_SCALE!r}")
+    if THRESH_METHOD not in ("otsu", "adaptive"):
+        problems.append(f"THRESH_METHOD は \"otsu\" か \"adaptive\" にしてください: {THRESH_METHOD!r}")
+    if INFERENCE_BACKEND not in inference_backend.BACKENDS:
+        problems.append(f"INFERENCE_BACKEND は {', '.join(inference_backend.BACKENDS)} のどれかにしてください: {INFERENCE_BACKEND!r}")
+    elif INFERENCE_BACKEND == "onnx" and USE_GPU:
+        problems.append("INFERENCE_BACKEND = \"onnx\" は CPU 専用です（USE_GPU = False にしてください）")
+    if TEXT_PREFILTER not in (None, "edges", "craft"):
+        problems.append(f"TEXT_PREFILTER は None, \"edges\", \"craft\" のどれかにしてください: {TEXT_PREFILTER!r}")
+    if DETAIL not in (0, 1):
+        problems.append(f"DETAIL は 0 か 1 にしてください: {DETAIL!r}")
+    if ROI is not None and (len(ROI) != 4 or ROI[2] <= 0 or ROI[3] <= 0):
+        problems.append(f"ROI は (x, y, w, h) で、w と h は正の数にしてください: {ROI!r}")
+    if ROI_TEMPLATES_FILE is not None and not os.path.exists(ROI_TEMPLATES_FILE):
+        problems.append(f"ROI_TEMPLATES_FILE が見つかりません: {ROI_TEMPLATES_FILE}")
+    else:
+        templates = get_templates()
+        if ROI_TEMPLATE is not None and ROI_TEMPLATE not in templates:
+            problems.append(f"ROI_TEMPLATE のテンプレートがありません: {ROI_TEMPLATE!r}")
+        for name, template in templates.items():
+            problems.extend(roi_templates.validate_template(name, template))
+    return problems
+
+
 def ensure_odd(n: int) -> int:
     """カーネルサイズが偶数だとエラーになるため、奇数に直します。"""
     return n if n % 2 == 1 else n + 1
@@ -75,9 +170,11 @@ def load_image(path: str) -> np.ndarray:
     if not os.path.exists(path):
         raise FileNotFoundError(f"画像ファイルが見つかりません: {path}")
 
-    image = cv2.imread(path)  # OpenCVはPNG/JPG/BMP/TIFFなどに対応
-    if image is None:
-        raise ValueError("画像の読み込みに失敗しました。形式や破損を確認してください。")
+    with stage_metrics.span("decode") as attrs:
+        image = cv2.imread(path)  # OpenCVはPNG/JPG/BMP/TIFFなどに対応
+        if image is None:
+            raise ValueError("画像の読み込みに失敗しました。形式や破損を確認してください。")
+        attrs.update(stage_metrics.image_attrs(image))
     return image
 
 
@@ -85,16 +182,15 @@ def apply_roi(image: np.ndarray) -> np.ndarray:
     """ROI（読み取り範囲）が指定されていれば、その部分だけ切り出します。"""
     if ROI is None:
         return image
-    x, y, w, h = ROI
-    h_img, w_img = image.shape[:2]
-    # 画像範囲に収まるようにガード
-    x2 = min(x + w, w_img)
-    y2 = min(y + h, h_img)
-    x = max(0, x)
-    y = max(0, y)
-    if x >= x2 or y >= y2:
-        raise ValueError("ROIの指定が不正です（画像範囲外）。")
-    return image[y:y2, x:x2]
+    return roi_templates.crop_rect(image, ROI)
+
+
+def get_templates() -> Dict[str, Dict[str, Tuple[int, int, int, int]]]:
+    """ROI_TEMPLATES と ROI_TEMPLATES_FILE のテンプレートをまとめて返します。"""
+    templates = dict(ROI_TEMPLATES)
+    if ROI_TEMPLATES_FILE is not None:
+        templates.update(roi_templates.load_templates(ROI_TEMPLATES_FILE))
+    return templates
 
 
 def simple_preprocess(image: np.ndarray) -> np.ndarray:
@@ -104,30 +200,7 @@ def simple_preprocess(image: np.ndarray) -> np.ndarray:
     3) 拡大（小さい文字を読みやすく）
     4) 必要なら二値化（白黒はっきり）
     """
-    # グレースケール
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    # ぼかし（カーネルは奇数に）
-    k = ensure_odd(int(BLUR_KERNEL))
-    if k > 1:
-        gray = cv2.GaussianBlur(gray, (k, k), 0)
-
-    # 拡大
-    if RESIZE_SCALE and RESIZE_SCALE > 0 and RESIZE_SCALE != 1.0:
-        h, w = gray.shape[:2]
-        new_w = max(1, int(w * RESIZE_SCALE))
-        new_h = max(1, int(h * RESIZE_SCALE))
-        gray = cv2.resize(gray, (new_w, new_h), interpolation=cv2.INTER_CUBIC)
-
-    # 二値化（必要なときだけ）
-    if USE_THRESHOLD:
-        if THRESH_METHOD == "adaptive":
-            gray = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 5
-            )
-        else:
-            # デフォルトは大津の二値化
-            _, gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    gray = _get_preprocess_pipeline().run(image)
 
     if DEBUG_SAVE:
         cv2.imwrite(DEBUG_SAVE_PATH, gray)
@@ -135,15 +208,37 @@ def simple_preprocess(image: np.ndarray) -> np.ndarray:
     return gray
 
 
-def run_ocr(image: np.ndarray) -> List[str]:
-    """EasyOCRで文字を読み取って、文字列のリストを返します。"""
-    reader = easyocr.Reader(
-        LANGS,
-        gpu=USE_GPU,
-        model_storage_directory=MODEL_DIR,
-        download_enabled=True,
-        recog_network=RECOG_NETWORK,
-    )
+# 設定ごとに組み立てた前処理パイプライン（同じ設定なら使い回します）
+_preprocess_pipelines: Dict[tuple, preprocessing.PreprocessPipeline] = {}
+
+
+def _get_preprocess_pipeline() -> preprocessing.PreprocessPipeline:
+    """今の設定（BLUR_KERNEL など）に合わせた前処理パイプラインを返します。"""
+    settings = (BLUR_KERNEL, RESIZE_SCALE, USE_THRESHOLD, THRESH_METHOD)
+    pipeline = _preprocess_pipelines.get(settings)
+    if pipeline is None:
+        pipeline = preprocessing.PreprocessPipeline(preprocessing.simple_stages(*settings))
+        _preprocess_pipelines[settings] = pipeline
+    return pipeline
+
+
+def get_reader() -> "easyocr.Reader":
+    """設定どおりの EasyOCR リーダーを返します。
+
+    最初の1回だけモデルを読み込み（数秒かかります）、2回目からは同じものを使い回します。
+    """
+    if INFERENCE_THREADS:
+        inference_backend.set_intra_op_threads(INFERENCE_THREADS)
+    return reader_cache.get_reader(LANGS, RECOG_NETWORK, MODEL_DIR, USE_GPU, INFERENCE_BACKEND)
+
+
+def run_ocr(image: np.ndarray, reader: Optional["easyocr.Reader"] = None) -> List[str]:
+    """EasyOCRで文字を読み取って、文字列のリストを返します。
+
+    reader を渡すとそれを使い、渡さなければ共有のリーダーを使います。
+    """
+    if reader is None:
+        reader = get_reader()
 
     # DETAILに応じて読み方を切り替え
     if DETAIL == 0:
@@ -154,43 +249,334 @@ def run_ocr(image: np.ndarray) -> List[str]:
     else:
         # 座標や信頼度も返る
         results = reader.readtext(image, detail=1)
-        lines: List[str] = []
-        for bbox, text, conf in results:
-            if not isinstance(text, str):
-                continue
-            text = text.strip()
-            if not text:
-                continue
-            if conf is not None and conf < float(MIN_CONFIDENCE):
-                continue
-            lines.append(text)
-        return lines
+        return _lines_from_results(results)
+
+
+def _lines_from_results(results) -> List[str]:
+    """readtext(detail=1) の結果から、信頼度が MIN_CONFIDENCE 以上の文字列を取り出します。"""
+    with stage_metrics.span("postprocess") as attrs:
+        # MIN_CONFIDENCE ちょうどの結果も残します
+        kept = ocr_results.OCRResults.from_readtext(results).filter(float(MIN_CONFIDENCE), inclusive=True)
+        lines = [text.strip() for text in kept.texts if text.strip()]
+        attrs["boxes"] = len(kept)
+    return lines
 
 
-def main() -> int:
+def run_ocr_tiled(image: np.ndarray, reader: Optional["easyocr.Reader"] = None) -> List[str]:
+    """大きな画像をタイルに分けて、1タイルずつ前処理・OCRします（メモリを使いすぎないため）。"""
+    if reader is None:
+        reader = get_reader()
+    preprocess = simple_preprocess if USE_PREPROCESS else None
+    return _lines_from_results(tiled_ocr.readtext_tiled(reader, image, preprocess))
+
+
+def read_lines_from_file(path: str, reader: Optional["easyocr.Reader"] = None) -> List[str]:
+    """1つの画像ファイルに「読み込み → ROI → 前処理 → OCR」をまとめて行います。
+
+    USE_RESULT_CACHE が True なら、同じ画像・同じ設定の結果はキャッシュから返します。
+    """
+    return _read_file(path, reader)[0]
+
+
+def _read_file(path: str, reader: Optional["easyocr.Reader"] = None) -> Tuple[List[str], bool]:
+    """read_lines_from_file と同じで、(文字列のリスト, プレフィルターで省いたか) を返します。
+
+    キャッシュから返したときは、省いたかどうかは False になります。
+    """
+    cache_key = None
+    if USE_RESULT_CACHE and os.path.exists(path):
+        with open(path, "rb") as f:
+            cache_key = ocr_cache.make_key(f.read(), _result_cache_config())
+        cached = ocr_cache.get_result_cache().get(cache_key)
+        if cached is not None:
+            return cached, False
+
+    lines, skipped = _recognize(apply_roi(load_image(path)), reader)
+
+    if cache_key is not None:
+        ocr_cache.get_result_cache().put(cache_key, lines)
+    return lines, skipped
+
+
+def read_lines_from_image(image: np.ndarray, reader: Optional["easyocr.Reader"] = None) -> List[str]:
+    """読み込み済みの画像に「ROI → 前処理 → OCR」を行います。"""
+    return _recognize_lines(apply_roi(image), reader)
+
+
+def _recognize_lines(image: np.ndarray, reader: Optional["easyocr.Reader"] = None) -> List[str]:
+    """（切り出し済みの）画像に「前処理 → OCR」を行います。大きな画像はタイルに分けます。"""
+    return _recognize(image, reader)[0]
+
+
+def _recognize(image: np.ndarray, reader: Optional["easyocr.Reader"] = None) -> Tuple[List[str], bool]:
+    """_recognize_lines と同じで、(文字列のリスト, プレフィルターで省いたか) を返します。"""
+    if USE_TILING and tiled_ocr.needs_tiling(image):
+        return run_ocr_tiled(image, reader), False
+    # 輪郭での判定は前処理より安いので、前処理の前に行います
+    if TEXT_PREFILTER == "edges" and text_presence.skip_blank(image):
+        return [], True
+    if USE_PREPROCESS:
+        image = simple_preprocess(image)
+    if TEXT_PREFILTER == "craft":
+        results, skipped = text_presence.readtext_prefiltered(reader or get_reader(), image, "craft")
+        return _lines_from_results(results), skipped
+    return run_ocr(image, reader), False
+
+
+def read_fields_from_file(path: str, template_name: str,
+                          reader: Optional["easyocr.Reader"] = None) -> Dict[str, List[str]]:
+    """テンプレートの欄だけを読み取り、欄の名前 → 文字列のリストを返します。
+
+    ページ全体は読まないので速く、欄ごとの結果は結果キャッシュに覚えておきます。
+    """
+    templates = get_templates()
+    if template_name not in templates:
+        raise ValueError(f"テンプレートがありません: {template_name!r}")
+    image = load_image(path)
+    cache = ocr_cache.get_result_cache() if USE_RESULT_CACHE else None
+    # 欄の結果は欄の画素だけで決まるので、ROI の設定はキーに入れません
+    config = dict(_result_cache_config(), roi=None)
+    return roi_templates.read_fields(
+        image, templates[template_name], lambda crop: _recognize_lines(crop, reader),
+        ROI_WORKERS, cache, config,
+    )
+
+
+def iter_page_lines(path: str, reader: Optional["easyocr.Reader"] = None) -> Iterator[Tuple[int, List[str]]]:
+    """ファイルをページごとに読み取り、(ページ番号, 文字列のリスト) を順に返します。
+
+    複数ページの TIFF・PDF は1ページずつ読み込むので、全ページがメモリに載ることはありません。
+    1ページだけの画像は read_lines_from_file と同じです（ページ番号は 1）。
+    """
+    for page_no, lines, _ in _iter_pages(path, reader):
+        yield page_no, lines
+
+
+def _iter_pages(path: str, reader: Optional["easyocr.Reader"] = None) -> Iterator[Tuple[int, List[str], bool]]:
+    """iter_page_lines と同じで、(ページ番号, 文字列のリスト, プレフィルターで省いたか) を返します。"""
+    if not page_stream.is_multipage(path):
+        yield (1,) + _read_file(path, reader)
+        return
+
+    def read_page(image: np.ndarray) -> Tuple[List[str], bool]:
+        if not USE_RESULT_CACHE:
+            return _recognize(apply_roi(image), reader)
+        # ファイル全体ではなくページの画素でキーを作ります（ファイルを丸ごと読まずに済むため）
+        cache_key = ocr_cache.make_key(image, _result_cache_config())
+        lines = ocr_cache.get_result_cache().get(cache_key)
+        if lines is not None:
+            return lines, False
+        lines, skipped = _recognize(apply_roi(image), reader)
+        ocr_cache.get_result_cache().put(cache_key, lines)
+        return lines, skipped
+
+    for page_no, (lines, skipped) in page_stream.iter_page_results(path, read_page):
+        yield page_no, lines, skipped
+
+
+def _result_cache_config() -> Dict[str, object]:
+    """読み取り結果が変わる設定をまとめます（結果キャッシュのキーに使います）。"""
+    return {
+        "reader": reader_cache.make_key(LANGS, RECOG_NETWORK, MODEL_DIR, USE_GPU, INFERENCE_BACKEND),
+        "roi": ROI,
+        "preprocess": USE_PREPROCESS and {
+            "resize_scale": RESIZE_SCALE,
+            "blur_kernel": BLUR_KERNEL,
+            "threshold": USE_THRESHOLD and THRESH_METHOD,
+        },
+        "detail": DETAIL,
+        "min_confidence": MIN_CONFIDENCE,
+        "prefilter": TEXT_PREFILTER,
+        "tiling": USE_TILING and (tiled_ocr.TILE_SIZE, tiled_ocr.TILE_OVERLAP, tiled_ocr.TILE_THRESHOLD_PIXELS),
+    }
+
+
+def iter_image_paths(target: str) -> Iterator[str]:
+    """フォルダなら中の画像を、それ以外ならワイルドカード（例: "scans/*.png"）として探します。"""
+    if os.path.isdir(target):
+        for name in sorted(os.listdir(target)):
+            path = os.path.join(target, name)
+            if os.path.isfile(path) and name.lower().endswith(IMAGE_EXTENSIONS):
+                yield path
+        return
+    for path in sorted(glob.glob(target, recursive=True)):
+        if os.path.isfile(path):
+            yield path
+
+
+# 各ワーカープロセスで1回だけ作るリーダー
+_worker_reader: Optional["easyocr.Reader"] = None
+
+
+def _init_batch_worker(trace_file: Optional[str] = None, profile_stages: Optional[str] = None) -> None:
+    """ワーカープロセスの開始時に1回だけ呼ばれます（ここでリーダーを作ります）。"""
+    global _worker_reader
+    # spawn で始まったプロセスにも --trace / --profile を引き継ぎます
+    stage_metrics.configure(trace_file, profile_stages)
+    # プロセスごとにスレッドを増やしすぎると、かえって遅くなるため制限します
+    cv2.setNumThreads(1)
+    inference_backend.set_intra_op_threads(max(1, int(TORCH_THREADS_PER_WORKER)))
+    _worker_reader = reader_cache.get_reader(LANGS, RECOG_NETWORK, MODEL_DIR, USE_GPU, INFERENCE_BACKEND)
+
+
+def _ocr_one_file(path: str, template: Optional[str] = None) -> List[Dict[str, object]]:
+    """ワーカーで1ファイルを処理し、JSONL の行（1ページ1行）の結果を返します。
+
+    複数ページのファイルでは、各行に "page"（1から）がつきます。
+    template を指定すると、その欄だけを読んだ結果（"fields"）を返します。
+    プレフィルター（TEXT_PREFILTER）で文字なしとして省いたページには "skipped": true がつきます。
+    """
+    records: List[Dict[str, object]] = []
     try:
-        # 画像の読み込み
-        image = load_image(IMAGE_PATH)
+        if template is not None:
+            return [{"path": path, "fields": read_fields_from_file(path, template, _worker_reader)}]
+        multipage = page_stream.is_multipage(path)
+        for page_no, lines, skipped in _iter_pages(path, _worker_reader):
+            record: Dict[str, object] = {"path": path}
+            if multipage:
+                record["page"] = page_no
+            record["lines"] = lines
+            if skipped:
+                record["skipped"] = True
+            records.append(record)
+    except Exception as e:
+        records.append({"path": path, "error": str(e)})
+    return records
 
-        # 読み取り範囲が設定されていれば切り出し
-        image = apply_roi(image)
 
-        # 前処理（ON/OFF可能）
-        if USE_PREPROCESS:
-            image = simple_preprocess(image)
+def run_batch(target: str, output_path: Optional[str] = None, workers: int = 0,
+              template: Optional[str] = None) -> int:
+    """フォルダやワイルドカードの画像をまとめて読み取り、結果を JSONL で書き出します。
 
-        # OCR実行
-        lines = run_ocr(image)
+    終わった順に1行ずつ書き出すので、途中の結果もすぐファイルに残ります。
+    戻り値は読み取りに失敗したファイルの数です。
+    """
+    paths = list(iter_image_paths(target))
+    if not paths:
+        raise FileNotFoundError(f"画像ファイルが見つかりません: {target}")
 
-        # 表示（1行ずつ、またはまとめて）
-        if lines:
-            if JOIN_LINES:
-                print(" ".join(lines))
-            else:
-                print("\n".join(lines))
+    workers = workers or BATCH_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+
+    ocr_one_file = functools.partial(_ocr_one_file, template=template)
+    out = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    failed = 0
+    skipped = 0
+    try:
+        if workers == 1:
+            _init_batch_worker()
+            records = map(ocr_one_file, paths)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(
+                workers, initializer=_init_batch_worker,
+                initargs=(stage_metrics.TRACE_FILE, ",".join(stage_metrics.PROFILE_STAGES)),
+            )
+            records = pool.imap_unordered(ocr_one_file, paths)
+        try:
+            for file_records in records:
+                for record in file_records:
+                    if "error" in record:
+                        failed += 1
+                    if record.get("skipped"):
+                        skipped += 1
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    note = f"、文字なしで省略 {skipped} 件" if TEXT_PREFILTER else ""
+    print(f"{len(paths)} 件を処理しました（失敗 {failed} 件{note}）", file=sys.stderr)
+    return failed
+
+
+def print_lines(lines: List[str]) -> None:
+    """読み取った文字を表示します（1行ずつ、またはまとめて）。"""
+    if lines:
+        if JOIN_LINES:
+            print(" ".join(lines))
         else:
-            print("（文字が見つかりませんでした）")
+            print("\n".join(lines))
+    else:
+        print("（文字が見つかりませんでした）")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンド引数を読み取ります（引数なしなら IMAGE_PATH を1枚だけ読みます）。"""
+    parser = argparse.ArgumentParser(description="画像の文字を読み取ります")
+    parser.add_argument("--batch", metavar="TARGET",
+                        help="まとめて読み取るフォルダ、またはワイルドカード（例: \"scans/*.png\"）")
+    parser.add_argument("--output", metavar="PATH",
+                        help="バッチ結果（JSONL）の保存先。省略すると画面に出力します")
+    parser.add_argument("--check", action="store_true",
+                        help="設定を確認するだけで終わります（モデルは読み込みません）")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="バッチで使うプロセス数（0 なら BATCH_WORKERS か CPU のコア数）")
+    parser.add_argument("--template", metavar="NAME", default=ROI_TEMPLATE,
+                        help="読みたい欄だけを読むテンプレートの名前（ROI_TEMPLATES で設定）")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="段階ごとの処理時間を JSONL で書き出し、終わったら集計を表示します")
+    parser.add_argument("--profile", metavar="STAGES",
+                        help="cProfile で計測する段階（カンマ区切り。例: detect,preprocess.denoise）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    stage_metrics.configure(args.trace, args.profile)
+    try:
+        return _run(args)
+    finally:
+        if args.trace:
+            print(stage_metrics.format_report(), file=sys.stderr)
+
+
+def _run(args: argparse.Namespace) -> int:
+    if args.check:
+        problems = validate_settings()
+        for problem in problems:
+            print(f"設定エラー: {problem}", file=sys.stderr)
+        if not problems:
+            print("設定に問題はありません")
+        return 1 if problems else 0
+
+    if args.batch:
+        try:
+            return 1 if run_batch(args.batch, args.output, args.workers, args.template) else 0
+        except Exception as e:
+            print(f"エラー: {e}", file=sys.stderr)
+            return 1
 
+    try:
+        if args.template:
+            # テンプレートの欄ごとに「欄の名前: 文字」を表示する
+            for field, lines in read_fields_from_file(IMAGE_PATH, args.template).items():
+                print(f"{field}: {' '.join(lines)}")
+            return 0
+
+        if page_stream.is_multipage(IMAGE_PATH):
+            # 複数ページのファイルは、1ページ読み取るたびに表示する
+            for page_no, lines in iter_page_lines(IMAGE_PATH):
+                print(f"--- {page_no} ページ ---")
+                print_lines(lines)
+            return 0
+
+        # デーモンが動いていれば任せる（モデルの読み込みを待たずに済む）
+        lines = None
+        if USE_DAEMON:
+            import ocr_daemon
+            lines = ocr_daemon.try_read_lines(IMAGE_PATH, _result_cache_config())
+
+        # 読み込み → 読み取り範囲の切り出し → 前処理（ON/OFF可能） → OCR実行
+        if lines is None:
+            lines = read_lines_from_file(IMAGE_PATH)
+
+        print_lines(lines)
         return 0
     except Exception as e:
         print(f"エラー: {e}", file=sys.stderr)
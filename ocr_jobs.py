@@ -0,0 +1,152 @@
+"""
+GUI から文字認識を頼むときの仕事（ジョブ）の順番待ちと取り消し
+- ボタンを押すたびにスレッドを作るのではなく、決まった数のワーカースレッドで順番に処理します
+  （1つのリーダーで同時に推論が重ならないよう、ワーカーは通常1つです）
+- 仕事には番号（ID）と優先度をつけます。数字が小さいほど先に処理します
+- 同じグループ（例: "recognize"）に新しい仕事を出すと、古い仕事は取り消されます
+- 取り消された仕事の結果は、処理が終わっていても捨てられます（古い画像の結果で上書きしない）
+"""
+
+import itertools
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+# 優先度（数字が小さいほど先に処理します）
+PRIORITY_CURRENT = 0      # 今表示している画像
+PRIORITY_BACKGROUND = 10  # 先読みなど、後回しでよいもの
+
+
+class Job:
+    """1件の仕事"""
+
+    def __init__(self, job_id: int, func: Callable[["Job"], object], priority: int,
+                 group: Optional[str], on_done: Optional[Callable[[object], None]],
+                 on_error: Optional[Callable[[Exception], None]],
+                 on_cancel: Optional[Callable[[], None]] = None):
+        self.id = job_id
+        self.func = func
+        self.priority = priority
+        self.group = group
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self._cancelled = threading.Event()
+        self.finished = threading.Event()
+
+    def cancel(self) -> None:
+        """取り消します。処理中なら、func が cancelled を見て途中でやめることができます。"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def __lt__(self, other: "Job") -> bool:
+        # 優先度が同じなら、先に出した仕事から
+        return (self.priority, self.id) < (other.priority, other.id)
+
+    def __repr__(self) -> str:
+        state = "取り消し" if self.cancelled else ("完了" if self.finished.is_set() else "待ち")
+        return f"Job(id={self.id}, group={self.group!r}, priority={self.priority}, {state})"
+
+
+class JobScheduler:
+    """優先度つきの順番待ちと、ワーカースレッドで仕事を処理します。"""
+
+    def __init__(self, workers: int = 1):
+        self._queue: "queue.PriorityQueue[Job]" = queue.PriorityQueue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active: Dict[int, Job] = {}
+        self._threads: List[threading.Thread] = []
+        for _ in range(max(1, workers)):
+            thread = threading.Thread(target=self._run, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func: Callable[[Job], object], priority: int = PRIORITY_CURRENT,
+               group: Optional[str] = None, on_done: Optional[Callable[[object], None]] = None,
+               on_error: Optional[Callable[[Exception], None]] = None,
+               on_cancel: Optional[Callable[[], None]] = None) -> Job:
+        """仕事を出します。func には Job が渡され、戻り値が on_done に渡されます。
+
+        group を指定すると、同じグループのまだ終わっていない仕事を取り消します。
+        on_cancel は始まる前に取り消されて func を動かさなかったときに呼ばれます
+        （func の finally で行う後片付けを、動かなかったときにも行うためのものです）。
+        on_done / on_error / on_cancel はワーカースレッドから呼ばれます（GUI の更新は root.after で行ってください）。
+        """
+        job = Job(next(self._ids), func, priority, group, on_done, on_error, on_cancel)
+        with self._lock:
+            if group is not None:
+                for other in self._active.values():
+                    if other.group == group:
+                        other.cancel()
+            self._active[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """番号を指定して取り消します（見つからなければ False）。"""
+        with self._lock:
+            job = self._active.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_group(self, group: str) -> int:
+        """グループのまだ終わっていない仕事をすべて取り消し、その数を返します。"""
+        with self._lock:
+            jobs = [job for job in self._active.values() if job.group == group]
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def pending(self) -> List[Job]:
+        """まだ終わっていない（取り消されていない）仕事の一覧です。"""
+        with self._lock:
+            return sorted(job for job in self._active.values() if not job.cancelled)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """すべての仕事を取り消し、ワーカーを止めます。"""
+        with self._lock:
+            for job in self._active.values():
+                job.cancel()
+        for _ in self._threads:
+            self._queue.put(_StopJob())
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if isinstance(job, _StopJob):
+                return
+            try:
+                if job.cancelled:
+                    # 始まる前に取り消された仕事は動かさない
+                    if job.on_cancel is not None:
+                        job.on_cancel()
+                    continue
+                try:
+                    result = job.func(job)
+                except Exception as e:
+                    if not job.cancelled and job.on_error is not None:
+                        job.on_error(e)
+                    continue
+                # 処理中に取り消された仕事の結果は捨てる
+                if not job.cancelled and job.on_done is not None:
+                    job.on_done(result)
+            finally:
+                with self._lock:
+                    self._active.pop(job.id, None)
+                job.finished.set()
+
+
+class _StopJob(Job):
+    """ワーカーを止める合図（どの仕事よりも後に取り出されます）"""
+
+    def __init__(self):
+        super().__init__(0, lambda job: None, float("inf"), None, None, None)
@@ -0,0 +1,103 @@
+"""
+GUIに依存しない文字認識の処理
+- アプリ（image_to_speech_app.py）とサーバー（ocr_server.py）で同じ前処理・認識を使います
+"""
+
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+import fused_ocr
+import ocr_batching
+import ocr_cache
+import ocr_results
+import preprocessing
+import stage_metrics
+import tiled_ocr
+
+
+def preprocess_image_for_ocr(image):
+    """OCR用の画像前処理（段階の中身は preprocessing.APP_STAGES を参照）"""
+    try:
+        pipeline = preprocessing.get_app_pipeline()
+        processed = pipeline.run(image)
+        print("前処理の段階ごとの処理時間:\n" + pipeline.format_report())
+        return processed
+
+    except Exception as e:
+        print(f"画像前処理エラー: {e}")
+        return image  # 前処理に失敗した場合は元の画像を返す
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """画像ファイルの中身（バイト列）を OpenCV の画像に変換します。"""
+    with stage_metrics.span("decode", bytes=len(data)) as attrs:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("画像のデコードに失敗しました。形式や破損を確認してください。")
+        attrs.update(stage_metrics.image_attrs(image))
+    return image
+
+
+def results_to_json(results) -> List[Dict[str, object]]:
+    """readtext(detail=1) の結果を JSON に変換できる形にします。"""
+    with stage_metrics.span("postprocess") as attrs:
+        records = ocr_results.OCRResults.from_readtext(results).to_records()
+        attrs["boxes"] = len(records)
+    return records
+
+
+def readtext_cached(reader, image: np.ndarray, reader_config, mode: str = "") -> ocr_results.OCRResults:
+    """reader.readtext(image, detail=1) の結果キャッシュ付き版です（結果は OCRResults で返します）。
+
+    reader_config にはリーダーの設定（reader_cache.make_key() の値など）を、
+    mode には前処理の有無など、同じ画像でも結果が変わる条件を渡します。
+    """
+    cache = ocr_cache.get_result_cache()
+    key = ocr_cache.make_key(image, {"reader": reader_config, "mode": mode, "detail": 1})
+    cached = cache.get(key)
+    if cached is not None:
+        return ocr_results.OCRResults.from_readtext(cached)
+    raw = reader.readtext(image, detail=1)
+    with stage_metrics.span("postprocess") as attrs:
+        results = ocr_results.OCRResults.from_readtext(raw)
+        attrs["boxes"] = len(results)
+    cache.put(key, results.to_records())
+    return results
+
+
+def readtext_fused_cached(reader, image: np.ndarray, reader_config,
+                          processed: Optional[np.ndarray] = None) -> ocr_results.OCRResults:
+    """前処理した画像と元の画像の両方で認識してまとめた結果（fused_ocr）の、結果キャッシュ付き版です。
+
+    processed に前処理済みの画像を渡すと、もう一度前処理はしません。
+    """
+    cache = ocr_cache.get_result_cache()
+    key = ocr_cache.make_key(image, {"reader": reader_config, "mode": "fused", "detail": 1})
+    cached = cache.get(key)
+    if cached is not None:
+        return ocr_results.OCRResults.from_readtext(cached)
+    results = fused_ocr.readtext_fused(reader, image, preprocess_image_for_ocr, processed)
+    cache.put(key, results.to_records())
+    return results
+
+
+def recognize(reader, image: np.ndarray, preprocess: bool = True) -> List[Dict[str, object]]:
+    """画像を（必要なら前処理してから）認識し、JSON 用の結果を返します。
+
+    とても大きな画像はタイルに分けて、1タイルずつ前処理・認識します。
+    """
+    if tiled_ocr.needs_tiling(image):
+        pre = preprocess_image_for_ocr if preprocess else None
+        return results_to_json(tiled_ocr.readtext_tiled(reader, image, pre))
+    if preprocess:
+        image = preprocess_image_for_ocr(image)
+    return results_to_json(reader.readtext(image, detail=1))
+
+
+def recognize_many(reader, images: List[np.ndarray], preprocess: bool = True) -> List[List[Dict[str, object]]]:
+    """複数の画像をまとめて認識します（認識器には全画像の文字領域を一度に通します）。"""
+    if preprocess:
+        images = [preprocess_image_for_ocr(image) for image in images]
+    return [results_to_json(results) for results in ocr_batching.recognize_many(reader, images)]
@@ -0,0 +1,161 @@
+"""
+文字認識の結果をまとめて持つ型（アプリ・コマンド・サーバー・バッチで共通）
+- readtext() の結果（(座標, テキスト, 信頼度) のリスト）を、numpy の配列にまとめて持ちます
+  - 座標: (件数, 4, 2) の float32 / 信頼度: (件数,) の float64
+  - テキスト: 全部を1つの文字列につなげ、各テキストの開始位置を配列で持ちます
+- 信頼度での絞り込み・読む順番への並べ替え・平均は配列のまま計算します
+- 結果の形（2つ組・3つ組・JSON の辞書）の見分けはここだけで行います
+"""
+
+import csv
+import json
+from typing import Dict, IO, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# 信頼度がない結果（2つ組）に使う値
+DEFAULT_CONFIDENCE = 0.5
+
+Result = Tuple[list, str, float]
+
+
+def reading_order(boxes: np.ndarray) -> np.ndarray:
+    """座標（(件数, 4, 2) の配列）を、上の行から順に、同じ行なら左から読む順番の番号を返します。
+
+    上端の差が文字の高さ（全件の中央値）の半分より小さければ同じ行とみなします。
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    tops = boxes[:, :, 1].min(axis=1)
+    heights = boxes[:, :, 1].max(axis=1) - tops
+    lefts = boxes[:, :, 0].min(axis=1)
+    half_height = max(1.0, float(np.median(heights)) / 2)
+
+    by_top = np.argsort(tops, kind="stable")
+    line_ids = np.empty(len(boxes), dtype=np.int64)
+    line, line_top = 0, tops[by_top[0]]
+    for i in by_top:
+        if tops[i] - line_top >= half_height:
+            line, line_top = line + 1, tops[i]
+        line_ids[i] = line
+    return np.lexsort((lefts, line_ids))
+
+
+class OCRResults:
+    """文字認識の結果の集まり（読み取り専用として扱ってください）"""
+
+    __slots__ = ("boxes", "confidences", "_text", "_offsets")
+
+    def __init__(self, boxes: np.ndarray, confidences: np.ndarray, texts: Iterable[str]):
+        texts = list(texts)
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+        self.confidences = np.asarray(confidences, dtype=np.float64).reshape(-1)
+        self._text = "".join(texts)
+        self._offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=self._offsets[1:])
+        if not (len(self.boxes) == len(self.confidences) == len(texts)):
+            raise ValueError("座標・信頼度・テキストの件数がそろっていません")
+
+    @classmethod
+    def from_readtext(cls, results: Iterable) -> "OCRResults":
+        """readtext(detail=1) の結果、または to_records() の辞書のリストから作ります。
+
+        形のわからない結果は読み飛ばします。
+        """
+        boxes, confidences, texts = [], [], []
+        for result in results:
+            if isinstance(result, dict):
+                bbox, text, confidence = result["box"], result["text"], result.get("confidence")
+            elif len(result) == 3:
+                bbox, text, confidence = result
+            elif len(result) == 2:
+                bbox, text = result
+                confidence = None
+            else:
+                print(f"予期しない結果形式: {result}")
+                continue
+            try:
+                box = np.asarray(bbox, dtype=np.float32).reshape(4, 2)
+            except ValueError:
+                print(f"結果の解析エラー: 座標が4点ではありません: {bbox}")
+                continue
+            boxes.append(box)
+            confidences.append(DEFAULT_CONFIDENCE if confidence is None else float(confidence))
+            texts.append(str(text))
+        return cls(np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2), confidences, texts)
+
+    def __len__(self) -> int:
+        return len(self.confidences)
+
+    def text(self, index: int) -> str:
+        return self._text[self._offsets[index]:self._offsets[index + 1]]
+
+    @property
+    def texts(self) -> List[str]:
+        return [self.text(i) for i in range(len(self))]
+
+    def __iter__(self) -> Iterator[Result]:
+        """readtext(detail=1) と同じ (座標, テキスト, 信頼度) を順に返します。"""
+        for i in range(len(self)):
+            yield self.boxes[i].tolist(), self.text(i), float(self.confidences[i])
+
+    def take(self, indices: np.ndarray) -> "OCRResults":
+        """indices（番号の配列か、True/False の配列）の結果だけを取り出します。"""
+        indices = np.asarray(indices)
+        indices = np.flatnonzero(indices) if indices.dtype == bool else indices.astype(np.int64)
+        return OCRResults(self.boxes[indices], self.confidences[indices], [self.text(i) for i in indices])
+
+    def filter(self, min_confidence: float, inclusive: bool = False) -> "OCRResults":
+        """信頼度が min_confidence より大きい結果だけにします（アプリと同じ）。
+
+        inclusive=True なら min_confidence ちょうどの結果も残します（ocr_from_path.py と同じ）。
+        """
+        if inclusive:
+            return self.take(self.confidences >= min_confidence)
+        return self.take(self.confidences > min_confidence)
+
+    def mean_confidence(self) -> float:
+        """信頼度の平均（結果がなければ 0.0）を返します。"""
+        return float(self.confidences.mean()) if len(self) else 0.0
+
+    def reading_order(self) -> np.ndarray:
+        """上の行から順に、同じ行なら左から読む順番の番号を返します。"""
+        return reading_order(self.boxes)
+
+    def sorted(self) -> "OCRResults":
+        """読む順番に並べ替えた結果を返します。"""
+        return self.take(self.reading_order())
+
+    def format_lines(self, with_confidence: bool = True) -> str:
+        """1件1行の文字列にします（信頼度つきも可）。"""
+        if with_confidence:
+            lines = (f"{self.text(i)} (信頼度: {self.confidences[i]:.2f})" for i in range(len(self)))
+        else:
+            lines = (self.text(i) for i in range(len(self)))
+        return "".join(line + "\n" for line in lines)
+
+    def to_records(self) -> List[Dict[str, object]]:
+        """JSON に変換できる辞書のリスト（{"box", "text", "confidence"}）にします。"""
+        boxes = self.boxes.tolist()
+        confidences = self.confidences.tolist()
+        return [
+            {"box": boxes[i], "text": self.text(i), "confidence": confidences[i]}
+            for i in range(len(self))
+        ]
+
+    def write_json(self, file: IO[str]) -> None:
+        json.dump(self.to_records(), file, ensure_ascii=False)
+
+    def write_csv(self, file: IO[str], header: bool = True) -> None:
+        """1件1行の CSV（text, confidence, x1, y1, ..., x4, y4）を書き出します。"""
+        writer = csv.writer(file)
+        if header:
+            writer.writerow(["text", "confidence"] + [f"{axis}{n}" for n in range(1, 5) for axis in "xy"])
+        flat = self.boxes.reshape(len(self), 8).tolist()
+        confidences = self.confidences.tolist()
+        writer.writerows([self.text(i), f"{confidences[i]:.4f}"] + flat[i] for i in range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"OCRResults({len(self)} 件, 平均信頼度 {self.mean_confidence():.2f})"
+
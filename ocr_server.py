@@ -0,0 +1,285 @@
+"""
+画面なしで使える文字認識サーバー（HTTP）
+- 画像ファイルの中身をそのまま POST すると、readtext(detail=1) の結果を JSON で返します
+- あらかじめ読み込んだリーダーを決まった数だけ用意し、同時に来たリクエストを順番に処理します
+- 待ち行列がいっぱいのときは 429 (Too Many Requests) を返します
+- 一度認識した画像は結果キャッシュ（ocr_cache.py）からすぐに返します
+- GET /metrics で、段階ごとの処理時間などを Prometheus のテキスト形式で返します（stage_metrics.py）
+
+使い方:
+    python ocr_server.py --port 8080 --readers 2
+    curl --data-binary @img1.png http://127.0.0.1:8080/ocr
+    curl --data-binary @img1.png "http://127.0.0.1:8080/ocr?preprocess=0"
+    curl http://127.0.0.1:8080/metrics
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import ocr_cache
+import ocr_pipeline
+import reader_cache
+import stage_metrics
+import tiled_ocr
+
+# === サーバーの設定 ===
+HOST = "127.0.0.1"
+PORT = 8080
+# 同時に動かすリーダーの数（1つあたり数百MBのメモリを使います）
+NUM_READERS = 2
+# 処理待ちにできるリクエストの数（これを超えると 429 を返します）
+QUEUE_SIZE = 8
+# 受け付ける画像の最大サイズ（バイト）
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# 1つのリーダーがまとめて認識する画像の最大数（待ち行列にたまった分をまとめます）
+MAX_BATCH_IMAGES = 8
+# 429 のときに「何秒後に再試行してほしいか」
+RETRY_AFTER_SECONDS = 1
+# モデルを動かす方法（inference_backend.BACKENDS のどれか）
+INFERENCE_BACKEND = reader_cache.DEFAULT_BACKEND
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """HTTP のエラー応答にしたい例外"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class OCRServer:
+    """決まった数のリーダーと、上限つきの待ち行列を持つ文字認識サーバー"""
+
+    def __init__(self, readers: List[object], queue_size: int = QUEUE_SIZE,
+                 max_batch_images: int = MAX_BATCH_IMAGES):
+        self.readers = readers
+        self.max_batch_images = max(1, max_batch_images)
+        self.queue: "asyncio.Queue[Tuple[bytes, bool, asyncio.Future]]" = asyncio.Queue(maxsize=queue_size)
+        # リーダー1つにつきスレッド1つ（同じリーダーを同時に使わないため）
+        self.executor = ThreadPoolExecutor(max_workers=len(readers), thread_name_prefix="ocr")
+        self.workers: List[asyncio.Task] = []
+
+    def start_workers(self) -> None:
+        for reader in self.readers:
+            self.workers.append(asyncio.ensure_future(self._worker(reader)))
+
+    async def _worker(self, reader) -> None:
+        """待ち行列から取り出し、担当のリーダーで認識します。
+
+        混み合っているときは、たまっているリクエストをまとめて1回で認識します。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            taken = [await self.queue.get()]
+            while len(taken) < self.max_batch_images and not self.queue.empty():
+                taken.append(self.queue.get_nowait())
+            # 接続が切れて待つ人がいなくなったリクエストは飛ばします
+            batch = [item for item in taken if not item[2].cancelled()]
+            try:
+                if batch:
+                    outcomes = await loop.run_in_executor(
+                        self.executor, self._recognize_batch, reader, [(data, pre) for data, pre, _ in batch]
+                    )
+                    for (_, _, future), outcome in zip(batch, outcomes):
+                        if future.done():
+                            continue
+                        if isinstance(outcome, Exception):
+                            future.set_exception(outcome)
+                        else:
+                            future.set_result(outcome)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in taken:
+                    self.queue.task_done()
+
+    @staticmethod
+    def _recognize_batch(reader, items: List[Tuple[bytes, bool]]) -> List[object]:
+        """画像をデコードして、前処理の有無ごとにまとめて認識します。
+
+        タイルに分けるほど大きな画像は、まとめずに1枚ずつタイルごとに認識します
+        （何枚も同時に来ても、画像全体を一度に検出しないようにするため）。
+        戻り値はリクエストごとの結果で、失敗したものは例外オブジェクトになります。
+        """
+        outcomes: List[object] = [None] * len(items)
+        groups: Dict[bool, List[Tuple[int, object]]] = {True: [], False: []}
+        for index, (data, preprocess) in enumerate(items):
+            try:
+                image = ocr_pipeline.decode_image(data)
+            except ValueError as e:
+                outcomes[index] = HTTPError(400, str(e))
+                continue
+            if tiled_ocr.needs_tiling(image):
+                outcomes[index] = ocr_pipeline.recognize(reader, image, preprocess=preprocess)
+            else:
+                groups[preprocess].append((index, image))
+
+        for preprocess, group in groups.items():
+            if not group:
+                continue
+            images = [image for _, image in group]
+            if len(images) == 1:
+                results = [ocr_pipeline.recognize(reader, images[0], preprocess=preprocess)]
+            else:
+                results = ocr_pipeline.recognize_many(reader, images, preprocess=preprocess)
+            for (index, _), result in zip(group, results):
+                outcomes[index] = result
+        return outcomes
+
+    async def submit(self, data: bytes, preprocess: bool) -> List[Dict[str, object]]:
+        """待ち行列に入れて、結果が出るまで待ちます（いっぱいなら 429）。
+
+        一度認識した画像は結果キャッシュから返すので、待ち行列には入れません。
+        """
+        loop = asyncio.get_running_loop()
+        cache = ocr_cache.get_result_cache()
+        key = ocr_cache.make_key(data, {"reader": reader_cache.make_key(backend=INFERENCE_BACKEND), "preprocess": preprocess})
+        cached = await loop.run_in_executor(None, cache.get, key)
+        if cached is not None:
+            return cached
+
+        future = loop.create_future()
+        try:
+            self.queue.put_nowait((data, preprocess, future))
+        except asyncio.QueueFull:
+            raise HTTPError(429, "サーバーが混み合っています。しばらくしてから再試行してください。")
+        results = await future
+        await loop.run_in_executor(None, cache.put, key, results)
+        return results
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """1つの接続で1リクエストだけ処理します。"""
+        try:
+            try:
+                status, body = await self._handle_request(reader)
+            except HTTPError as e:
+                status, body = e.status, {"error": str(e)}
+            except Exception as e:
+                print(f"リクエスト処理エラー: {e}", file=sys.stderr)
+                status, body = 500, {"error": str(e)}
+            await self._write_response(writer, status, body)
+        finally:
+            writer.close()
+
+    async def _handle_request(self, stream: asyncio.StreamReader) -> Tuple[int, object]:
+        request_line = (await stream.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HTTPError(400, "不正なリクエストです")
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = (await stream.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok", "readers": len(self.readers), "queued": self.queue.qsize()}
+        if url.path == "/metrics":
+            return 200, stage_metrics.render_prometheus()
+        if url.path != "/ocr":
+            raise HTTPError(404, f"見つかりません: {url.path}")
+        if method != "POST":
+            raise HTTPError(405, "POST で画像を送ってください")
+
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(400, "Content-Length が不正です")
+        if length <= 0:
+            raise HTTPError(400, "画像データがありません")
+        if length > MAX_UPLOAD_BYTES:
+            raise HTTPError(413, f"画像が大きすぎます（最大 {MAX_UPLOAD_BYTES} バイト）")
+        data = await stream.readexactly(length)
+
+        query = parse_qs(url.query)
+        preprocess = query.get("preprocess", ["1"])[0] not in ("0", "false", "no")
+        results = await self.submit(data, preprocess)
+        return 200, {"results": results, "count": len(results)}
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, status: int, body: object) -> None:
+        """body が文字列ならそのまま（/metrics）、それ以外は JSON にして返します。"""
+        if isinstance(body, str):
+            payload = body.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        headers = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Error')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            "Connection: close",
+        ]
+        if status == 429:
+            headers.append(f"Retry-After: {RETRY_AFTER_SECONDS}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def serve(host: str = HOST, port: int = PORT, num_readers: int = NUM_READERS,
+                queue_size: int = QUEUE_SIZE) -> None:
+    """リーダーを読み込んでからサーバーを起動し、止めるまで動かし続けます。"""
+    print(f"リーダーを {num_readers} 個読み込み中...")
+    loop = asyncio.get_running_loop()
+    # 共有キャッシュではなく、同時に使えるよう別々のリーダーを作ります
+    create_reader = functools.partial(reader_cache.create_reader, backend=INFERENCE_BACKEND)
+    readers = await asyncio.gather(*[
+        loop.run_in_executor(None, create_reader) for _ in range(num_readers)
+    ])
+
+    app = OCRServer(list(readers), queue_size=queue_size)
+    app.start_workers()
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"文字認識サーバーを起動しました: http://{host}:{port}/ocr")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="画面なしで使える文字認識サーバー")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--readers", type=int, default=NUM_READERS, help="同時に動かすリーダーの数")
+    parser.add_argument("--queue", type=int, default=QUEUE_SIZE, help="処理待ちにできるリクエストの数")
+    parser.add_argument("--trace", metavar="PATH", help="段階ごとの処理時間を JSONL で書き出すファイル")
+    parser.add_argument("--profile", metavar="STAGES",
+                        help="cProfile で計測する段階（カンマ区切り。例: detect,recognize）")
+    args = parser.parse_args(argv)
+    stage_metrics.configure(args.trace, args.profile)
+
+    try:
+        asyncio.run(serve(args.host, args.port, max(1, args.readers), max(1, args.queue)))
+    except KeyboardInterrupt:
+        print("サーバーを停止しました")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
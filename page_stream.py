@@ -0,0 +1,113 @@
+"""
+複数ページの画像（マルチページ TIFF・PDF）を1ページずつ読み込む処理
+- 1ページずつデコードして返すので、200ページの文書でもメモリに載るのは1ページ分だけです
+- TIFF は Pillow のフレーム移動（seek）で読みます
+- PDF は PyMuPDF（pip install pymupdf）があれば、1ページずつ画像にして読みます
+- それ以外の画像は1ページだけの文書として扱います
+"""
+
+import os
+from typing import Callable, Iterator, Tuple, TypeVar
+
+import cv2
+import numpy as np
+
+import stage_metrics
+
+# PDF を画像にするときの解像度
+PDF_DPI = 200
+
+MULTIPAGE_EXTENSIONS = (".tif", ".tiff", ".pdf")
+
+T = TypeVar("T")
+
+
+def _to_bgr(array: np.ndarray) -> np.ndarray:
+    """Pillow / PyMuPDF の画像（RGB・RGBA・グレー）を OpenCV の BGR にします。"""
+    if array.ndim == 2:
+        return cv2.cvtColor(array, cv2.COLOR_GRAY2BGR)
+    if array.shape[2] == 4:
+        return cv2.cvtColor(array, cv2.COLOR_RGBA2BGR)
+    return cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+
+
+def _open_pdf(path: str):
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise RuntimeError("PDF を読むには PyMuPDF が必要です: pip install pymupdf")
+    return fitz.open(path)
+
+
+def page_count(path: str) -> int:
+    """ページ数を返します（画像は読み込まずに数えます）。"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        with _open_pdf(path) as doc:
+            return doc.page_count
+    if ext in (".tif", ".tiff"):
+        from PIL import Image
+
+        with Image.open(path) as image:
+            return getattr(image, "n_frames", 1)
+    return 1
+
+
+def is_multipage(path: str) -> bool:
+    """2ページ以上ある（または PDF の）ファイルなら True を返します。"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in MULTIPAGE_EXTENSIONS:
+        return False
+    return ext == ".pdf" or page_count(path) > 1
+
+
+def iter_pages(path: str, pdf_dpi: int = PDF_DPI) -> Iterator[Tuple[int, np.ndarray]]:
+    """(ページ番号, BGR 画像) を1ページずつ返します（ページ番号は1から）。"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"画像ファイルが見つかりません: {path}")
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == ".pdf":
+        with _open_pdf(path) as doc:
+            for index, page in enumerate(doc):
+                with stage_metrics.span("decode", page=index + 1) as attrs:
+                    pix = page.get_pixmap(dpi=pdf_dpi)
+                    array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+                    bgr = _to_bgr(array)
+                    attrs.update(stage_metrics.image_attrs(bgr))
+                yield index + 1, bgr
+                del pix, array, bgr
+        return
+
+    if ext in (".tif", ".tiff"):
+        from PIL import Image
+
+        with Image.open(path) as image:
+            for index in range(getattr(image, "n_frames", 1)):
+                with stage_metrics.span("decode", page=index + 1) as attrs:
+                    image.seek(index)  # このページだけをデコードします
+                    frame = image.convert("RGB")
+                    bgr = _to_bgr(np.asarray(frame))
+                    attrs.update(stage_metrics.image_attrs(bgr))
+                yield index + 1, bgr
+                del frame, bgr
+        return
+
+    with stage_metrics.span("decode") as attrs:
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError("画像の読み込みに失敗しました。形式や破損を確認してください。")
+        attrs.update(stage_metrics.image_attrs(image))
+    yield 1, image
+
+
+def iter_page_results(path: str, recognize: Callable[[np.ndarray], T],
+                      pdf_dpi: int = PDF_DPI) -> Iterator[Tuple[int, T]]:
+    """1ページずつ読み込んで recognize（前処理＋OCR）にかけ、(ページ番号, 結果) を返します。
+
+    次のページを読む前に前のページの画像を手放すので、ページ数が多くてもメモリは増えません。
+    """
+    for page_no, image in iter_pages(path, pdf_dpi):
+        result = recognize(image)
+        del image
+        yield page_no, result
@@ -0,0 +1,136 @@
+"""
+EasyOCR リーダーの共有キャッシュ
+- 同じ設定（言語・認識モデル・モデル保存先・GPU・推論バックエンド）のリーダーは1つだけ作って使い回します
+- モデルの読み込みは数秒かかり、メモリも数百MB使うため、作り直しを避けます
+- いくつもの言語設定を使うときは、古く使われていないものから捨てます（LRU）
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Optional, Tuple
+
+import inference_backend
+import stage_metrics
+
+# 既定の設定（アプリと ocr_from_path.py で共通）
+DEFAULT_LANGS: Tuple[str, ...] = ("ja", "en")
+DEFAULT_RECOG_NETWORK = "japanese_g2"
+DEFAULT_MODEL_DIR = "./models"
+DEFAULT_GPU = False
+DEFAULT_BACKEND = inference_backend.DEFAULT_BACKEND
+
+# 同時に持っておくリーダーの最大数
+MAX_CACHED_READERS = 2
+
+ReaderKey = Tuple[Tuple[str, ...], str, str, bool, str]
+
+
+def make_key(langs: Iterable[str] = DEFAULT_LANGS,
+             recog_network: str = DEFAULT_RECOG_NETWORK,
+             model_dir: str = DEFAULT_MODEL_DIR,
+             gpu: bool = DEFAULT_GPU,
+             backend: str = DEFAULT_BACKEND) -> ReaderKey:
+    """キャッシュのキー（設定のタプル）を作ります。"""
+    return (tuple(langs), recog_network, model_dir, bool(gpu), backend)
+
+
+def create_reader(langs: Iterable[str] = DEFAULT_LANGS,
+                  recog_network: str = DEFAULT_RECOG_NETWORK,
+                  model_dir: str = DEFAULT_MODEL_DIR,
+                  gpu: bool = DEFAULT_GPU,
+                  backend: str = DEFAULT_BACKEND):
+    """キャッシュを使わずに、新しい EasyOCR リーダーを作ります。
+
+    backend は推論バックエンド（inference_backend.BACKENDS のどれか）です。
+    """
+    inference_backend.validate(backend, gpu)
+    import easyocr
+
+    reader = easyocr.Reader(
+        list(langs),
+        gpu=gpu,
+        model_storage_directory=model_dir,
+        download_enabled=True,
+        recog_network=recog_network,
+        quantize=inference_backend.quantize_for(backend),
+    )
+    reader = inference_backend.apply(reader, backend, model_dir, recog_network)
+    # 検出と認識の処理時間を stage_metrics に記録する
+    return stage_metrics.instrument_reader(reader)
+
+
+class ReaderCache:
+    """設定ごとにリーダーを1つだけ持つ、スレッドセーフな LRU キャッシュ"""
+
+    def __init__(self, max_size: int = MAX_CACHED_READERS,
+                 factory: Optional[Callable[..., object]] = None):
+        self.max_size = max(1, int(max_size))
+        self.factory = factory or create_reader
+        self._readers: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 同じ設定のリーダーを2つのスレッドが同時に作らないためのロック
+        self._building = {}
+
+    def get(self, langs: Iterable[str] = DEFAULT_LANGS,
+            recog_network: str = DEFAULT_RECOG_NETWORK,
+            model_dir: str = DEFAULT_MODEL_DIR,
+            gpu: bool = DEFAULT_GPU,
+            backend: str = DEFAULT_BACKEND):
+        """設定に合うリーダーを返します（なければ作ってキャッシュします）。"""
+        key = make_key(langs, recog_network, model_dir, gpu, backend)
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is not None:
+                self._readers.move_to_end(key)
+                return reader
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        with build_lock:
+            # 待っている間に別のスレッドが作り終えていれば、それを使います
+            with self._lock:
+                reader = self._readers.get(key)
+                if reader is not None:
+                    self._readers.move_to_end(key)
+                    return reader
+
+            reader = self.factory(*key)
+
+            with self._lock:
+                self._readers[key] = reader
+                self._readers.move_to_end(key)
+                while len(self._readers) > self.max_size:
+                    evicted_key, _ = self._readers.popitem(last=False)
+                    print(f"リーダーをキャッシュから削除しました: {evicted_key}")
+                self._building.pop(key, None)
+        return reader
+
+    def clear(self) -> None:
+        """キャッシュしているリーダーをすべて捨てます。"""
+        with self._lock:
+            self._readers.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._readers)
+
+    def __contains__(self, key: ReaderKey) -> bool:
+        with self._lock:
+            return key in self._readers
+
+
+# プロセス全体で共有するキャッシュ
+_shared_cache = ReaderCache()
+
+
+def get_reader(langs: Iterable[str] = DEFAULT_LANGS,
+               recog_network: str = DEFAULT_RECOG_NETWORK,
+               model_dir: str = DEFAULT_MODEL_DIR,
+               gpu: bool = DEFAULT_GPU,
+               backend: str = DEFAULT_BACKEND):
+    """プロセス全体で共有しているリーダーを返します。"""
+    return _shared_cache.get(langs, recog_network, model_dir, gpu, backend)
+
+
+def clear_readers() -> None:
+    """共有キャッシュのリーダーをすべて捨てます（メモリを空けたいとき用）。"""
+    _shared_cache.clear()
@@ -0,0 +1,94 @@
+"""
+決まった形の用紙（伝票・申込書など）の「読みたい欄」だけを文字認識する処理
+- 欄の位置を (x, y, w, h) で名前をつけて並べたものを「テンプレート」と呼びます
+  例: {"date": (40, 30, 300, 40), "total": (400, 900, 250, 60)}
+- ページ全体ではなく欄の切り抜きだけを検出・認識するので、ページ全体を読むより大幅に速くなります
+- 欄ごとの結果は切り抜いた画素から作ったキーでキャッシュするので、同じ内容の欄は読み直しません
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import ocr_cache
+
+Rect = Tuple[int, int, int, int]
+Template = Dict[str, Rect]
+
+
+def crop_rect(image: np.ndarray, rect: Rect) -> np.ndarray:
+    """(x, y, w, h) の範囲を切り出します（画像からはみ出した分は切り詰めます）。
+
+    コピーせずに元の画像の一部として返します。
+    """
+    x, y, w, h = rect
+    h_img, w_img = image.shape[:2]
+    # 画像範囲に収まるようにガード
+    x2 = min(x + w, w_img)
+    y2 = min(y + h, h_img)
+    x = max(0, x)
+    y = max(0, y)
+    if x >= x2 or y >= y2:
+        raise ValueError("ROIの指定が不正です（画像範囲外）。")
+    return image[y:y2, x:x2]
+
+
+def validate_template(name: str, template: Template) -> List[str]:
+    """テンプレートの間違いを探して、見つかった問題のリストを返します。"""
+    problems: List[str] = []
+    if not template:
+        problems.append(f"テンプレート {name!r} に欄がありません")
+    for field, rect in template.items():
+        if len(rect) != 4 or rect[2] <= 0 or rect[3] <= 0:
+            problems.append(f"テンプレート {name!r} の欄 {field!r} は (x, y, w, h) で、w と h は正の数にしてください: {rect!r}")
+    return problems
+
+
+def load_templates(path: str) -> Dict[str, Template]:
+    """JSON ファイルからテンプレートを読み込みます。
+
+    形式: {"テンプレート名": {"欄の名前": [x, y, w, h], ...}, ...}
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        name: {field: tuple(int(v) for v in rect) for field, rect in fields.items()}
+        for name, fields in data.items()
+    }
+
+
+def read_fields(image: np.ndarray, template: Template,
+                recognize: Callable[[np.ndarray], List[str]], workers: int = 1,
+                cache: Optional[ocr_cache.OCRResultCache] = None,
+                cache_config: Optional[Dict[str, object]] = None) -> Dict[str, List[str]]:
+    """テンプレートの欄ごとに切り出して recognize（前処理＋OCR）にかけ、欄の名前 → 文字列のリストを返します。
+
+    cache を渡すと、欄の画素と cache_config から作ったキーで結果を覚えておきます。
+    workers を2以上にすると、その数の欄を同時に読み取ります。
+    """
+    crops = {field: crop_rect(image, rect) for field, rect in template.items()}
+    results: Dict[str, List[str]] = {}
+    keys: Dict[str, str] = {}
+    for field, crop in crops.items():
+        if cache is None:
+            continue
+        keys[field] = ocr_cache.make_key(crop, cache_config)
+        cached = cache.get(keys[field])
+        if cached is not None:
+            results[field] = cached
+
+    missing = [field for field in crops if field not in results]
+    if workers <= 1 or len(missing) <= 1:
+        recognized = [recognize(crops[field]) for field in missing]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            recognized = list(executor.map(lambda field: recognize(crops[field]), missing))
+
+    for field, lines in zip(missing, recognized):
+        results[field] = lines
+        if cache is not None:
+            cache.put(keys[field], lines)
+    # テンプレートに書いた順に並べて返す
+    return {field: results[field] for field in template}
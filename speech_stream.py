@@ -0,0 +1,132 @@
+"""
+文ごとに区切って読み上げる（ストリーミング読み上げ）
+- テキストを日本語・英語の文の終わり（。！？. など）で区切ります
+- 1文目を合成したらすぐに再生を始め、再生中に次の文を合成しておきます
+- 停止・スキップは文の単位ですぐに効きます
+"""
+
+import queue
+import re
+import threading
+from typing import Callable, Iterable, List, Optional
+
+import tts_cache
+
+# 文の終わり: 日本語の句点・感嘆符・疑問符はそのまま、英語の . ! ? は後ろが空白か行末のときだけ
+# （"3.14" や "e.g" の途中で区切らないため）
+_SENTENCE_END = re.compile(r"(?<=[。！？!?．])|(?<=[.!?])(?=\s|$)")
+
+# 合成しておく文の数（再生中に先読みする数）
+PREFETCH_SENTENCES = 2
+
+
+def split_sentences(text: str) -> List[str]:
+    """テキストを文ごとに区切ります（行の区切りも文の区切りとして扱います）。"""
+    sentences = []
+    for line in tts_cache.split_segments(text):
+        for sentence in _SENTENCE_END.split(line):
+            sentence = sentence.strip()
+            # 句読点だけの断片は読み上げない
+            if sentence and not re.fullmatch(r"[。！？!?．.、,\s]+", sentence):
+                sentences.append(sentence)
+    return sentences
+
+
+class StreamingSpeaker:
+    """合成と再生を並行して行い、文ごとに読み上げるクラス"""
+
+    _DONE = object()
+
+    def __init__(self, renderer: "tts_cache.TTSRenderer", player: "tts_cache.AudioPlayer"):
+        self.renderer = renderer
+        self.player = player
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def speak(self, text: str, rate: int = tts_cache.BASE_RATE, volume: float = 1.0,
+              on_sentence: Optional[Callable[[int, str], None]] = None,
+              on_error: Optional[Callable[[Exception], None]] = None,
+              on_finish: Optional[Callable[[], None]] = None) -> None:
+        """読み上げを始めます（前の読み上げが続いていれば止めてから始めます）。
+
+        on_sentence(番号, 文) は各文の再生を始めるときに、on_finish() は最後まで読んだときに
+        呼ばれます（どちらも読み上げ用のスレッドから呼ばれます）。
+        """
+        self.speak_iter(split_sentences(text), rate, volume, on_sentence, on_error, on_finish)
+
+    def speak_iter(self, sentences: Iterable[str], rate: int = tts_cache.BASE_RATE, volume: float = 1.0,
+                   on_sentence: Optional[Callable[[int, str], None]] = None,
+                   on_error: Optional[Callable[[Exception], None]] = None,
+                   on_finish: Optional[Callable[[], None]] = None) -> None:
+        """文を1つずつ受け取りながら読み上げます。
+
+        sentences には、あとから文が増えていくジェネレーターも渡せます
+        （文字認識しながら、認識できた文から順に読み上げるときなど）。
+        """
+        self.stop()
+        stop_event = threading.Event()
+        self._stop_event = stop_event
+        rendered: "queue.Queue[object]" = queue.Queue(maxsize=PREFETCH_SENTENCES)
+
+        def put(item) -> bool:
+            # 止められたときに再生側を待ち続けないよう、少しずつ待ちます
+            while not stop_event.is_set():
+                try:
+                    rendered.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def synthesize():
+            try:
+                for index, sentence in enumerate(sentences):
+                    if stop_event.is_set():
+                        return
+                    path = self.renderer.render(sentence, rate, volume)
+                    if not put((index, sentence, path)):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(self._DONE)
+
+        def play():
+            while not stop_event.is_set():
+                try:
+                    item = rendered.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is self._DONE:
+                    if on_finish:
+                        on_finish()
+                    return
+                if isinstance(item, Exception):
+                    if on_error:
+                        on_error(item)
+                    return
+                index, sentence, path = item
+                if stop_event.is_set():
+                    return
+                if on_sentence:
+                    on_sentence(index, sentence)
+                self.player.play(path)
+
+        self._threads = [
+            threading.Thread(target=synthesize, daemon=True),
+            threading.Thread(target=play, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def skip(self) -> None:
+        """今の文の再生をやめて、次の文に進みます。"""
+        self.player.stop()
+
+    def stop(self) -> None:
+        """読み上げを止めます（合成済みで再生前の文も捨てます）。"""
+        self._stop_event.set()
+        self.player.stop()
+
+    def is_speaking(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads) and not self._stop_event.is_set()
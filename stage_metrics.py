@@ -0,0 +1,296 @@
+"""
+処理の段階ごとの計測（スパン）と、その書き出し
+- 読み込み（decode）・前処理の各段階（preprocess.〇〇）・検出（detect）・認識（recognize）・
+  後処理（postprocess）・音声合成（tts.synth）・再生（tts.play）の処理時間を記録します
+- 1回の記録（スパン）には、画像の大きさ・文字領域の数・その時点のピークメモリも入ります
+- 書き出し方は2つあります
+  - TRACE_FILE を指定すると、1スパン1行の JSONL ファイルに追記します
+  - render_prometheus() で、段階ごとの集計を Prometheus のテキスト形式にします
+    （ocr_server.py の GET /metrics で返します）
+- PROFILE_STAGES に段階名を入れると、その段階だけ cProfile で計測して PROFILE_DIR に .prof で保存します
+- LABEL_THREADS = True にすると、処理中のスレッド名に段階名を付けます（py-spy dump で今どの段階かわかります）
+
+使い方:
+    with stage_metrics.span("detect", **stage_metrics.image_attrs(image)) as attrs:
+        boxes = detect(image)
+        attrs["boxes"] = len(boxes)
+"""
+
+import cProfile
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import resource  # Windows にはありません
+except ImportError:
+    resource = None
+
+# === 計測の設定 ===
+# False にすると何も記録しません
+ENABLED = True
+# スパンを1行ずつ書き出す JSONL ファイル（None なら書き出しません）
+TRACE_FILE: Optional[str] = None
+# cProfile で計測する段階の名前（例: ("detect", "preprocess.denoise")）
+PROFILE_STAGES: Sequence[str] = ()
+# cProfile の結果（.prof）を保存するフォルダ（snakeviz などで開けます）
+PROFILE_DIR = "profiles"
+# 処理中のスレッド名に段階名を付けるか
+LABEL_THREADS = False
+# Prometheus のヒストグラムの区切り（秒）
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Prometheus のメトリクス名の頭につける文字
+METRIC_PREFIX = "img2speech"
+
+
+def configure(trace_file: Optional[str] = None, profile_stages: Optional[str] = None) -> None:
+    """コマンドの引数（--trace / --profile）から設定します。profile_stages はカンマ区切りの段階名です。"""
+    global TRACE_FILE, PROFILE_STAGES
+    if trace_file:
+        TRACE_FILE = trace_file
+    if profile_stages:
+        PROFILE_STAGES = tuple(name.strip() for name in profile_stages.split(",") if name.strip())
+
+
+def peak_memory_bytes() -> Optional[int]:
+    """このプロセスがこれまでに使ったメモリの最大値（バイト）を返します（わからなければ None）。"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux は KB で返ってきます
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def image_attrs(image) -> Dict[str, int]:
+    """スパンに付ける画像の大きさ（width, height）です。"""
+    shape = getattr(image, "shape", None)
+    if not shape or len(shape) < 2:
+        return {}
+    return {"height": int(shape[0]), "width": int(shape[1])}
+
+
+class _StageStats:
+    """1つの段階の集計"""
+
+    __slots__ = ("count", "seconds", "buckets", "boxes", "peak_memory")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS)
+        self.boxes = 0
+        self.peak_memory = 0
+
+
+_lock = threading.Lock()
+_stats: Dict[str, _StageStats] = {}
+_local = threading.local()
+_span_ids = itertools.count(1)
+_profile_ids = itertools.count(1)
+
+
+def record(name: str, seconds: float, attrs: Optional[Dict[str, object]] = None,
+           start: Optional[float] = None, parent: Optional[int] = None, span_id: Optional[int] = None) -> None:
+    """計り終わった1件を集計に加え、TRACE_FILE があれば書き出します。
+
+    span() を使えないところ（すでに時間を計っている前処理など）から直接呼べます。
+    """
+    if not ENABLED:
+        return
+    attrs = dict(attrs or {})
+    peak = peak_memory_bytes()
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = _StageStats()
+        stats.count += 1
+        stats.seconds += seconds
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                stats.buckets[i] += 1
+        boxes = attrs.get("boxes")
+        if isinstance(boxes, int):
+            stats.boxes += boxes
+        if peak is not None:
+            stats.peak_memory = max(stats.peak_memory, peak)
+
+        if TRACE_FILE:
+            entry = {
+                "stage": name,
+                "start": round(time.time() - seconds if start is None else start, 6),
+                "ms": round(seconds * 1000.0, 3),
+                "span": span_id,
+                "parent": parent if parent is not None else _current_span(),
+                "thread": threading.current_thread().name,
+                "pid": os.getpid(),
+                "peak_memory_bytes": peak,
+            }
+            entry.update(attrs)
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+
+def _current_span() -> Optional[int]:
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def _start_profile(name: str) -> Optional[cProfile.Profile]:
+    if name not in PROFILE_STAGES:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None  # ほかの段階を計測中（cProfile は同時に1つだけ）
+    return profiler
+
+
+def _save_profile(name: str, profiler: cProfile.Profile) -> None:
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}-{os.getpid()}-{next(_profile_ids)}.prof")
+    profiler.dump_stats(path)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict[str, object]]:
+    """with の中の処理時間を name の段階として記録します。
+
+    返される辞書に値を入れると（例: attrs["boxes"] = 12）、スパンの情報として記録されます。
+    中で例外が起きたときも記録し、"error" に例外の名前を入れます。
+    """
+    if not ENABLED:
+        yield attrs
+        return
+    span_id = next(_span_ids)
+    parent = _current_span()
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(span_id)
+    thread = threading.current_thread()
+    thread_name = thread.name
+    if LABEL_THREADS:
+        thread.name = f"{thread_name} [{name}]"
+    profiler = _start_profile(name)
+    start_wall = time.time()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if profiler is not None:
+            _save_profile(name, profiler)
+        if LABEL_THREADS:
+            thread.name = thread_name
+        stack.pop()
+        record(name, seconds, attrs, start=start_wall, parent=parent, span_id=span_id)
+
+
+def _count_detected(result) -> Optional[int]:
+    """reader.detect() の結果（画像ごとの横書き・傾いた領域のリスト）の領域数です。"""
+    try:
+        horizontal_lists, free_lists = result
+        return sum(len(boxes) for boxes in horizontal_lists) + sum(len(boxes) for boxes in free_lists)
+    except (TypeError, ValueError):
+        return None
+
+
+def instrument_reader(reader):
+    """EasyOCR のリーダーの detect() と recognize() を計測するようにします。
+
+    readtext() はこの2つを順に呼ぶので、どこから readtext() を呼んでも検出と認識が別々に記録されます。
+    """
+    if getattr(reader, "_stage_metrics", False):
+        return reader
+    detect, recognize = reader.detect, reader.recognize
+
+    def timed_detect(img, *args, **kwargs):
+        with span("detect", **image_attrs(img)) as attrs:
+            result = detect(img, *args, **kwargs)
+            attrs["boxes"] = _count_detected(result)
+        return result
+
+    def timed_recognize(img_cv_grey, *args, **kwargs):
+        with span("recognize", **image_attrs(img_cv_grey)) as attrs:
+            result = recognize(img_cv_grey, *args, **kwargs)
+            attrs["boxes"] = len(result)
+        return result
+
+    reader.detect = timed_detect
+    reader.recognize = timed_recognize
+    reader._stage_metrics = True
+    return reader
+
+
+def snapshot() -> Dict[str, Dict[str, object]]:
+    """段階ごとの集計（回数・合計時間・文字領域の数・ピークメモリ）を辞書で返します。"""
+    with _lock:
+        return {
+            name: {
+                "count": stats.count,
+                "seconds": stats.seconds,
+                "boxes": stats.boxes,
+                "peak_memory_bytes": stats.peak_memory or None,
+            }
+            for name, stats in sorted(_stats.items())
+        }
+
+
+def reset() -> None:
+    """集計を空にします。"""
+    with _lock:
+        _stats.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    """段階ごとの集計を Prometheus のテキスト形式（text/plain; version=0.0.4）にします。"""
+    seconds = f"{METRIC_PREFIX}_stage_seconds"
+    boxes = f"{METRIC_PREFIX}_stage_boxes_total"
+    memory = f"{METRIC_PREFIX}_stage_peak_memory_bytes"
+    lines: List[str] = [
+        f"# HELP {seconds} Time spent in each pipeline stage.",
+        f"# TYPE {seconds} histogram",
+    ]
+    with _lock:
+        items = [(name, stats, list(stats.buckets)) for name, stats in sorted(_stats.items())]
+        for name, stats, buckets in items:
+            label = f'stage="{_escape(name)}"'
+            for bound, count in zip(HISTOGRAM_BUCKETS, buckets):
+                lines.append(f'{seconds}_bucket{{{label},le="{bound:g}"}} {count}')
+            lines.append(f'{seconds}_bucket{{{label},le="+Inf"}} {stats.count}')
+            lines.append(f"{seconds}_sum{{{label}}} {stats.seconds:.6f}")
+            lines.append(f"{seconds}_count{{{label}}} {stats.count}")
+        lines += [f"# HELP {boxes} Text regions handled by each stage.", f"# TYPE {boxes} counter"]
+        lines += [f'{boxes}{{stage="{_escape(name)}"}} {stats.boxes}' for name, stats, _ in items]
+        lines += [f"# HELP {memory} Process peak memory seen at the end of each stage.",
+                  f"# TYPE {memory} gauge"]
+        lines += [f'{memory}{{stage="{_escape(name)}"}} {stats.peak_memory}'
+                  for name, stats, _ in items if stats.peak_memory]
+    return "\n".join(lines) + "\n"
+
+
+def format_report() -> str:
+    """段階ごとの集計を、人が読みやすい表にした文字列を返します。"""
+    rows = snapshot()
+    if not rows:
+        return "（記録がありません）"
+    # 前処理（preprocess）の中に各段階（preprocess.〇〇）が含まれるので、割合は出しません
+    lines = [f"{'段階':<24} {'回数':>6} {'平均':>12} {'合計':>12}"]
+    for name, row in rows.items():
+        mean_ms = row["seconds"] / row["count"] * 1000.0
+        lines.append(f"{name:<24} {row['count']:>6} {mean_ms:>9.2f} ms {row['seconds'] * 1000.0:>9.2f} ms")
+    return "\n".join(lines)
@@ -53,14 +53,1297 @@ def test_easyocr():
     print("\nEasyOCR機能テストを開始...")
     
     try:
-        import easyocr
-        reader = easyocr.Reader(['ja', 'en'])
+        import reader_cache
+        reader = reader_cache.get_reader(['ja', 'en'])
         print("✓ EasyOCR初期化成功")
+        
+        # 2回目は同じリーダーが返る（モデルを読み込み直さない）
+        if reader_cache.get_reader(['ja', 'en']) is not reader:
+            print("✗ リーダーが再利用されていません")
+            return False
+        print("✓ リーダー再利用成功")
         return True
     except Exception as e:
         print(f"✗ EasyOCR初期化失敗: {e}")
         return False
 
+def test_reader_cache():
+    """リーダーキャッシュ（LRU）の動作テスト"""
+    print("\nリーダーキャッシュテストを開始...")
+    
+    try:
+        from reader_cache import ReaderCache, make_key
+        
+        created = []
+        def fake_factory(*key):
+            created.append(key)
+            return object()
+        
+        cache = ReaderCache(max_size=2, factory=fake_factory)
+        ja = cache.get(['ja', 'en'])
+        if cache.get(['ja', 'en']) is not ja or len(created) != 1:
+            print("✗ 同じ設定のリーダーが再利用されていません")
+            return False
+        print("✓ 同じ設定のリーダー再利用成功")
+        
+        cache.get(['en'])
+        cache.get(['ja', 'en'])  # ja を最近使ったことにする
+        cache.get(['ko'])  # 一番古い en が捨てられる
+        if make_key(['ja', 'en'], backend="onnx") == make_key(['ja', 'en']):
+            print("✗ 推論バックエンドの違うリーダーが同じキーになっています")
+            return False
+        if make_key(['en']) in cache or make_key(['ja', 'en']) not in cache:
+            print("✗ LRUの削除順が正しくありません")
+            return False
+        print("✓ LRU削除成功")
+        
+        return True
+    except Exception as e:
+        print(f"✗ リーダーキャッシュテスト失敗: {e}")
+        return False
+
+def test_inference_backend():
+    """推論バックエンドの設定の確認と、ONNX を使えないときの切り戻しのテスト"""
+    print("\n推論バックエンドテストを開始...")
+    
+    try:
+        import importlib.util
+        import os
+        import inference_backend
+        
+        for backend, gpu in (("tensorrt", False), ("onnx", True)):
+            try:
+                inference_backend.validate(backend, gpu)
+            except ValueError:
+                continue
+            print(f"✗ 使えない設定が通りました: {backend}, gpu={gpu}")
+            return False
+        inference_backend.validate("onnx", False)
+        if [inference_backend.quantize_for(b) for b in inference_backend.BACKENDS] != [True, False, False]:
+            print("✗ 量子化するバックエンドが正しくありません")
+            return False
+        print("✓ 設定の確認成功")
+        
+        tmp_path = inference_backend._temp_path("models/onnx/craft_detector.onnx")
+        if str(os.getpid()) not in tmp_path:
+            print(f"✗ 書き出し途中のファイル名がプロセスごとに分かれていません: {tmp_path}")
+            return False
+        
+        # 書き出しに失敗したとき（onnxruntime がなければ書き出す前に）torch に切り戻す
+        calls = []
+        
+        def failing_export(reader, model_dir, recog_network):
+            calls.append("export")
+            raise RuntimeError("書き出しに失敗")
+        
+        reader = object()
+        original = (inference_backend.export_onnx, inference_backend._quantize_recognizer)
+        inference_backend.export_onnx = failing_export
+        inference_backend._quantize_recognizer = lambda r: calls.append("quantize")
+        try:
+            result = inference_backend.apply(reader, "onnx", "./models", "japanese_g2")
+            unchanged = inference_backend.apply(reader, "torch", "./models", "japanese_g2")
+        finally:
+            inference_backend.export_onnx, inference_backend._quantize_recognizer = original
+        has_onnxruntime = importlib.util.find_spec("onnxruntime") is not None
+        expected = ["export", "quantize"] if has_onnxruntime else ["quantize"]
+        if result is not reader or unchanged is not reader or calls != expected:
+            print(f"✗ ONNX を使えないときの切り戻しが正しくありません: {calls}")
+            return False
+        print("✓ ONNX を使えないときの切り戻し成功")
+        return True
+    except Exception as e:
+        print(f"✗ 推論バックエンドテスト失敗: {e}")
+        return False
+
+def test_ocr_server():
+    """文字認識サーバー（HTTP の応答・待ち行列・結果キャッシュ）のテスト"""
+    print("\n文字認識サーバーテストを開始...")
+    
+    try:
+        import asyncio
+        import cv2
+        import numpy as np
+        import ocr_cache
+        import ocr_server
+        
+        class FakeReader:
+            def __init__(self):
+                self.calls = 0
+            
+            def readtext(self, image, detail=1):
+                self.calls += 1
+                return [([[0, 0], [10, 0], [10, 5], [0, 5]], f"幅{image.shape[1]}", 0.9)]
+        
+        def png(width):
+            return cv2.imencode(".png", np.full((20, width, 3), 255, dtype=np.uint8))[1].tobytes()
+        
+        def http(method, target, body=b"", length=None):
+            length = len(body) if length is None else length
+            return f"{method} {target} HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1") + body
+        
+        async def request(server, raw):
+            stream = asyncio.StreamReader()
+            stream.feed_data(raw)
+            stream.feed_eof()
+            try:
+                return await server._handle_request(stream)
+            except ocr_server.HTTPError as e:
+                return e.status, str(e)
+        
+        async def scenario():
+            reader = FakeReader()
+            server = ocr_server.OCRServer([reader], queue_size=1)
+            statuses = [
+                (await request(server, http("GET", "/nothing")))[0],
+                (await request(server, http("GET", "/ocr")))[0],
+                (await request(server, http("POST", "/ocr", length=ocr_server.MAX_UPLOAD_BYTES + 1)))[0],
+                (await request(server, http("POST", "/ocr")))[0],
+            ]
+            
+            # ワーカーを動かす前は待ち行列が空かないので、2つ目のリクエストは 429
+            waiting = asyncio.ensure_future(server.submit(png(30), False))
+            while server.queue.empty():
+                await asyncio.sleep(0.01)
+            try:
+                await server.submit(png(31), False)
+                full_status = 200
+            except ocr_server.HTTPError as e:
+                full_status = e.status
+            
+            server.start_workers()
+            first = await asyncio.wait_for(waiting, timeout=10)
+            # デコードできない画像はワーカーで 400 になる
+            statuses.append((await asyncio.wait_for(
+                request(server, http("POST", "/ocr?preprocess=0", b"not an image")), timeout=10))[0])
+            status, body = await request(server, http("POST", "/ocr?preprocess=0", png(30)))
+            metrics_status, metrics = await request(server, http("GET", "/metrics"))
+            for worker in server.workers:
+                worker.cancel()
+            server.executor.shutdown(wait=True)
+            return statuses, full_status, first, status, body, reader.calls, metrics_status, metrics
+        
+        saved_cache = ocr_cache._shared_cache
+        ocr_cache._shared_cache = ocr_cache.OCRResultCache(None)  # メモリだけのキャッシュで試す
+        try:
+            statuses, full_status, first, status, body, calls, metrics_status, metrics = asyncio.run(scenario())
+        finally:
+            ocr_cache._shared_cache = saved_cache
+        
+        if statuses != [404, 405, 413, 400, 400]:
+            print(f"✗ エラーの応答が正しくありません: {statuses}")
+            return False
+        print("✓ 404・405・413・400 の応答成功")
+        if full_status != 429:
+            print(f"✗ 待ち行列がいっぱいのときに 429 になりません: {full_status}")
+            return False
+        print("✓ 待ち行列がいっぱいのときの 429 成功")
+        if first[0]["text"] != "幅30" or status != 200 or body["results"] != first or calls != 1:
+            print(f"✗ 同じ画像が結果キャッシュから返りません: {body}, 認識 {calls} 回")
+            return False
+        print("✓ 結果キャッシュからの応答成功")
+        if metrics_status != 200 or not isinstance(metrics, str) or "img2speech_stage_seconds" not in metrics:
+            print("✗ /metrics の応答が正しくありません")
+            return False
+        print("✓ /metrics の応答成功")
+        return True
+    except Exception as e:
+        print(f"✗ 文字認識サーバーテスト失敗: {e}")
+        return False
+
+def test_ocr_batching():
+    """マイクロバッチ（幅の順のバッチ・リクエストごとの振り分け）のテスト"""
+    print("\nマイクロバッチテストを開始...")
+    
+    try:
+        import asyncio
+        import numpy as np
+        import ocr_batching
+        import ocr_server
+        
+        widths = [300, 40, 160, 80, 500, 20]
+        regions = [([[0, i * 10]] * 4, np.zeros((32, width), dtype=np.uint8)) for i, width in enumerate(widths)]
+        chunks = []
+        
+        def recognize_chunk(chunk):
+            chunks.append([crop.shape[1] for _, crop in chunk])
+            return [(box, f"幅{crop.shape[1]}", 0.9) for box, crop in chunk]
+        
+        results = ocr_batching.batch_by_width(regions, 2, recognize_chunk)
+        if chunks != [[20, 40], [80, 160], [300, 500]]:
+            print(f"✗ 幅の近いものどうしのバッチになっていません: {chunks}")
+            return False
+        if [text for _, text, _ in results] != [f"幅{width}" for width in widths]:
+            print(f"✗ 結果が入力の順番に戻っていません: {[text for _, text, _ in results]}")
+            return False
+        print("✓ 幅の順のバッチと順番の復元成功")
+        
+        # 待ち行列にたまったリクエストは1回で認識し、結果はリクエストごとに返す
+        batches = []
+        
+        class BatchingServer(ocr_server.OCRServer):
+            @staticmethod
+            def _recognize_batch(reader, items):
+                batches.append(len(items))
+                return [ValueError("壊れた画像") if data == b"broken" else [{"text": data.decode()}]
+                        for data, _ in items]
+        
+        async def scenario():
+            server = BatchingServer([object()], queue_size=8)
+            loop = asyncio.get_running_loop()
+            futures = []
+            for data in (b"one", b"broken", b"three"):
+                future = loop.create_future()
+                server.queue.put_nowait((data, False, future))
+                futures.append(future)
+            server.start_workers()
+            outcomes = await asyncio.gather(*futures, return_exceptions=True)
+            for worker in server.workers:
+                worker.cancel()
+            server.executor.shutdown(wait=True)
+            return outcomes
+        
+        outcomes = asyncio.run(scenario())
+        if batches != [3] or outcomes[0] != [{"text": "one"}] or outcomes[2] != [{"text": "three"}] \
+                or not isinstance(outcomes[1], ValueError):
+            print(f"✗ まとめた認識の振り分けが正しくありません: {batches} {outcomes}")
+            return False
+        print("✓ まとめた認識のリクエストごとの振り分け成功")
+        
+        # タイルに分けるほど大きな画像は、まとめずに1枚ずつ recognize（タイル分け）に回す
+        import cv2
+        import ocr_pipeline
+        import tiled_ocr
+        
+        calls = []
+        saved = (tiled_ocr.needs_tiling, ocr_pipeline.recognize, ocr_pipeline.recognize_many)
+        try:
+            tiled_ocr.needs_tiling = lambda image: image.shape[1] > 100
+            ocr_pipeline.recognize = lambda reader, image, preprocess=True: calls.append(("one", image.shape[1])) or "one"
+            ocr_pipeline.recognize_many = lambda reader, images, preprocess=True: (
+                calls.append(("many", [image.shape[1] for image in images])) or ["many"] * len(images))
+            items = [(cv2.imencode(".png", np.zeros((20, width), dtype=np.uint8))[1].tobytes(), False)
+                     for width in (50, 200, 60, 300)]
+            outcomes = ocr_server.OCRServer._recognize_batch(object(), items)
+        finally:
+            tiled_ocr.needs_tiling, ocr_pipeline.recognize, ocr_pipeline.recognize_many = saved
+        if outcomes != ["many", "one", "many", "one"] or calls != [("one", 200), ("one", 300), ("many", [50, 60])]:
+            print(f"✗ 大きな画像がまとめて認識されています: {outcomes} {calls}")
+            return False
+        print("✓ 大きな画像のタイル分けへの振り分け成功")
+        return True
+    except Exception as e:
+        print(f"✗ マイクロバッチテスト失敗: {e}")
+        return False
+
+def test_ocr_cache():
+    """認識結果キャッシュ（メモリ＋ディスク）の動作テスト"""
+    print("\n認識結果キャッシュテストを開始...")
+    
+    try:
+        import tempfile
+        from ocr_cache import OCRResultCache, make_key
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            key = make_key(b"image-bytes", {"preprocess": True})
+            if key == make_key(b"image-bytes", {"preprocess": False}):
+                print("✗ 設定が違うのに同じキーになりました")
+                return False
+            
+            cache = OCRResultCache(path, memory_entries=1)
+            cache.put(key, ["こんにちは"])
+            cache.close()
+            
+            # 新しく開き直してもディスクから読める
+            cache = OCRResultCache(path, memory_entries=1)
+            if cache.get(key) != ["こんにちは"]:
+                print("✗ ディスクから結果を読めませんでした")
+                return False
+            print("✓ ディスクキャッシュ読み込み成功")
+            
+            # 上限を超えたら古いものから消える
+            small = OCRResultCache(os.path.join(tmp, "small.sqlite3"), memory_entries=0, disk_max_bytes=20)
+            small.put("old", "x" * 10)
+            small.put("new", "y" * 10)
+            if small.get("old") is not None or small.get("new") is None:
+                print("✗ サイズ上限による削除が正しくありません")
+                return False
+            print("✓ サイズ上限による削除成功")
+            cache.close()
+            small.close()
+        
+        return True
+    except Exception as e:
+        print(f"✗ 認識結果キャッシュテスト失敗: {e}")
+        return False
+
+def test_tts_cache():
+    """音声ファイルのキャッシュ（古いものからの削除）と WAV のつなげ方のテスト"""
+    print("\n音声キャッシュテストを開始...")
+    
+    try:
+        import tempfile
+        import wave
+        import tts_cache
+        
+        def write_wav(path, frames, rate=22050):
+            with wave.open(path, "wb") as out:
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(rate)
+                out.writeframes(b"\x01\x00" * frames)
+        
+        class FakeEngine:
+            """pyttsx3 の代わりに、決まった長さの無音の WAV を書き出す"""
+            def __init__(self):
+                self.saved = []
+            
+            def getProperty(self, name):
+                return "fake-voice" if name == "voice" else None
+            
+            def setProperty(self, name, value):
+                pass
+            
+            def save_to_file(self, text, path):
+                self.saved.append(text)
+                write_wav(path, 1000)
+            
+            def runAndWait(self):
+                pass
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = FakeEngine()
+            probe = os.path.join(tmp, "probe.wav")
+            write_wav(probe, 1000)
+            size = os.path.getsize(probe)
+            os.remove(probe)
+            
+            renderer = tts_cache.TTSRenderer(engine, cache_dir=tmp, max_bytes=size * 2)
+            first = renderer.render("こんにちは")
+            second = renderer.render("さようなら")
+            os.utime(first, (1000, 1000))
+            os.utime(second, (2000, 2000))
+            # キャッシュから使うと「最近使った」ことになる
+            if renderer.render("こんにちは") != first or engine.saved != ["こんにちは", "さようなら"]:
+                print(f"✗ キャッシュが使われていません: {engine.saved}")
+                return False
+            third = renderer.render("ありがとう")
+            if not os.path.exists(first) or os.path.exists(second) or not os.path.exists(third):
+                print("✗ 上限を超えたときに一番古く使われたファイルが消えていません")
+                return False
+            print("✓ 上限を超えたときの古いものからの削除成功")
+            
+            parts = [os.path.join(tmp, "a.part"), os.path.join(tmp, "b.part")]
+            write_wav(parts[0], 300)
+            write_wav(parts[1], 500)
+            joined = os.path.join(tmp, "joined.part")
+            tts_cache.concat_wav(parts, joined)
+            with wave.open(joined, "rb") as src:
+                header = (src.getnchannels(), src.getsampwidth(), src.getframerate(), src.getnframes())
+            if header != (1, 2, 22050, 800) or abs(tts_cache.wav_duration(joined) - 800 / 22050) > 1e-9:
+                print(f"✗ つなげた WAV のヘッダーが正しくありません: {header}")
+                return False
+            write_wav(parts[1], 500, rate=16000)
+            try:
+                tts_cache.concat_wav(parts, joined)
+                print("✗ 形式の違う WAV をつなげてしまいました")
+                return False
+            except ValueError:
+                pass
+            print("✓ WAV のつなげ方成功")
+        return True
+    except Exception as e:
+        print(f"✗ 音声キャッシュテスト失敗: {e}")
+        return False
+
+def test_split_sentences():
+    """読み上げ用の文の区切りテスト"""
+    print("\n文の区切りテストを開始...")
+    
+    try:
+        from speech_stream import split_sentences
+        
+        text = "こんにちは。今日は晴れです！\nPrice is 3.14 dollars. Really? はい"
+        expected = ["こんにちは。", "今日は晴れです！", "Price is 3.14 dollars.", "Really?", "はい"]
+        sentences = split_sentences(text)
+        if sentences != expected:
+            print(f"✗ 区切り方が正しくありません: {sentences}")
+            return False
+        print("✓ 日本語・英語の文の区切り成功")
+        return True
+    except Exception as e:
+        print(f"✗ 文の区切りテスト失敗: {e}")
+        return False
+
+def test_preprocess_pipeline():
+    """前処理パイプラインの戻り値が使い回しの配列でないことのテスト"""
+    print("\n前処理パイプラインテストを開始...")
+    
+    try:
+        import cv2
+        import numpy as np
+        import preprocessing
+        
+        def page(seed):
+            # 文字の高さが TARGET_CHAR_HEIGHT くらいの画像（自動の倍率が x1 になる）
+            image = np.full((300, 600, 3), 255, dtype=np.uint8)
+            rng = np.random.RandomState(seed)
+            for row in range(5):
+                text = "".join(rng.choice(list("ABCDEFGHKMNPRSTUVWXYZ"), 12))
+                cv2.putText(image, text, (10, 50 + row * 55), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+            return image
+        
+        pipeline = preprocessing.PreprocessPipeline(preprocessing.APP_STAGES)
+        first = pipeline.run(page(0))
+        if pipeline.last_timings[-1][0] != "resize(x1)":
+            print(f"✗ 自動の倍率が x1 になりませんでした: {pipeline.last_timings[-1][0]}")
+            return False
+        expected = first.copy()
+        pipeline.run(page(1))
+        changed = int(np.count_nonzero(first != expected))
+        if changed:
+            print(f"✗ 次の前処理で前の結果が書き換えられました（{changed} 画素）")
+            return False
+        print("✓ x1 のときも前の結果が書き換えられない")
+        return True
+    except Exception as e:
+        print(f"✗ 前処理パイプラインテスト失敗: {e}")
+        return False
+
+def test_page_stream():
+    """複数ページTIFFの1ページずつの読み込みテスト"""
+    print("\n複数ページ読み込みテストを開始...")
+    
+    try:
+        import os
+        import tempfile
+        from PIL import Image
+        import page_stream
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pages.tiff")
+            frames = [Image.new("L", (40 + i, 30), color=i * 60) for i in range(3)]
+            frames[0].save(path, save_all=True, append_images=frames[1:])
+            
+            if page_stream.page_count(path) != 3 or not page_stream.is_multipage(path):
+                print("✗ ページ数が正しくありません")
+                return False
+            pages = [(page_no, image.shape) for page_no, image in page_stream.iter_pages(path)]
+            if pages != [(1, (30, 40, 3)), (2, (30, 41, 3)), (3, (30, 42, 3))]:
+                print(f"✗ ページの読み込み結果が正しくありません: {pages}")
+                return False
+            widths = list(page_stream.iter_page_results(path, lambda image: image.shape[1]))
+            if widths != [(1, 40), (2, 41), (3, 42)]:
+                print(f"✗ ページごとの結果が正しくありません: {widths}")
+                return False
+        print("✓ 1ページずつの読み込み成功")
+        return True
+    except Exception as e:
+        print(f"✗ 複数ページ読み込みテスト失敗: {e}")
+        return False
+
+def test_settings_and_daemon():
+    """設定の確認（--check）とデーモンの停止（--stop）のテスト"""
+    print("\n設定の確認とデーモンの停止テストを開始...")
+    
+    try:
+        import signal
+        import subprocess
+        import sys
+        import tempfile
+        import ocr_daemon
+        import ocr_from_path
+        
+        if ocr_from_path.validate_settings():
+            print(f"✗ 既定の設定で問題が見つかりました: {ocr_from_path.validate_settings()}")
+            return False
+        bad = {
+            "IMAGE_PATH": "存在しない画像.png", "LANGS": [], "RESIZE_SCALE": "big", "THRESH_METHOD": "mean",
+            "INFERENCE_BACKEND": "onnx", "USE_GPU": True, "TEXT_PREFILTER": "ocr", "DETAIL": 2, "ROI": (0, 0, 0, 10),
+        }
+        saved = {name: getattr(ocr_from_path, name) for name in bad}
+        try:
+            for name, value in bad.items():
+                setattr(ocr_from_path, name, value)
+            problems = ocr_from_path.validate_settings()
+        finally:
+            for name, value in saved.items():
+                setattr(ocr_from_path, name, value)
+        expected = ["IMAGE_PATH", "LANGS", "RESIZE_SCALE", "THRESH_METHOD", "CPU 専用", "TEXT_PREFILTER", "DETAIL", "ROI"]
+        if len(problems) != len(expected) or not all(word in problem for word, problem in zip(expected, problems)):
+            print(f"✗ 設定の問題の見つけ方が正しくありません: {problems}")
+            return False
+        print("✓ 設定の問題の確認成功")
+        
+        if os.name != "posix":
+            print("（デーモンは macOS / Linux 専用なので、停止テストを省きます）")
+            return True
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "ocr.sock")
+            if ocr_daemon.main(["--stop", "--socket", socket_path]) != 1:
+                print("✗ pid ファイルがないのに停止できたことになっています")
+                return False
+            # デーモンの代わりに、待っているだけのプロセスを止めてみる
+            process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+            try:
+                with open(socket_path + ".pid", "w") as f:
+                    f.write(str(process.pid))
+                stopped = ocr_daemon.main(["--stop", "--socket", socket_path])
+                returncode = process.wait(timeout=10)
+            finally:
+                if process.poll() is None:
+                    process.kill()
+            if stopped != 0 or returncode != -signal.SIGTERM:
+                print(f"✗ pid ファイルのプロセスを停止できませんでした: {stopped}, {returncode}")
+                return False
+            with open(socket_path + ".pid", "w") as f:
+                f.write("not-a-pid")
+            if ocr_daemon.main(["--stop", "--socket", socket_path]) != 1:
+                print("✗ 壊れた pid ファイルで停止できたことになっています")
+                return False
+            print("✓ pid ファイルを使ったデーモンの停止成功")
+            
+            # デーモンのワーカーの代わりに、1件だけ _handle で答えるスレッドを動かす
+            import socket
+            import threading
+            
+            def serve_once(expect_path):
+                server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                server.bind(expect_path)
+                server.listen(1)
+                
+                def run():
+                    conn, _ = server.accept()
+                    ocr_daemon._handle(conn)
+                    server.close()
+                    os.remove(expect_path)
+                
+                thread = threading.Thread(target=run, daemon=True)
+                thread.start()
+                return thread
+            
+            # 起動後に設定が書き換えられた場合: デーモンは断り、呼び出し側は自分で読み取る（None）
+            thread = serve_once(socket_path)
+            changed = dict(ocr_from_path._result_cache_config(), roi=(0, 0, 10, 10))
+            lines = ocr_daemon.try_read_lines("存在しない画像.png", changed, socket_path)
+            thread.join(10)
+            if lines is not None:
+                print(f"✗ 設定が違うのにデーモンの結果が使われました: {lines}")
+                return False
+            # 設定が同じ場合: デーモンが読み取る（ここでは画像がないのでエラーが返る）
+            thread = serve_once(socket_path)
+            try:
+                ocr_daemon.try_read_lines("存在しない画像.png", ocr_from_path._result_cache_config(), socket_path)
+                print("✗ 設定が同じなのにデーモンが読み取りませんでした")
+                return False
+            except RuntimeError:
+                pass
+            finally:
+                thread.join(10)
+        print("✓ 設定が違うときにデーモンを使わない確認成功")
+        return True
+    except Exception as e:
+        print(f"✗ 設定の確認とデーモンの停止テスト失敗: {e}")
+        return False
+
+def test_roi_templates():
+    """テンプレートの欄ごとの読み取りとキャッシュのテスト"""
+    print("\nROIテンプレートテストを開始...")
+    
+    try:
+        import numpy as np
+        import ocr_cache
+        import roi_templates
+        
+        image = np.zeros((100, 200), dtype=np.uint8)
+        image[10:30, 10:60] = 255
+        template = {"name": (10, 10, 50, 20), "total": (150, 80, 100, 100)}
+        calls = []
+        
+        def recognize(crop):
+            calls.append(crop.shape)
+            return [f"{crop.shape[1]}x{crop.shape[0]}"]
+        
+        cache = ocr_cache.OCRResultCache(path=None)
+        fields = roi_templates.read_fields(image, template, recognize, workers=2, cache=cache)
+        if fields != {"name": ["50x20"], "total": ["50x20"]}:
+            print(f"✗ 欄の読み取り結果が正しくありません: {fields}")
+            return False
+        roi_templates.read_fields(image, template, recognize, cache=cache)
+        if len(calls) != 2:
+            print(f"✗ 同じ欄がキャッシュから返されていません（認識 {len(calls)} 回）")
+            return False
+        if not roi_templates.validate_template("bad", {"x": (0, 0, 0, 10)}):
+            print("✗ 不正な欄を見つけられませんでした")
+            return False
+        print("✓ 欄ごとの読み取りとキャッシュ成功")
+        return True
+    except Exception as e:
+        print(f"✗ ROIテンプレートテスト失敗: {e}")
+        return False
+
+def test_tiled_ocr():
+    """大きな画像のタイル分け（重なり・境目の結果のまとめ）のテスト"""
+    print("\nタイル分けテストを開始...")
+    
+    try:
+        import cv2
+        import numpy as np
+        import tiled_ocr
+        
+        height, width, size, overlap = 2500, 3000, 1024, 128
+        tiles = list(tiled_ocr.iter_tiles(height, width, size, overlap))
+        covered = np.zeros((height, width), dtype=bool)
+        for x, y, w, h in tiles:
+            covered[y:y + h, x:x + w] = True
+        xs = sorted({x for x, _, _, _ in tiles})
+        ys = sorted({y for _, y, _, _ in tiles})
+        if not covered.all() or any(w > size or h > size for _, _, w, h in tiles):
+            print("✗ タイルが画像を覆っていません")
+            return False
+        if any(b - a > size - overlap for a, b in zip(xs, xs[1:])) or any(b - a > size - overlap for a, b in zip(ys, ys[1:])):
+            print(f"✗ となりのタイルの重なりが足りません: {xs} {ys}")
+            return False
+        print("✓ タイルが重なりつきで画像を覆う")
+        
+        class FakeReader:
+            """白い四角を1つの文字列として、「幅x高さ」（元の画像のピクセル）を返す"""
+            def readtext(self, image, detail=1):
+                count, _, stats, _ = cv2.connectedComponentsWithStats((image > 0).astype(np.uint8))
+                return [
+                    ([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], f"{w // 2}x{h // 2}", 0.9)
+                    for x, y, w, h, _ in stats[1:count]
+                ]
+        
+        image = np.zeros((600, 1000), dtype=np.uint8)
+        image[100:130, 420:470] = 255  # 2枚のタイルの重なりの中にある
+        image[300:330, 490:560] = 255  # 1枚目のタイルの境目（x=512）で切れる
+        double = lambda crop: cv2.resize(crop, None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST)
+        results = tiled_ocr.readtext_tiled(FakeReader(), image, double, tile_size=512, overlap=128)
+        texts = [text for _, text, _ in results]
+        if texts != ["50x30", "70x30"]:
+            print(f"✗ 境目の二重の結果がまとまっていません: {texts}")
+            return False
+        if tiled_ocr.box_rect(results[1][0]) != (490.0, 300.0, 560.0, 330.0):
+            print(f"✗ 元の画像の座標に戻っていません: {results[1][0]}")
+            return False
+        print("✓ 境目で二重になった結果のまとめ成功")
+        return True
+    except Exception as e:
+        print(f"✗ タイル分けテスト失敗: {e}")
+        return False
+
+def test_text_presence():
+    """文字のない画像を見分けるプレフィルターのテスト"""
+    print("\n文字の有無の判定テストを開始...")
+    
+    try:
+        import cv2
+        import numpy as np
+        import text_presence
+        
+        blank = np.full((600, 800, 3), 255, dtype=np.uint8)
+        text = blank.copy()
+        for i in range(6):
+            cv2.putText(text, "OCR sample text 123", (20, 80 + i * 80), cv2.FONT_HERSHEY_SIMPLEX,
+                        1.2, (0, 0, 0), 2, cv2.LINE_AA)
+        
+        if text_presence.looks_like_text(blank):
+            print("✗ 白紙の画像を文字ありと判定しました")
+            return False
+        if not text_presence.looks_like_text(text):
+            print("✗ 文字のある画像を文字なしと判定しました")
+            return False
+        print("✓ 文字の有無の判定成功")
+        
+        # まとめて読み取るときの "skipped" は、そのファイルを省いたかどうかだけで決まる
+        import os
+        import tempfile
+        import ocr_from_path
+        
+        class FakeReader:
+            def readtext(self, image, detail=0):
+                text_presence.stats.record(True)  # 同じプロセスのほかの処理が省いた
+                return ["OCR sample text 123"]
+        
+        names = ("TEXT_PREFILTER", "USE_RESULT_CACHE", "USE_PREPROCESS", "USE_TILING", "DETAIL", "ROI")
+        saved = {name: getattr(ocr_from_path, name) for name in names}
+        saved_reader = ocr_from_path._worker_reader
+        try:
+            for name, value in zip(names, ("edges", False, False, False, 0, None)):
+                setattr(ocr_from_path, name, value)
+            ocr_from_path._worker_reader = FakeReader()
+            with tempfile.TemporaryDirectory() as tmp:
+                cv2.imwrite(os.path.join(tmp, "blank.png"), blank)
+                cv2.imwrite(os.path.join(tmp, "text.png"), text)
+                blank_records = ocr_from_path._ocr_one_file(os.path.join(tmp, "blank.png"))
+                text_records = ocr_from_path._ocr_one_file(os.path.join(tmp, "text.png"))
+        finally:
+            for name, value in saved.items():
+                setattr(ocr_from_path, name, value)
+            ocr_from_path._worker_reader = saved_reader
+        if not blank_records[0].get("skipped") or "skipped" in text_records[0] \
+                or text_records[0]["lines"] != ["OCR sample text 123"]:
+            print(f"✗ 省いたファイルの印が正しくありません: {blank_records} {text_records}")
+            return False
+        print("✓ 省いたファイルだけに印をつける処理成功")
+        return True
+    except Exception as e:
+        print(f"✗ 文字の有無の判定テスト失敗: {e}")
+        return False
+
+def test_ocr_results():
+    """認識結果の型（絞り込み・並べ替え・書き出し）のテスト"""
+    print("\n認識結果の型テストを開始...")
+    
+    try:
+        import csv
+        import io
+        from ocr_results import OCRResults
+        
+        def box(x, y):
+            return [[x, y], [x + 50, y], [x + 50, y + 20], [x, y + 20]]
+        
+        results = OCRResults.from_readtext([
+            (box(100, 52), "右", 0.9),
+            (box(0, 50), "左", 0.7),
+            (box(0, 0), "上", 0.05),
+            (box(0, 100)[:3], "壊れた結果", 0.9),
+            (box(0, 150), "信頼度なし"),
+        ])
+        if len(results) != 4 or results.confidences[-1] != 0.5:
+            print(f"✗ 結果の読み込みが正しくありません: {list(results)}")
+            return False
+        valid = results.filter(0.1).sorted()
+        if valid.texts != ["左", "右", "信頼度なし"]:
+            print(f"✗ 絞り込み・並べ替えが正しくありません: {valid.texts}")
+            return False
+        if abs(valid.mean_confidence() - 0.7) > 1e-6:
+            print(f"✗ 平均信頼度が正しくありません: {valid.mean_confidence()}")
+            return False
+        # 下限ちょうどの結果は、アプリでは除き、inclusive=True（ocr_from_path.py）では残す
+        if len(results.filter(0.7)) != 1 or len(results.filter(0.7, inclusive=True)) != 2:
+            print("✗ 信頼度の下限ちょうどの扱いが正しくありません")
+            return False
+        # 領域の並べ替え（ocr_batching）も同じ読む順番になる
+        import ocr_batching
+        regions = [(box.tolist(), text) for box, text in zip(results.boxes, results.texts)]
+        if [text for _, text in ocr_batching.sort_reading_order(regions)] != results.sorted().texts:
+            print("✗ 領域の読む順番が認識結果の読む順番と違います")
+            return False
+        if OCRResults.from_readtext(valid.to_records()).texts != valid.texts:
+            print("✗ JSON 形式から元に戻せません")
+            return False
+        buffer = io.StringIO()
+        valid.write_csv(buffer)
+        rows = list(csv.reader(io.StringIO(buffer.getvalue())))
+        if len(rows) != 4 or rows[1][:2] != ["左", "0.7000"]:
+            print(f"✗ CSV の書き出しが正しくありません: {rows}")
+            return False
+        print("✓ 認識結果の型の操作成功")
+        return True
+    except Exception as e:
+        print(f"✗ 認識結果の型テスト失敗: {e}")
+        return False
+
+def test_ocr_jobs():
+    """文字認識の仕事の順番待ち・取り消しのテスト"""
+    print("\n認識ジョブの順番待ちテストを開始...")
+    
+    try:
+        import threading
+        import ocr_jobs
+        
+        scheduler = ocr_jobs.JobScheduler(workers=1)
+        started = threading.Event()
+        release = threading.Event()
+        done = []
+        dropped = []
+        
+        def blocking(job):
+            started.set()
+            release.wait(5)
+            return "old"
+        
+        old = scheduler.submit(blocking, group="recognize", on_done=done.append)
+        started.wait(5)
+        # 処理中に、後回しの仕事・新しい画像の仕事を出す
+        background = scheduler.submit(lambda job: "background", ocr_jobs.PRIORITY_BACKGROUND, on_done=done.append)
+        queued = scheduler.submit(lambda job: "queued", group="recognize", on_done=done.append,
+                                  on_cancel=lambda: dropped.append("queued"))
+        new = scheduler.submit(lambda job: "new", group="recognize", on_done=done.append)
+        release.set()
+        background.finished.wait(5)
+        scheduler.shutdown(wait=True)
+        
+        if not old.cancelled or new.cancelled:
+            print(f"✗ 古い仕事が取り消されていません: {old}, {new}")
+            return False
+        if done != ["new", "background"]:
+            print(f"✗ 結果の順番・取り消しが正しくありません: {done}")
+            return False
+        # 始まる前に取り消された仕事は動かさず、on_cancel だけを呼ぶ
+        if not queued.finished.is_set() or dropped != ["queued"]:
+            print(f"✗ 始まる前に取り消された仕事の on_cancel が呼ばれていません: {queued}, {dropped}")
+            return False
+        print("✓ 古い仕事の取り消しと優先度順の処理成功")
+        return True
+    except Exception as e:
+        print(f"✗ 認識ジョブの順番待ちテスト失敗: {e}")
+        return False
+
+def test_folder_browser():
+    """フォルダの画像の先読みテスト"""
+    print("\nフォルダの先読みテストを開始...")
+    
+    try:
+        import os
+        import tempfile
+        import cv2
+        import numpy as np
+        import folder_browser
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(8):
+                cv2.imwrite(os.path.join(tmp, f"{i}.png"), np.full((600, 300 + i, 3), i, dtype=np.uint8))
+            paths = folder_browser.list_images(tmp)
+            prepared_paths = []
+            
+            def prepare(path):
+                prepared_paths.append(os.path.basename(path))
+                return folder_browser.prepare_image(path, lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+            
+            browser = folder_browser.FolderBrowser(paths, prepare, ahead=2, max_entries=4, workers=1)
+            first = browser.go_to(0).result(timeout=10)
+            if max(first.display.shape[:2]) != 400 or first.processed_image().ndim != 2:
+                print(f"✗ 表示用の縮小・前処理が正しくありません: {first.display.shape}")
+                return False
+            if first.full_image().shape != (600, 300, 3):
+                print(f"✗ 認識用の画像が元の解像度ではありません: {first.full_image().shape}")
+                return False
+            # 次の2枚は先読みされている
+            browser._future(paths[2]).result(timeout=10)
+            if prepared_paths[:3] != ["0.png", "1.png", "2.png"]:
+                print(f"✗ 先読みの順番が正しくありません: {prepared_paths}")
+                return False
+            for _ in range(5):
+                browser.move(1)
+            if browser.move(1).result(timeout=10).path != paths[6] or len(browser._cache) > 4:
+                print(f"✗ 移動または覚えておく枚数が正しくありません: {list(browser._cache)}")
+                return False
+            browser.close(wait=True)
+        print("✓ 先読みと枚数の上限成功")
+        return True
+    except Exception as e:
+        print(f"✗ フォルダの先読みテスト失敗: {e}")
+        return False
+
+def test_frame_stream():
+    """映像の変化の判定と、新しい文字だけを選ぶテスト"""
+    print("\n映像の変化の判定テストを開始...")
+    
+    try:
+        import cv2
+        import numpy as np
+        import frame_stream
+        
+        sign_a = np.full((240, 320, 3), 255, dtype=np.uint8)
+        cv2.putText(sign_a, "EXIT", (40, 140), cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 8)
+        sign_b = np.full((240, 320, 3), 255, dtype=np.uint8)
+        cv2.putText(sign_b, "OPEN", (20, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 6)
+        noisy_a = cv2.subtract(sign_a, np.full_like(sign_a, 3))  # カメラの小さな明るさの揺れ
+        
+        detector = frame_stream.ChangeDetector(settle_threshold=None)
+        decisions = [detector.should_recognize(frame) for frame in (sign_a, sign_a, noisy_a, sign_b, sign_b)]
+        if decisions != [True, False, False, True, False]:
+            print(f"✗ 変化の判定が正しくありません: {decisions}")
+            return False
+        # 動いている間（直前のフレームと大きく違う間）は認識しない
+        detector = frame_stream.ChangeDetector()
+        decisions = [detector.should_recognize(frame) for frame in (sign_a, sign_b, sign_b)]
+        if decisions != [True, False, True]:
+            print(f"✗ 落ち着くまで待つ判定が正しくありません: {decisions}")
+            return False
+        print("✓ 変化したフレームだけを認識する判定成功")
+        
+        text_filter = frame_stream.NewTextFilter()
+        first = text_filter.new_lines(["非常口はこちら", "EXIT"])
+        # 同じ看板を読み直すと、全角・半角や1文字の読み違いがあっても読み上げない
+        second = text_filter.new_lines(["非常ロはこちら", "ＥＸＩＴ", "営業中です"])
+        if first != ["非常口はこちら", "EXIT"] or second != ["営業中です"]:
+            print(f"✗ 新しい文字の判定が正しくありません: {first} {second}")
+            return False
+        print("✓ 新しい文字だけを選ぶ処理成功")
+        
+        # 読み上げ中に新しい文字が来ても、読み上げ中の文を止めずに続けて読む
+        import queue
+        import threading
+        import time
+        import speech_stream
+        
+        class FakeRenderer:
+            def render(self, sentence, rate, volume):
+                return sentence
+        
+        class FakePlayer:
+            def __init__(self):
+                self.played = []
+                self.stopped = 0
+            
+            def play(self, path):
+                time.sleep(0.05)
+                self.played.append(path)
+            
+            def stop(self):
+                self.stopped += 1
+        
+        player = FakePlayer()
+        speaker = speech_stream.StreamingSpeaker(FakeRenderer(), player)
+        sentences = queue.Queue()
+        finished = threading.Event()
+        speaker.speak_iter(iter(sentences.get, None), on_finish=finished.set)
+        stopped_before = player.stopped
+        for batch in (["非常口はこちら。", "EXIT"], ["営業中です。"]):
+            for line in batch:
+                sentences.put(line)
+            time.sleep(0.02)  # 1つ目の文の再生中に次の文字が来る
+        sentences.put(None)
+        if not finished.wait(timeout=5) or player.played != ["非常口はこちら。", "EXIT", "営業中です。"] \
+                or player.stopped != stopped_before:
+            print(f"✗ 新しい文字の読み上げで前の文が途切れました: {player.played}")
+            return False
+        print("✓ 新しい文字を続けて読み上げ成功")
+        return True
+    except Exception as e:
+        print(f"✗ 映像の変化の判定テスト失敗: {e}")
+        return False
+
+def test_stage_metrics():
+    """段階ごとの計測と書き出しのテスト"""
+    print("\n段階ごとの計測テストを開始...")
+    
+    import stage_metrics
+    saved = (stage_metrics.TRACE_FILE, stage_metrics.PROFILE_STAGES, stage_metrics.PROFILE_DIR)
+    try:
+        import json
+        import os
+        import tempfile
+        import numpy as np
+        
+        class FakeReader:
+            def detect(self, img):
+                return [[[0, 10, 0, 10], [20, 30, 0, 10]]], [[]]
+            
+            def recognize(self, img_cv_grey, horizontal_list, free_list):
+                return [("box", "文字", 0.9)] * len(horizontal_list)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            stage_metrics.reset()
+            stage_metrics.TRACE_FILE = os.path.join(tmp, "trace.jsonl")
+            stage_metrics.PROFILE_STAGES = ("detect",)
+            stage_metrics.PROFILE_DIR = os.path.join(tmp, "profiles")
+            
+            image = np.zeros((30, 40, 3), dtype=np.uint8)
+            reader = stage_metrics.instrument_reader(FakeReader())
+            with stage_metrics.span("ocr", **stage_metrics.image_attrs(image)):
+                horizontal, free = reader.detect(image)
+                reader.recognize(image[:, :, 0], horizontal[0], free[0])
+            try:
+                with stage_metrics.span("decode"):
+                    raise ValueError("壊れた画像")
+            except ValueError:
+                pass
+            
+            with open(stage_metrics.TRACE_FILE, encoding="utf-8") as f:
+                spans = {entry["stage"]: entry for entry in map(json.loads, f)}
+            if (spans["detect"]["boxes"] != 2 or spans["recognize"]["boxes"] != 2
+                    or spans["detect"]["parent"] != spans["ocr"]["span"] or spans["ocr"]["width"] != 40
+                    or spans["decode"].get("error") != "ValueError"):
+                print(f"✗ スパンの記録が正しくありません: {spans}")
+                return False
+            if not os.listdir(stage_metrics.PROFILE_DIR):
+                print("✗ cProfile の結果が保存されていません")
+                return False
+            print("✓ スパンの記録（JSONL）と cProfile 成功")
+            
+            text = stage_metrics.render_prometheus()
+            expected = [
+                'img2speech_stage_seconds_count{stage="detect"} 1',
+                'img2speech_stage_boxes_total{stage="detect"} 2',
+                'img2speech_stage_seconds_bucket{stage="recognize",le="+Inf"} 1',
+            ]
+            missing = [line for line in expected if line not in text]
+            if missing:
+                print(f"✗ Prometheus 形式の出力が正しくありません: {missing}")
+                return False
+            print("✓ Prometheus 形式の出力成功")
+        return True
+    except Exception as e:
+        print(f"✗ 段階ごとの計測テスト失敗: {e}")
+        return False
+    finally:
+        stage_metrics.TRACE_FILE, stage_metrics.PROFILE_STAGES, stage_metrics.PROFILE_DIR = saved
+        stage_metrics.reset()
+
+def test_fused_ocr():
+    """前処理画像と元画像の結果をまとめるテスト"""
+    print("\n統合認識テストを開始...")
+    
+    try:
+        import threading
+        import numpy as np
+        import fused_ocr
+        
+        box = lambda x, y, w, h: [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+        processed = [(box(0, 0, 100, 20), "請求書", 0.6), (box(0, 40, 100, 20), "合計", 0.08)]
+        original = [(box(2, 1, 98, 19), "請求言", 0.3), (box(0, 40, 100, 20), "合計", 0.4),
+                    (box(0, 80, 50, 20), "円", 0.04)]
+        fused, sources = fused_ocr.fuse([(processed, 0.1), (original, 0.05)])
+        texts = sorted(text for _, text, _ in fused)
+        # 同じ場所は信頼度の高い方、前処理画像の低信頼度の「合計」は元画像の方、信頼度5%未満は除外
+        if texts != ["合計", "請求書"] or sorted(sources) != [fused_ocr.PROCESSED, fused_ocr.ORIGINAL]:
+            print(f"✗ 結果のまとめ方が正しくありません: {fused} {sources}")
+            return False
+        print("✓ IoU での結果のまとめ成功")
+        
+        class FakeReader:
+            def __init__(self):
+                self.threads = set()
+            
+            def readtext(self, image, detail=1):
+                self.threads.add(threading.current_thread().name)
+                if image.ndim == 2:  # 前処理した（2倍に拡大した）画像
+                    return [(box(0, 0, 200, 40), "請求書", 0.9)]
+                return [(box(0, 0, 100, 20), "請求言", 0.5), (box(0, 50, 60, 20), "No.12", 0.7)]
+        
+        reader = FakeReader()
+        image = np.zeros((100, 120, 3), dtype=np.uint8)
+        results = fused_ocr.readtext_fused(
+            reader, image, lambda img: np.zeros((200, 240), dtype=np.uint8), share_detection=False
+        )
+        if (sorted(results.texts) != ["No.12", "請求書"] or len(reader.threads) != 2
+                or results.boxes[results.texts.index("請求書")].max() != 100):
+            print(f"✗ 2つの認識の同時実行・座標の変換が正しくありません: {list(results)} {reader.threads}")
+            return False
+        print("✓ 2つの認識の同時実行と座標の変換成功")
+        return True
+    except Exception as e:
+        print(f"✗ 統合認識テスト失敗: {e}")
+        return False
+
+def test_image_buffer():
+    """画像の共有（コピーしない読み込み）とピークメモリのテスト"""
+    print("\n画像の共有テストを開始...")
+    
+    try:
+        import os
+        import tempfile
+        import tracemalloc
+        import cv2
+        import numpy as np
+        from PIL import Image
+        import folder_browser
+        import image_buffer
+        
+        height, width = 1200, 1600
+        frame_bytes = height * width * 3
+        original = np.random.RandomState(0).randint(0, 256, (height, width, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            png_path = os.path.join(tmp, "page.png")
+            gif_path = os.path.join(tmp, "page.gif")
+            cv2.imwrite(png_path, original)
+            Image.fromarray(original[:, :, ::-1]).convert("P").save(gif_path)
+            
+            decoded = image_buffer.decode_file(png_path)
+            if not np.array_equal(decoded, original) or decoded.flags.writeable:
+                print("✗ デコードした画像が正しくないか、書き換えられます")
+                return False
+            with Image.open(gif_path) as pil_image:
+                expected = np.asarray(pil_image.convert("RGB"))[:, :, ::-1]
+            if not np.array_equal(image_buffer.decode_file(gif_path), expected):
+                print("✗ PIL で読んだ画像の色の並びが正しくありません")
+                return False
+            if not np.array_equal(np.asarray(image_buffer.to_pil(decoded)), original[:, :, ::-1]):
+                print("✗ 表示用の PIL 画像の色が正しくありません")
+                return False
+            small = decoded[:300, :400]
+            if folder_browser.shrink_for_display(small) is not small:
+                print("✗ 縮小の要らない画像がコピーされています")
+                return False
+            print("✓ 1回のデコードと読み取り専用の共有成功")
+            
+            # 1枚読み込むときのピークメモリ（numpy と Python の分。tracemalloc は libpng や PIL の中のメモリを数えない）
+            peaks = {}
+            for name, path in (("png", png_path), ("gif", gif_path)):
+                tracemalloc.start()
+                try:
+                    prepared = folder_browser.prepare_image(path, lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+                    peaks[name] = tracemalloc.get_traced_memory()[1] / frame_bytes
+                finally:
+                    tracemalloc.stop()
+                del prepared
+            print(f"  numpy と Python のピークメモリ: PNG {peaks['png']:.2f}F, GIF {peaks['gif']:.2f}F（F = 幅×高さ×3 バイト）")
+            if peaks["png"] > 1.2 or peaks["gif"] > 1.2:
+                print("✗ 読み込みのピークメモリが多すぎます")
+                return False
+            print("✓ ピークメモリの確認成功")
+        
+        # ライブラリの中のメモリも含めたプロセスのピーク（RSS）を、別のプロセスで測って比べる
+        try:
+            import resource  # noqa: F401  Windows にはありません
+        except ImportError:
+            print("（このOSでは RSS の確認を省きます）")
+            return True
+        import subprocess
+        import sys
+        script = (
+            "import resource, sys, cv2, numpy as np, image_buffer\n"
+            "from PIL import Image\n"
+            "def rss():\n"
+            "    try:\n"
+            "        with open('/proc/self/status') as f:\n"
+            "            return next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))\n"
+            "    except OSError:\n"
+            "        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+            "        return peak if sys.platform == 'darwin' else peak * 1024\n"
+            "try:\n"
+            "    # Linux では親プロセスのピークを引き継ぐので、ピークを今の値に戻してから測る\n"
+            "    with open('/proc/self/clear_refs', 'w') as f:\n"
+            "        f.write('5')\n"
+            "except OSError:\n"
+            "    pass\n"
+            "path, method = sys.argv[1:3]\n"
+            "before = rss()\n"
+            "if method == 'buffer':\n"
+            "    image = image_buffer.decode_file(path)\n"
+            "elif method == 'imread':\n"
+            "    image = cv2.imread(path)\n"
+            "else:\n"
+            "    with Image.open(path) as pil_image:\n"
+            "        image = cv2.cvtColor(np.array(pil_image.convert('RGB')), cv2.COLOR_RGB2BGR)\n"
+            "print(rss() - before)\n"
+        )
+        height, width = 3000, 4000
+        frame_bytes = height * width * 3
+        # 圧縮しやすい画像にして、ファイルのメモリマップの分を小さくする
+        large = np.zeros((height, width, 3), dtype=np.uint8)
+        large[:, :, 0] = np.arange(width) % 256
+        large[:, :, 1] = (np.arange(height) % 256)[:, None]
+        with tempfile.TemporaryDirectory() as tmp:
+            png_path = os.path.join(tmp, "large.png")
+            gif_path = os.path.join(tmp, "large.gif")
+            cv2.imwrite(png_path, large)
+            Image.fromarray(large[:, :, ::-1]).convert("P").save(gif_path)
+            del large
+            
+            def rss_peak(path, method):
+                output = subprocess.run([sys.executable, "-c", script, path, method], check=True,
+                                        capture_output=True, text=True, timeout=120,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+                return int(output.strip().splitlines()[-1]) / frame_bytes
+            
+            rss = {
+                "png": rss_peak(png_path, "buffer"), "png_imread": rss_peak(png_path, "imread"),
+                "gif": rss_peak(gif_path, "buffer"), "gif_before": rss_peak(gif_path, "pil_array"),
+            }
+        print(f"  プロセスのピーク（RSS）: PNG {rss['png']:.2f}F（cv2.imread {rss['png_imread']:.2f}F）, "
+              f"GIF {rss['gif']:.2f}F（以前の読み込み方 {rss['gif_before']:.2f}F）")
+        if rss["png"] > rss["png_imread"] + 0.25 or rss["gif"] > rss["gif_before"] - 0.5:
+            print("✗ ライブラリの中のメモリも含めたピークが多すぎます")
+            return False
+        print("✓ RSS でのピークメモリの確認成功")
+        return True
+    except Exception as e:
+        print(f"✗ 画像の共有テスト失敗: {e}")
+        return False
+
+def test_full_resolution():
+    """表示用の縮小画像と、認識用の元の解像度の画像を分けるテスト"""
+    print("\n元の解像度での認識の準備テストを開始...")
+    
+    try:
+        import os
+        import tempfile
+        import tracemalloc
+        import cv2
+        import numpy as np
+        import folder_browser
+        
+        height, width = 2400, 3200
+        frame_bytes = height * width * 3
+        original = np.zeros((height, width, 3), dtype=np.uint8)
+        cv2.putText(original, "TEST", (200, 1400), cv2.FONT_HERSHEY_SIMPLEX, 30, (255, 255, 255), 60)
+        calls = []
+        
+        def preprocess(image):
+            calls.append(image.shape)
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "photo.jpg")
+            cv2.imwrite(path, original)
+            
+            tracemalloc.start()
+            try:
+                prepared = folder_browser.prepare_image(path, preprocess)
+                peak = tracemalloc.get_traced_memory()[1] / frame_bytes
+            finally:
+                tracemalloc.stop()
+            print(f"  表示の準備のピークメモリ: {peak:.2f}F（F = 幅×高さ×3 バイト）")
+            if prepared.display.shape != (300, 400, 3) or prepared.is_loaded or calls:
+                print(f"✗ 表示の準備で元の解像度の画像を読んでいます: {prepared.display.shape}, {calls}")
+                return False
+            if peak > 0.2:
+                print("✗ JPEG が縮小してデコードされていません")
+                return False
+            print("✓ 表示用の縮小画像だけを用意成功")
+            
+            if prepared.full_image().shape != (height, width, 3):
+                print(f"✗ 認識用の画像が元の解像度ではありません: {prepared.full_image().shape}")
+                return False
+            processed = prepared.processed_image()
+            if prepared.processed_image() is not processed or calls != [(height, width, 3)]:
+                print(f"✗ 前処理が元の解像度で1回だけ行われていません: {calls}")
+                return False
+            prepared.release()
+            if prepared.is_loaded or prepared.processed_image().shape != (height, width):
+                print("✗ 手放したあとに読み込み直せません")
+                return False
+            print("✓ 元の解像度の画像を必要なときだけ読み込み成功")
+            
+            # 前処理の結果（前処理の側の配列）を読み取り専用にしてしまわないこと
+            import preprocessing
+            pipeline = preprocessing.PreprocessPipeline(preprocessing.APP_STAGES)
+            outputs = []
+            
+            def run_pipeline(image):
+                outputs.append(pipeline.run(image))
+                return outputs[-1]
+            
+            pages = []
+            for i in range(2):
+                page_path = os.path.join(tmp, f"page{i}.png")
+                page = np.full((300, 600, 3), 255, dtype=np.uint8)
+                cv2.putText(page, "ABCDEFGHKMNP"[i:] + "RSTUV", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+                cv2.putText(page, "WXYZ" * 3, (10, 160), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+                cv2.imwrite(page_path, page)
+                pages.append(folder_browser.prepare_image(page_path, run_pipeline))
+            first = pages[0].processed_image()
+            expected = first.copy()
+            second = pages[1].processed_image()
+            if first.flags.writeable or second.flags.writeable or not all(out.flags.writeable for out in outputs):
+                print("✗ 前処理の結果の書き込みの可否が正しくありません")
+                return False
+            if not np.array_equal(first, expected) or second.ndim != 2:
+                print("✗ 2枚続けて前処理すると結果が正しくありません")
+                return False
+            print("✓ 2枚続けて前処理成功")
+        return True
+    except Exception as e:
+        print(f"✗ 元の解像度での認識の準備テスト失敗: {e}")
+        return False
+
 def test_pyttsx3():
     """pyttsx3の基本機能テスト"""
     print("\npyttsx3機能テストを開始...")
@@ -114,6 +1397,27 @@ def main():
     tests = [
         ("ライブラリインポート", test_imports),
         ("EasyOCR機能", test_easyocr),
+        ("リーダーキャッシュ", test_reader_cache),
+        ("推論バックエンド", test_inference_backend),
+        ("認識結果キャッシュ", test_ocr_cache),
+        ("文字認識サーバー", test_ocr_server),
+        ("マイクロバッチ", test_ocr_batching),
+        ("音声キャッシュ", test_tts_cache),
+        ("文の区切り", test_split_sentences),
+        ("前処理パイプライン", test_preprocess_pipeline),
+        ("複数ページ読み込み", test_page_stream),
+        ("設定の確認とデーモンの停止", test_settings_and_daemon),
+        ("ROIテンプレート", test_roi_templates),
+        ("タイル分け", test_tiled_ocr),
+        ("文字の有無の判定", test_text_presence),
+        ("認識結果の型", test_ocr_results),
+        ("認識ジョブの順番待ち", test_ocr_jobs),
+        ("フォルダの先読み", test_folder_browser),
+        ("映像の変化の判定", test_frame_stream),
+        ("段階ごとの計測", test_stage_metrics),
+        ("統合認識", test_fused_ocr),
+        ("画像の共有", test_image_buffer),
+        ("元の解像度での認識", test_full_resolution),
         ("pyttsx3機能", test_pyttsx3),
         ("GUI機能", test_gui)
     ]
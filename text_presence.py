@@ -0,0 +1,158 @@
+"""
+文字が写っていない画像を、文字認識の前に見分ける処理（プレフィルター）
+- 認識（readtext）は検出と認識の両方を行うので、文字のない画像にも時間がかかります
+- ここでは縮小した画像で安く「文字がありそうか」を調べ、なさそうなら認識を省きます
+
+方法は3つから選べます:
+- "edges": 輪郭（エッジ）の量と、文字らしい形（MSER）の数で判定します（モデル不要・数ミリ秒）
+- "craft": 縮小した画像で文字領域の検出（CRAFT）だけを行います。見つかった領域は
+  元の大きさの画像から切り出して認識に回すので、検出を2回することはありません
+- None: プレフィルターを使いません
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import ocr_batching
+
+# 判定に使う縮小画像の長い辺（ピクセル）
+PREFILTER_MAX_SIDE = 640
+# 輪郭の画素の割合がこれより小さければ「文字なし」とします
+MIN_EDGE_DENSITY = 0.002
+# 文字らしい形（MSER の領域）がこの数より少なければ「文字なし」とします
+MIN_TEXT_REGIONS = 5
+# CRAFT で検出するときの縮小画像の長い辺（ピクセル）
+DETECT_MAX_SIDE = 1280
+
+Result = Tuple[list, str, float]
+
+
+class PrefilterStats:
+    """調べた画像の数と、文字なしとして省いた画像の数を数えます。"""
+
+    def __init__(self):
+        self.checked = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def record(self, skipped: bool) -> None:
+        with self._lock:
+            self.checked += 1
+            if skipped:
+                self.skipped += 1
+
+    def __repr__(self) -> str:
+        return f"PrefilterStats(checked={self.checked}, skipped={self.skipped})"
+
+
+# プロセス全体の集計
+stats = PrefilterStats()
+
+
+def _shrink(image: np.ndarray, max_side: int) -> Tuple[np.ndarray, float]:
+    """長い辺が max_side 以下になるよう縮小し、(縮小画像, 倍率) を返します。"""
+    height, width = image.shape[:2]
+    scale = min(1.0, float(max_side) / max(height, width))
+    if scale >= 1.0:
+        return image, 1.0
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _to_gray(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def edge_density(gray: np.ndarray) -> float:
+    """輪郭（Canny）の画素の割合を返します。"""
+    edges = cv2.Canny(gray, 50, 150)
+    return float(np.count_nonzero(edges)) / max(1, edges.size)
+
+
+def count_text_regions(gray: np.ndarray) -> int:
+    """MSER で見つけた領域のうち、文字らしい大きさ・形のものを数えます。"""
+    height = gray.shape[0]
+    mser = cv2.MSER_create()
+    mser.setMinArea(8)
+    mser.setMaxArea(max(64, gray.size // 20))
+    _, boxes = mser.detectRegions(gray)
+    if boxes is None or len(boxes) == 0:
+        return 0
+    boxes = np.asarray(boxes)
+    w = boxes[:, 2].astype(np.float32)
+    h = boxes[:, 3].astype(np.float32)
+    aspect = w / np.maximum(h, 1.0)
+    text_like = (h >= 4) & (h <= max(8.0, height * 0.3)) & (aspect >= 0.1) & (aspect <= 10.0)
+    return int(np.count_nonzero(text_like))
+
+
+def looks_like_text(image: np.ndarray, max_side: int = PREFILTER_MAX_SIDE) -> bool:
+    """縮小した画像で、文字がありそうなら True を返します（モデルは使いません）。
+
+    輪郭の量を先に調べ、少なすぎれば MSER は動かさずに False を返します。
+    """
+    gray = _to_gray(_shrink(image, max_side)[0])
+    if edge_density(gray) < MIN_EDGE_DENSITY:
+        return False
+    return count_text_regions(gray) >= MIN_TEXT_REGIONS
+
+
+def skip_blank(image: np.ndarray) -> bool:
+    """文字がなさそうなら True を返し、結果を stats に数えます。"""
+    skipped = not looks_like_text(image)
+    stats.record(skipped)
+    return skipped
+
+
+def scale_boxes(horizontal_list: list, free_list: list, factor: float) -> Tuple[list, list]:
+    """検出した領域の座標を factor 倍します（縮小画像で検出した領域を、元の画像の座標に戻すときなど）。"""
+    if factor == 1.0:
+        return horizontal_list, free_list
+    horizontal = [[int(round(v * factor)) for v in box] for box in horizontal_list]
+    free = [[[int(round(x * factor)), int(round(y * factor))] for x, y in box] for box in free_list]
+    return horizontal, free
+
+
+def detect_downscaled(reader, image: np.ndarray,
+                      max_side: int = DETECT_MAX_SIDE) -> Tuple[np.ndarray, list, list]:
+    """縮小した画像で文字領域を検出し、元の画像の座標で返します。
+
+    戻り値は ocr_batching.detect_regions と同じ (グレースケール画像, 横書きの領域, 傾いた領域) です。
+    グレースケール画像は元の大きさなので、認識は元の解像度で行えます。
+    """
+    from easyocr.utils import reformat_input
+
+    img, img_cv_grey = reformat_input(image)
+    small, scale = _shrink(img, max_side)
+    horizontal_list, free_list = reader.detect(small)
+    horizontal, free = scale_boxes(horizontal_list[0], free_list[0], 1.0 / scale)
+    return img_cv_grey, horizontal, free
+
+
+def readtext_prefiltered(reader, image: np.ndarray, method: Optional[str] = "edges") -> Tuple[List[Result], bool]:
+    """プレフィルターで文字がなさそうな画像を省いてから認識します。
+
+    戻り値は (readtext(detail=1) と同じ形の結果, 省いたか) です。省いた結果は stats に数えます。
+    """
+    if method is None:
+        return reader.readtext(image, detail=1), False
+    if method == "edges":
+        if skip_blank(image):
+            return [], True
+        return reader.readtext(image, detail=1), False
+    if method == "craft":
+        img_cv_grey, horizontal, free = detect_downscaled(reader, image)
+        skipped = not horizontal and not free
+        stats.record(skipped)
+        if skipped:
+            return [], True
+        regions = ocr_batching.sort_reading_order(ocr_batching.crop_regions(img_cv_grey, horizontal, free))
+        return ocr_batching.recognize_regions(reader, regions), False
+    raise ValueError(f"プレフィルターの方法は \"edges\" か \"craft\" にしてください: {method!r}")
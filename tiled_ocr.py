@@ -0,0 +1,143 @@
+"""
+大きな画像をタイルに分けて文字認識する処理
+- 画像を少し重なりのあるタイル（四角い区画）に分け、1枚ずつ前処理・認識します
+- 前処理で2倍に拡大しても、メモリに載るのは1タイル分（と同時に動かす数）だけです
+- タイルの境目で二重に読み取った文字は、座標の重なりを見て1つにまとめます
+- 戻り値は readtext(detail=1) と同じ形（座標は元の画像の座標）です
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# === タイルの設定 ===
+# タイル1枚の大きさ（ピクセル、前処理する前の大きさ）
+TILE_SIZE = 1024
+# となりのタイルとの重なり（一番大きい文字の高さより大きくしてください）
+TILE_OVERLAP = 128
+# この画素数を超える画像はタイルに分けて認識します
+TILE_THRESHOLD_PIXELS = 12_000_000
+# 重なりの割合（小さい方の面積に対して）がこれ以上なら同じ文字とみなします
+DUPLICATE_OVERLAP = 0.5
+
+Result = Tuple[list, str, float]
+
+
+def iter_tiles(height: int, width: int, tile_size: int = TILE_SIZE,
+               overlap: int = TILE_OVERLAP) -> Iterator[Tuple[int, int, int, int]]:
+    """画像を覆うタイルの (x, y, 幅, 高さ) を順に返します。"""
+    tile_size = max(1, tile_size)
+    overlap = max(0, min(overlap, tile_size - 1))
+    step = tile_size - overlap
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)  # 最後のタイルは端にそろえる
+        return positions
+
+    for y in starts(height):
+        for x in starts(width):
+            yield x, y, min(tile_size, width - x), min(tile_size, height - y)
+
+
+def needs_tiling(image: np.ndarray, threshold_pixels: int = TILE_THRESHOLD_PIXELS) -> bool:
+    """タイルに分けた方がよい大きさの画像なら True を返します。"""
+    return image.shape[0] * image.shape[1] > threshold_pixels
+
+
+def box_rect(box) -> Tuple[float, float, float, float]:
+    """4点の座標を、それを囲む長方形 (左, 上, 右, 下) にします。"""
+    xs = [float(point[0]) for point in box]
+    ys = [float(point[1]) for point in box]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def overlap_ratio(a, b) -> float:
+    """2つの長方形の重なりの面積を、小さい方の面積で割った値を返します。"""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return (ix * iy) / smaller if smaller > 0 else 0.0
+
+
+def iou(a, b) -> float:
+    """2つの長方形の重なりの面積を、2つを合わせた面積で割った値（IoU）を返します。"""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _recognize_tile(reader, image: np.ndarray, tile: Tuple[int, int, int, int],
+                    preprocess: Optional[Callable[[np.ndarray], np.ndarray]],
+                    full_size: Tuple[int, int]) -> List[Tuple[Result, bool]]:
+    """1タイルを認識して、元の画像の座標に直した結果を返します。
+
+    各結果には「内側のタイルの境目に接しているか」の印をつけます（切れた文字の可能性があるため）。
+    """
+    x, y, w, h = tile
+    crop = image[y:y + h, x:x + w]  # コピーせずに切り出す
+    processed = preprocess(crop) if preprocess else crop
+    scale_x = processed.shape[1] / float(w)
+    scale_y = processed.shape[0] / float(h)
+    raw_results = reader.readtext(processed, detail=1)
+    del processed  # 次のタイルに進む前に前処理済みの画像を手放す
+
+    results = []
+    for bbox, text, confidence in raw_results:
+        box = [[x + float(px) / scale_x, y + float(py) / scale_y] for px, py in bbox]
+        left, top, right, bottom = box_rect(box)
+        margin = 2.0
+        on_seam = (
+            (x > 0 and left <= x + margin) or (y > 0 and top <= y + margin)
+            or (x + w < full_size[1] and right >= x + w - margin)
+            or (y + h < full_size[0] and bottom >= y + h - margin)
+        )
+        results.append(((box, text, float(confidence)), on_seam))
+    return results
+
+
+def merge_results(results: List[Tuple[Result, bool]],
+                  duplicate_overlap: float = DUPLICATE_OVERLAP) -> List[Result]:
+    """タイルの重なりで二重になった結果をまとめます。
+
+    重なっている結果どうしでは、境目で切れていない方、次に信頼度の高い方を残します。
+    """
+    ordered = sorted(results, key=lambda item: (item[1], -item[0][2]))
+    kept: List[Tuple[Result, Tuple[float, float, float, float]]] = []
+    for result, _ in ordered:
+        rect = box_rect(result[0])
+        if any(overlap_ratio(rect, other) >= duplicate_overlap for _, other in kept):
+            continue
+        kept.append((result, rect))
+    # 上から下、左から右の順に並べ直す
+    kept.sort(key=lambda item: (item[1][1], item[1][0]))
+    return [result for result, _ in kept]
+
+
+def readtext_tiled(reader, image: np.ndarray,
+                   preprocess: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                   tile_size: int = TILE_SIZE, overlap: int = TILE_OVERLAP,
+                   workers: int = 1) -> List[Result]:
+    """画像をタイルに分けて認識し、readtext(detail=1) と同じ形の結果を返します。
+
+    preprocess にはタイル1枚ずつにかける前処理（拡大してもかまいません）を渡します。
+    workers を2以上にすると、その数のタイルを同時に処理します（メモリもその分使います）。
+    """
+    full_size = image.shape[:2]
+    tiles = list(iter_tiles(full_size[0], full_size[1], tile_size, overlap))
+    collected: List[Tuple[Result, bool]] = []
+    if workers <= 1:
+        for tile in tiles:
+            collected.extend(_recognize_tile(reader, image, tile, preprocess, full_size))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for tile_results in executor.map(
+                lambda tile: _recognize_tile(reader, image, tile, preprocess, full_size), tiles
+            ):
+                collected.extend(tile_results)
+    return merge_results(collected)
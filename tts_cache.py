@@ -0,0 +1,205 @@
+"""
+読み上げ音声のキャッシュ
+- pyttsx3 の save_to_file で音声を WAV ファイルに書き出し、テキストの区切りごとに保存します
+- キーは「テキスト＋速度＋音量＋声」なので、設定が同じならもう一度合成しません
+- 保存先の合計サイズが上限を超えたら、古く使われていないファイルから消します（LRU）
+- 画面なしでも、テキストファイルをまとめて WAV に変換できます
+
+使い方（画面なし）:
+    python tts_cache.py text.txt --output speech.wav --rate 150 --volume 1.0
+"""
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import wave
+from typing import List, Optional
+
+import stage_metrics
+
+# === キャッシュの設定 ===
+# 音声ファイルの保存先
+CACHE_DIR = os.path.join(".", "cache", "tts")
+# 保存先の合計サイズの上限（バイト）
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# 基準の読み上げ速度（アプリの「速度 1.0」に対応）
+BASE_RATE = 150
+
+
+def split_segments(text: str) -> List[str]:
+    """テキストを行ごとの区切りに分けます（空行は飛ばします）。
+
+    行ごとにキャッシュするので、一部の行だけ変わったときもほかの行は合成し直しません。
+    """
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+class TTSRenderer:
+    """pyttsx3 で音声ファイルを作り、ディスクにキャッシュするクラス"""
+
+    def __init__(self, engine=None, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        if engine is None:
+            import pyttsx3
+
+            engine = pyttsx3.init()
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # pyttsx3 のエンジンは同時に1つの処理しかできないため
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, text: str, rate: int, volume: float) -> str:
+        """テキストと音声設定に対応するキャッシュファイルのパスを返します。"""
+        voice = self.engine.getProperty("voice") or ""
+        key = f"{rate}\0{volume:.2f}\0{voice}\0{text}".encode("utf-8")
+        return os.path.join(self.cache_dir, hashlib.sha1(key).hexdigest() + ".wav")
+
+    def render(self, text: str, rate: int = BASE_RATE, volume: float = 1.0) -> str:
+        """テキストを音声ファイルにして、そのパスを返します（キャッシュがあればそれを使います）。"""
+        with stage_metrics.span("tts.synth", chars=len(text)) as attrs:
+            path = self.cache_path(text, rate, volume)
+            attrs["cached"] = os.path.exists(path) and os.path.getsize(path) > 0
+            if attrs["cached"]:
+                # 最近使ったことを記録（削除の順番に使います）
+                os.utime(path, None)
+                return path
+
+            tmp_path = path + ".tmp.wav"
+            with self._lock:
+                self.engine.setProperty("rate", rate)
+                self.engine.setProperty("volume", volume)
+                self.engine.save_to_file(text, tmp_path)
+                self.engine.runAndWait()
+            if not os.path.exists(tmp_path):
+                raise RuntimeError("音声ファイルの作成に失敗しました")
+            os.replace(tmp_path, path)
+            self._evict()
+            return path
+
+    def render_all(self, text: str, rate: int = BASE_RATE, volume: float = 1.0) -> List[str]:
+        """テキストを区切りごとに音声ファイルにして、パスのリストを返します。"""
+        return [self.render(segment, rate, volume) for segment in split_segments(text)]
+
+    def _evict(self) -> None:
+        """合計サイズが上限を超えていたら、古く使われていないファイルから消します。"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".wav") or name.endswith(".tmp.wav"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class AudioPlayer:
+    """WAV ファイルを再生するクラス（Windows は winsound、それ以外は OS のコマンド）"""
+
+    def __init__(self):
+        self._process: Optional[subprocess.Popen] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def play(self, path: str) -> None:
+        """音声ファイルを最後まで再生します（stop() で途中で止められます）。"""
+        with stage_metrics.span("tts.play"):
+            self._play(path)
+
+    def _play(self, path: str) -> None:
+        self._stopped.clear()
+        if sys.platform == "win32":
+            import winsound
+
+            # 非同期で再生し、長さの分だけ待ちます（stop() が呼ばれたらすぐ戻ります）
+            winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+            self._stopped.wait(wav_duration(path))
+            return
+
+        command = ["afplay", path] if sys.platform == "darwin" else ["aplay", "-q", path]
+        process = subprocess.Popen(command)
+        with self._lock:
+            self._process = process
+        process.wait()
+        with self._lock:
+            self._process = None
+
+    def stop(self) -> None:
+        """再生中の音声を止めます。"""
+        self._stopped.set()
+        if sys.platform == "win32":
+            import winsound
+
+            winsound.PlaySound(None, 0)
+            return
+        with self._lock:
+            if self._process is not None:
+                self._process.terminate()
+
+
+def wav_duration(path: str) -> float:
+    """WAV ファイルの長さ（秒）を返します。"""
+    try:
+        with wave.open(path, "rb") as src:
+            return src.getnframes() / float(src.getframerate() or 1)
+    except (wave.Error, EOFError):
+        # WAV として読めない場合は、少し長めに待つ
+        return 60.0
+
+
+def concat_wav(paths: List[str], output_path: str) -> None:
+    """複数の WAV ファイルを1つにつなげます（形式がそろっている必要があります）。"""
+    with wave.open(output_path, "wb") as out:
+        params = None
+        for path in paths:
+            with wave.open(path, "rb") as src:
+                if params is None:
+                    params = src.getparams()
+                    out.setparams(params)
+                elif src.getparams()[:3] != params[:3]:
+                    raise ValueError(f"音声の形式が違うためつなげられません: {path}")
+                out.writeframes(src.readframes(src.getnframes()))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="テキストを音声ファイル（WAV）に変換します")
+    parser.add_argument("text_files", nargs="+", help="読み上げるテキストファイル")
+    parser.add_argument("--output", "-o", help="つなげた音声の保存先（省略時はキャッシュのパスを表示）")
+    parser.add_argument("--rate", type=int, default=BASE_RATE, help="読み上げ速度")
+    parser.add_argument("--volume", type=float, default=1.0, help="音量（0.0〜1.0）")
+    args = parser.parse_args(argv)
+
+    try:
+        renderer = TTSRenderer()
+        paths: List[str] = []
+        for text_file in args.text_files:
+            with open(text_file, encoding="utf-8") as f:
+                paths.extend(renderer.render_all(f.read(), args.rate, args.volume))
+        if args.output:
+            concat_wav(paths, args.output)
+            print(f"音声を保存しました: {args.output}")
+        else:
+            print("\n".join(paths))
+        return 0
+    except Exception as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())